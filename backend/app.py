@@ -5,21 +5,57 @@ import re
 import requests
 import google.generativeai as genai
 import json
-from flask import Flask, request, jsonify
+import time
+import hashlib
+import base64
+import binascii
+import csv
+import io
+import threading
+import click
+import contextvars
+import gzip
+import random
+import unicodedata
+import brotli
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import Flask, Response, g, request, jsonify, send_file, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
 from flask_cors import CORS
 import jwt
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 from email_validator import validate_email, EmailNotValidError # Import the email validator
 from functools import wraps
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from cache import LRUCache
+from covers import (
+    CoverCache, CoverNotFound, CoverError, COVER_VARIANTS, IGDB_IMAGE_URL, IMAGE_ID_PATTERN, igdb_image_id, proxy_cover_urls
+)
+from metrics import REGISTRY, RequestSpans, current_spans, record_span, span
+from profiler import SamplingProfiler, folded, top_frames
+from jobs import JobManager
+from recommender import ContentRecommender
+from passwords import PasswordHasher, HasherOverloaded
+from singleflight import SingleFlight, SingleFlightTimeout
+from igdb_scheduler import (
+    TokenBucketScheduler, BatchLoader, current_priority as current_igdb_priority,
+    priority as igdb_priority, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+)
+from igdb_client import (
+    IGDBClient, IGDBAuthError, IGDBRateLimited, IGDB_API_URL, TWITCH_AUTH_URL, escape_query_string, upgrade_cover_url
+)
 
 # Load environment variables from .env file
 load_dotenv()
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
-if GOOGLE_API_KEY:
+# Point Gemini at another endpoint (e.g. the benchmark stubs); a custom endpoint needs the REST transport
+GEMINI_API_ENDPOINT = os.getenv('GEMINI_API_ENDPOINT')
+if GOOGLE_API_KEY and GEMINI_API_ENDPOINT:
+    genai.configure(api_key=GOOGLE_API_KEY, transport='rest', client_options={'api_endpoint': GEMINI_API_ENDPOINT})
+elif GOOGLE_API_KEY:
     genai.configure(api_key=GOOGLE_API_KEY)
 else:
     print("Warning: GOOGLE_API_KEY not found in environment variables.")
@@ -38,10 +74,143 @@ CORS(app, origins=[VERCEL_URL, "http://localhost:3000"], supports_credentials=Tr
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY') # Load secret key from .env
 app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL or 'sqlite:///gameup.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# IGDB game metadata cache: a short-lived in-process tier in front of a longer-lived DB tier
+app.config['GAME_CACHE_MEMORY_SIZE'] = int(os.getenv('GAME_CACHE_MEMORY_SIZE', 2048))
+app.config['GAME_CACHE_MEMORY_TTL'] = int(os.getenv('GAME_CACHE_MEMORY_TTL', 600)) # 10 minutes
+app.config['GAME_CACHE_DB_TTL'] = int(os.getenv('GAME_CACHE_DB_TTL', 7 * 24 * 3600)) # 7 days
+app.config['GAME_CACHE_DB_MAX_ROWS'] = int(os.getenv('GAME_CACHE_DB_MAX_ROWS', 50000))
+app.config['GAME_CACHE_PRUNE_INTERVAL'] = int(os.getenv('GAME_CACHE_PRUNE_INTERVAL', 300)) # Seconds between prunes per process; 0 = only `flask prune-game-cache`
+app.config['IGDB_PARALLEL_CHUNKS'] = os.getenv('IGDB_PARALLEL_CHUNKS', '1') == '1'
+app.config['GAME_DETAIL_MAX_AGE'] = int(os.getenv('GAME_DETAIL_MAX_AGE', 3600)) # Seconds clients may reuse game details
+app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', 1024)) # Bytes; smaller bodies aren't worth it
+app.config['GZIP_LEVEL'] = int(os.getenv('GZIP_LEVEL', 6))
+app.config['BROTLI_QUALITY'] = int(os.getenv('BROTLI_QUALITY', 5)) # 0-11; mid qualities are fast enough per request
+# How long a request waits on an identical in-flight IGDB call before giving up
+app.config['SINGLE_FLIGHT_TIMEOUT'] = float(os.getenv('SINGLE_FLIGHT_TIMEOUT', '30'))
+app.config['IGDB_BATCH_WINDOW_MS'] = float(os.getenv('IGDB_BATCH_WINDOW_MS', '5')) # How long id lookups wait to be batched
+app.config['SEARCH_CACHE_SIZE'] = int(os.getenv('SEARCH_CACHE_SIZE', '2048'))
+app.config['SEARCH_CACHE_TTL'] = int(os.getenv('SEARCH_CACHE_TTL', '300')) # Seconds
+# 'auto' serves search and game details from the local catalog mirror once it has been synced, 'off' never does
+app.config['CATALOG_MODE'] = os.getenv('CATALOG_MODE', 'auto')
+# Password hashing: bcrypt work factor, size of the dedicated hashing pool (0 = hash
+# inline on the request thread) and how many hashing jobs may queue before we answer 503
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+app.config['PASSWORD_HASH_QUEUE_LIMIT'] = int(os.getenv('PASSWORD_HASH_QUEUE_LIMIT', 16))
+# Authenticated user lookups that can't be answered from token claims alone
+app.config['USER_CACHE_SIZE'] = int(os.getenv('USER_CACHE_SIZE', 4096))
+app.config['USER_CACHE_TTL'] = int(os.getenv('USER_CACHE_TTL', 300)) # 5 minutes
+# AI recommendations
+app.config['GEMINI_MODEL'] = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
+app.config['RECOMMENDATION_CACHE_TTL'] = int(os.getenv('RECOMMENDATION_CACHE_TTL', 24 * 3600)) # 1 day
+# In-process tier in front of the DB recommendation cache
+app.config['RECOMMENDATION_CACHE_MEMORY_SIZE'] = int(os.getenv('RECOMMENDATION_CACHE_MEMORY_SIZE', 1024))
+app.config['RECOMMENDATION_CACHE_MEMORY_TTL'] = int(os.getenv('RECOMMENDATION_CACHE_MEMORY_TTL', 600)) # 10 minutes
+app.config['RECOMMENDATION_JOB_WORKERS'] = int(os.getenv('RECOMMENDATION_JOB_WORKERS', 2))
+# Job state is kept in the DB so any worker can answer polls; finished jobs are kept this
+# long, and unfinished ones not updated within STALE_AFTER are reported as failed (their worker died)
+app.config['RECOMMENDATION_JOB_RETENTION'] = int(os.getenv('RECOMMENDATION_JOB_RETENTION', 600)) # 10 minutes
+app.config['RECOMMENDATION_JOB_STALE_AFTER'] = int(os.getenv('RECOMMENDATION_JOB_STALE_AFTER', 300)) # 5 minutes
+app.config['GEMINI_TIMEOUT'] = float(os.getenv('GEMINI_TIMEOUT', 20))
+# 'gemini', 'local' (in-process content-based recommender) or 'auto' (Gemini, falling back to local)
+app.config['RECOMMENDATION_ENGINE'] = os.getenv('RECOMMENDATION_ENGINE', 'auto')
+app.config['LOCAL_RECOMMENDER_REFRESH'] = int(os.getenv('LOCAL_RECOMMENDER_REFRESH', 600)) # Rebuild the candidate matrix every 10 minutes
+# Catalog games beyond MAX_CANDIDATES (most recent releases first) are left out of the matrix;
+# with fewer than MIN_CANDIDATES the local engine declines rather than recommend from scraps
+app.config['LOCAL_RECOMMENDER_MAX_CANDIDATES'] = int(os.getenv('LOCAL_RECOMMENDER_MAX_CANDIDATES', 50000))
+app.config['LOCAL_RECOMMENDER_MIN_CANDIDATES'] = int(os.getenv('LOCAL_RECOMMENDER_MIN_CANDIDATES', 50))
+# Observability: /metrics requires this bearer token when set. Requests slower than
+# SLOW_REQUEST_PROFILE_MS get their sampled stacks logged (0 = profiler off); only a
+# PROFILE_SAMPLE_RATE fraction of requests is sampled at all.
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+app.config['SLOW_REQUEST_PROFILE_MS'] = float(os.getenv('SLOW_REQUEST_PROFILE_MS', 0))
+app.config['PROFILE_SAMPLE_RATE'] = float(os.getenv('PROFILE_SAMPLE_RATE', 1.0))
+app.config['PROFILE_DIR'] = os.getenv('PROFILE_DIR') # Also write folded stacks here, for flame graphs
+# Cover image proxy. With COVER_PROXY_BASE_URL set (this API's public URL), game JSON points
+# at our resized WebP variants instead of IGDB's CDN. Variants of an image id never change,
+# so they are served as immutable.
+app.config['COVER_PROXY_BASE_URL'] = os.getenv('COVER_PROXY_BASE_URL')
+app.config['COVER_CACHE_DIR'] = os.getenv('COVER_CACHE_DIR', os.path.join(app.instance_path, 'covers'))
+app.config['COVER_CACHE_MAX_BYTES'] = int(os.getenv('COVER_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+app.config['COVER_SOURCE_URL'] = os.getenv('COVER_SOURCE_URL', IGDB_IMAGE_URL) # {size} and {image_id} placeholders
+app.config['COVER_WEBP_QUALITY'] = int(os.getenv('COVER_WEBP_QUALITY', 80))
+app.config['COVER_MAX_AGE'] = int(os.getenv('COVER_MAX_AGE', 365 * 24 * 3600))
+# Behind Apache/lighttpd, let the web server send files (covers) via X-Sendfile
+app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE') == '1'
 
 # --- Initialize Extensions ---
 db = SQLAlchemy(app)
-bcrypt = Bcrypt(app)
+# bcrypt runs on its own process pool, with a queue limit so login bursts get 503s
+# instead of starving every other endpoint
+password_hasher = PasswordHasher(
+    rounds=app.config['BCRYPT_LOG_ROUNDS'],
+    workers=app.config['PASSWORD_HASH_WORKERS'],
+    max_pending=app.config['PASSWORD_HASH_QUEUE_LIMIT']
+)
+
+# --- NEW: Request instrumentation ---
+# Each request collects timing spans (SQL, IGDB, Twitch, Gemini, JWT, bcrypt) that are
+# reported in its Server-Timing header and aggregated for /metrics.
+HTTP_REQUESTS = REGISTRY.counter(
+    'gameup_http_requests_total', 'HTTP requests by endpoint and status.', ('method', 'endpoint', 'status')
+)
+HTTP_LATENCY = REGISTRY.histogram(
+    'gameup_http_request_duration_seconds', 'Time to produce a response (headers), by endpoint.', ('endpoint',)
+)
+request_profiler = SamplingProfiler()
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    record_span('sql', time.perf_counter() - context._query_started)
+
+@app.before_request
+def start_request_timing():
+    g.request_spans_token = current_spans.set(RequestSpans())
+    if app.config['SLOW_REQUEST_PROFILE_MS'] and random.random() < app.config['PROFILE_SAMPLE_RATE']:
+        g.profiled_thread = request_profiler.start()
+
+@app.after_request
+def finish_request_timing(response):
+    spans = current_spans.get()
+    if spans is None:
+        return response
+    elapsed = time.perf_counter() - spans.started
+    endpoint = request.endpoint or 'unmatched'
+    HTTP_REQUESTS.inc(method=request.method, endpoint=endpoint, status=response.status_code)
+    HTTP_LATENCY.observe(elapsed, endpoint=endpoint)
+
+    # Endpoints may already report their own steps (e.g. recommendations)
+    timing = spans.server_timing()
+    existing = response.headers.get('Server-Timing')
+    response.headers['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+
+    if 'profiled_thread' in g:
+        report_slow_request(request_profiler.stop(g.pop('profiled_thread')), elapsed, endpoint)
+    return response
+
+@app.teardown_request
+def reset_request_timing(exc=None):
+    if 'profiled_thread' in g: # The request failed before after_request ran
+        request_profiler.stop(g.pop('profiled_thread'))
+    token = g.pop('request_spans_token', None)
+    if token is not None:
+        current_spans.reset(token)
+
+def report_slow_request(stacks, elapsed, endpoint):
+    """Log where a slow request spent its time, and keep the folded stacks if PROFILE_DIR is set."""
+    if elapsed * 1000 < app.config['SLOW_REQUEST_PROFILE_MS'] or not stacks:
+        return
+    hot = ', '.join(f'{frame} {share:.0%}' for frame, share in top_frames(stacks))
+    print(f"Slow request {request.method} {request.path} ({elapsed * 1000:.0f}ms): {hot}")
+    if app.config['PROFILE_DIR']:
+        os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+        path = os.path.join(app.config['PROFILE_DIR'], f'{endpoint}-{int(time.time() * 1000)}.folded')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(folded(stacks))
 
 # --- Database Models (MODIFIED) ---
 class User(db.Model):
@@ -61,30 +230,267 @@ class UserGame(db.Model):
     igdb_game_id = db.Column(db.Integer, nullable=False)
     status = db.Column(db.String(50), nullable=False) # e.g., "Playing", "Completed", "Wishlist"
 
-    __table_args__ = (db.UniqueConstraint('user_id', 'igdb_game_id', name='_user_game_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'igdb_game_id', name='_user_game_uc'),
+        db.Index('ix_user_game_user_status', 'user_id', 'status'),
+    )
 
     def __repr__(self):
         return f'<UserGame user:{self.user_id} game:{self.igdb_game_id} status:{self.status}>'
-    
+
+LIBRARY_STATUSES = ["Playing", "Completed", "Dropped", "Wishlist"]
+
+# --- NEW: UserLibraryStats Model ---
+class UserLibraryStats(db.Model):
+    """Per-user game counts by status, kept in step with UserGame by library_manager."""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    playing = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    dropped = db.Column(db.Integer, nullable=False, default=0)
+    wishlist = db.Column(db.Integer, nullable=False, default=0)
+    version = db.Column(db.Integer, nullable=False, default=0) # Bumped on every library change
+    updated_at = db.Column(db.DateTime) # Naive UTC time of the last library change
+
+    def counts(self):
+        return {status: getattr(self, status.lower()) or 0 for status in LIBRARY_STATUSES}
+
+    def __repr__(self):
+        return f'<UserLibraryStats user:{self.user_id} {self.counts()}>'
+
+# --- NEW: GameCache Model ---
+class GameCache(db.Model):
+    """IGDB game metadata keyed by IGDB id. Backs the in-process game cache across restarts and workers."""
+    igdb_game_id = db.Column(db.Integer, primary_key=True)
+    data = db.Column(db.Text, nullable=False) # JSON-encoded, already post-processed IGDB game object
+    fetched_at = db.Column(db.DateTime, nullable=False, index=True) # Naive UTC
+
+    def __repr__(self):
+        return f'<GameCache game:{self.igdb_game_id} fetched_at:{self.fetched_at}>'
+
+# --- NEW: RecommendationCache Model ---
+class RecommendationCache(db.Model):
+    """Generated recommendations keyed by a fingerprint of a completed-games set (shared between users)."""
+    fingerprint = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text, nullable=False) # JSON-encoded list of recommendations
+    created_at = db.Column(db.DateTime, nullable=False, index=True) # Naive UTC
+
+    def __repr__(self):
+        return f'<RecommendationCache {self.fingerprint[:12]} created_at:{self.created_at}>'
+
+# --- NEW: RecommendationJob Model ---
+class RecommendationJob(db.Model):
+    """The state of a background recommendation job, shared by every worker process."""
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    status = db.Column(db.String(16), nullable=False) # queued -> running -> done | failed
+    events = db.Column(db.Text, nullable=False) # JSON-encoded [{"event": ..., "data": ...}]
+    result = db.Column(db.Text) # JSON-encoded
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False) # Naive UTC
+    updated_at = db.Column(db.DateTime, nullable=False, index=True) # Naive UTC
+
+    def __repr__(self):
+        return f'<RecommendationJob {self.id} user:{self.user_id} {self.status}>'
+
+# --- NEW: Local IGDB catalog mirror (filled by `flask sync-igdb`) ---
+# No foreign keys between catalog tables: endpoints are synced independently, so a
+# cover or company can legitimately arrive before (or without) its game.
+catalog_game_genre = db.Table(
+    'catalog_game_genre',
+    db.Column('game_id', db.Integer, primary_key=True),
+    db.Column('genre_id', db.Integer, primary_key=True)
+)
+
+catalog_game_platform = db.Table(
+    'catalog_game_platform',
+    db.Column('game_id', db.Integer, primary_key=True),
+    db.Column('platform_id', db.Integer, primary_key=True)
+)
+
+class CatalogGenre(db.Model):
+    id = db.Column(db.Integer, primary_key=True) # IGDB genre id
+    name = db.Column(db.String(255), nullable=False)
+    updated_at = db.Column(db.Integer) # IGDB unix timestamp
+
+class CatalogPlatform(db.Model):
+    id = db.Column(db.Integer, primary_key=True) # IGDB platform id
+    name = db.Column(db.String(255), nullable=False)
+    updated_at = db.Column(db.Integer)
+
+class CatalogCover(db.Model):
+    id = db.Column(db.Integer, primary_key=True) # IGDB cover id
+    game_id = db.Column(db.Integer, index=True)
+    image_id = db.Column(db.String(64))
+    url = db.Column(db.String(255))
+    updated_at = db.Column(db.Integer)
+
+class CatalogInvolvedCompany(db.Model):
+    id = db.Column(db.Integer, primary_key=True) # IGDB involved_company id
+    game_id = db.Column(db.Integer, index=True)
+    company_id = db.Column(db.Integer)
+    company_name = db.Column(db.String(255))
+    developer = db.Column(db.Boolean, nullable=False, default=False)
+    publisher = db.Column(db.Boolean, nullable=False, default=False)
+    updated_at = db.Column(db.Integer)
+
+class CatalogGame(db.Model):
+    id = db.Column(db.Integer, primary_key=True) # IGDB game id
+    name = db.Column(db.String(255), nullable=False)
+    slug = db.Column(db.String(255))
+    summary = db.Column(db.Text)
+    first_release_date = db.Column(db.Integer)
+    category = db.Column(db.Integer, index=True) # 0 = main game
+    cover_id = db.Column(db.Integer)
+    updated_at = db.Column(db.Integer, index=True)
+
+    genres = db.relationship(
+        CatalogGenre, secondary=catalog_game_genre, lazy='selectin', viewonly=True,
+        primaryjoin=lambda: CatalogGame.id == db.foreign(catalog_game_genre.c.game_id),
+        secondaryjoin=lambda: CatalogGenre.id == db.foreign(catalog_game_genre.c.genre_id)
+    )
+    platforms = db.relationship(
+        CatalogPlatform, secondary=catalog_game_platform, lazy='selectin', viewonly=True,
+        primaryjoin=lambda: CatalogGame.id == db.foreign(catalog_game_platform.c.game_id),
+        secondaryjoin=lambda: CatalogPlatform.id == db.foreign(catalog_game_platform.c.platform_id)
+    )
+    cover = db.relationship(
+        CatalogCover, lazy='selectin', viewonly=True, uselist=False,
+        primaryjoin=lambda: db.foreign(CatalogGame.cover_id) == CatalogCover.id
+    )
+    involved_companies = db.relationship(
+        CatalogInvolvedCompany, lazy='selectin', viewonly=True,
+        primaryjoin=lambda: CatalogGame.id == db.foreign(CatalogInvolvedCompany.game_id)
+    )
+
+    def __repr__(self):
+        return f'<CatalogGame {self.id} {self.name}>'
+
+class CatalogSyncState(db.Model):
+    """How far each IGDB endpoint has been mirrored, so syncs can resume incrementally."""
+    endpoint = db.Column(db.String(64), primary_key=True)
+    last_updated_at = db.Column(db.Integer, nullable=False, default=0) # Highest IGDB updated_at synced
+    synced_at = db.Column(db.DateTime) # Naive UTC
+
+# --- NEW: Token authentication with a stateless fast path ---
+class AuthenticatedUser:
+    """The identity fields handlers need, built from token claims or a cached User row."""
+    __slots__ = ('id', 'username', 'email')
+
+    def __init__(self, id, username, email):
+        self.id = id
+        self.username = username
+        self.email = email
+
+    def __repr__(self):
+        return f'<AuthenticatedUser {self.username}>'
+
+user_cache = LRUCache(maxsize=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+# user_id -> unix time of the last account change seen by this process. Tokens issued
+# before that can't be trusted on their claims alone and are checked against the DB.
+# Entries only need to outlive USER_CACHE_TTL: older tokens are checked anyway.
+user_changed_at = LRUCache(maxsize=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+
+def create_token(user):
+    """Issue a 24h JWT carrying everything the handlers need, so most requests skip the DB."""
+    now = datetime.now(timezone.utc)
+    return jwt.encode({
+        'user_id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'iat': now,
+        'exp': now + timedelta(hours=24) # Token expires in 24 hours
+    }, app.config['SECRET_KEY'], algorithm='HS256')
+
+def load_user(user_id):
+    """Return an AuthenticatedUser from the per-process cache or the DB, or None if the account is gone."""
+    current_user = user_cache.get(user_id)
+    if current_user is None:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        current_user = AuthenticatedUser(user.id, user.username, user.email)
+        user_cache.set(user_id, current_user)
+    return current_user
+
+def invalidate_user_cache(user_id):
+    """Forget cached data for a user and stop trusting the claims of their existing tokens."""
+    user_cache.delete(user_id)
+    user_changed_at.set(user_id, time.time())
+
+@db.event.listens_for(User, 'after_update')
+def _on_user_updated(mapper, connection, user):
+    # Only the fields carried in tokens matter; e.g. a password rehash on login doesn't
+    state = db.inspect(user)
+    if state.attrs.username.history.has_changes() or state.attrs.email.history.has_changes():
+        invalidate_user_cache(user.id)
+
+@db.event.listens_for(User, 'after_delete')
+def _on_user_deleted(mapper, connection, user):
+    invalidate_user_cache(user.id)
+
+def get_token_from_request():
+    """Return the bearer token from the Authorization header, or None."""
+    # The header should be in the format 'Bearer <token>'
+    parts = request.headers.get('Authorization', '').split(" ")
+    return parts[1] if len(parts) == 2 else None
+
+def authenticate_token(token):
+    """Validate a JWT. Returns (AuthenticatedUser, None) or (None, error message)."""
+    try:
+        with span('jwt'):
+            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+    except jwt.ExpiredSignatureError:
+        return None, 'Token has expired!'
+    except jwt.InvalidTokenError:
+        return None, 'Token is invalid!'
+
+    user_id = data.get('user_id')
+    if not isinstance(user_id, int):
+        return None, 'Token is invalid!'
+
+    # Fast path: a token issued within USER_CACHE_TTL is no staler than a cached user, so its
+    # claims are trusted unless this process saw the account change since. Changes made
+    # through another worker are therefore picked up within the TTL, as with user_cache.
+    issued_at = data.get('iat', 0)
+    if ('username' in data and 'email' in data and issued_at > time.time() - app.config['USER_CACHE_TTL']
+            and issued_at > user_changed_at.get(user_id, 0)):
+        return AuthenticatedUser(user_id, data['username'], data['email']), None
+
+    # Older tokens (or a changed account) go through the user cache and the DB
+    current_user = load_user(user_id)
+    if current_user is None:
+        return None, 'User not found!'
+    return current_user, None
+
+def get_optional_user():
+    """The logged-in user for routes that also work anonymously; None if there is no valid token."""
+    token = get_token_from_request()
+    if not token:
+        return None
+    current_user, _ = authenticate_token(token)
+    return current_user
+
+def authenticate_request():
+    """Returns (AuthenticatedUser, None) for a valid bearer token, else (None, 401 response)."""
+    token = get_token_from_request()
+
+    if not token:
+        return None, (jsonify({'message': 'Token is missing!'}), 401)
+
+    current_user, error = authenticate_token(token)
+    if error:
+        return None, (jsonify({'message': error}), 401)
+    return current_user, None
+
 def token_required(f):
     """A decorator to protect routes that require a logged-in user."""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        token = None
-        if 'Authorization' in request.headers:
-            # The header should be in the format 'Bearer <token>'
-            token = request.headers['Authorization'].split(" ")[1]
-
-        if not token:
-            return jsonify({'message': 'Token is missing!'}), 401
-
-        try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user = User.query.get(data['user_id'])
-        except:
-            return jsonify({'message': 'Token is invalid!'}), 401
+        current_user, error_response = authenticate_request()
+        if error_response:
+            return error_response
 
-        # Pass the current_user object to the decorated function
+        # Pass the current user to the decorated function
         return f(current_user, *args, **kwargs)
 
     return decorated_function
@@ -128,15 +534,15 @@ def register_user():
     if User.query.filter_by(email=email).first():
         return jsonify({"error": "This email is already registered"}), 409
 
-    hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+    try:
+        hashed_password = password_hasher.hash(password)
+    except HasherOverloaded:
+        return jsonify({"error": "The server is busy, please try again shortly"}), 503, {'Retry-After': '1'}
     new_user = User(username=username, email=email, password_hash=hashed_password)
     db.session.add(new_user)
     db.session.commit()
 
-    token = jwt.encode({
-        'user_id': new_user.id,
-        'exp': datetime.now(timezone.utc) + timedelta(hours=24)
-    }, app.config['SECRET_KEY'], algorithm='HS256')
+    token = create_token(new_user)
 
     return jsonify({"message": f"User '{username}' created successfully", "token": token}), 201
 
@@ -155,197 +561,983 @@ def login_user():
     user = User.query.filter((User.username == identifier) | (User.email == identifier)).first()
 
     # Check if user exists and password is correct
-    if user and bcrypt.check_password_hash(user.password_hash, password):
+    try:
+        password_ok = bool(user) and password_hasher.check(user.password_hash, password)
+    except HasherOverloaded:
+        return jsonify({"error": "The server is busy, please try again shortly"}), 503, {'Retry-After': '1'}
+
+    if password_ok:
+        # Transparently upgrade hashes made with an old work factor while we have the password
+        if password_hasher.needs_rehash(user.password_hash):
+            try:
+                user.password_hash = password_hasher.hash(password)
+                db.session.commit()
+            except HasherOverloaded:
+                pass # Try again on a later login
+
         # Create a JWT token
-        token = jwt.encode({
-            'user_id': user.id,
-            'exp': datetime.now(timezone.utc) + timedelta(hours=24) # Token expires in 24 hours
-        }, app.config['SECRET_KEY'], algorithm='HS256')
+        token = create_token(user)
 
         return jsonify({"message": "Login successful", "token": token}), 200
     
     return jsonify({"error": "Invalid credentials"}), 401 # 401 Unauthorized
 
-# --- IGDB TOKEN MANAGEMENT ---
-IGDB_CLIENT_ID = os.getenv('IGDB_CLIENT_ID')
-IGDB_CLIENT_SECRET = os.getenv('IGDB_CLIENT_SECRET')
-TWITCH_AUTH_URL = 'https://id.twitch.tv/oauth2/token'
-igdb_access_token = None
-token_expires_at = datetime.now(timezone.utc)
+# --- IGDB CLIENT ---
+# IGDB allows about 4 requests/second per client. Every request from this process
+# waits for a slot here, interactive endpoints ahead of everything else.
+igdb_scheduler = TokenBucketScheduler(
+    rate=float(os.getenv('IGDB_RATE_LIMIT', 4)),
+    burst=int(os.getenv('IGDB_RATE_BURST', 4)),
+    max_wait=float(os.getenv('IGDB_SCHEDULER_MAX_WAIT', 10))
+)
+
+# Endpoints whose IGDB calls jump the queue: a user is watching a spinner
+IGDB_INTERACTIVE_ENDPOINTS = {'search_games', 'get_game_details'}
+
+@app.before_request
+def set_igdb_priority():
+    if request.endpoint in IGDB_INTERACTIVE_ENDPOINTS:
+        g.igdb_priority_token = current_igdb_priority.set(PRIORITY_INTERACTIVE)
+
+@app.teardown_request
+def reset_igdb_priority(exc=None):
+    token = g.pop('igdb_priority_token', None)
+    if token is not None:
+        current_igdb_priority.reset(token)
+
+# One shared client per process: pooled keep-alive connections, timeouts,
+# retries on 429/5xx, a single-flight token refresh and the rate scheduler.
+igdb = IGDBClient(
+    os.getenv('IGDB_CLIENT_ID'),
+    os.getenv('IGDB_CLIENT_SECRET'),
+    api_url=os.getenv('IGDB_API_URL', IGDB_API_URL),
+    auth_url=os.getenv('TWITCH_AUTH_URL', TWITCH_AUTH_URL),
+    connect_timeout=float(os.getenv('IGDB_CONNECT_TIMEOUT', 3.05)),
+    read_timeout=float(os.getenv('IGDB_READ_TIMEOUT', 10)),
+    max_retries=int(os.getenv('IGDB_MAX_RETRIES', 3)),
+    pool_size=int(os.getenv('IGDB_POOL_SIZE', 10)),
+    scheduler=igdb_scheduler
+)
+
+# For IGDB lookups that can overlap: chunks of a large id list, or per-title
+# suggestion lookups when a multiquery fails as a whole
+igdb_lookup_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv('IGDB_LOOKUP_WORKERS', 4)),
+    thread_name_prefix='igdb-lookup'
+)
+
+def submit_igdb_lookup(fn, *args):
+    """Run fn on igdb_lookup_pool, keeping the caller's IGDB priority."""
+    return igdb_lookup_pool.submit(contextvars.copy_context().run, fn, *args)
+
+# IGDB returns at most 500 results per query, so longer id lists are split up
+IGDB_MAX_IDS_PER_QUERY = 500
+
+# --- NEW: Conditional requests and compression ---
+# Library-derived responses may change at any time, so clients must revalidate (cheaply,
+# thanks to the ETag); public game data can be reused for a while.
+PRIVATE_CACHE_CONTROL = 'private, no-cache'
+GAME_DETAIL_CACHE_CONTROL = f"public, max-age={app.config['GAME_DETAIL_MAX_AGE']}"
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/csv', 'text/plain', 'text/html'}
+
+def make_etag(*parts):
+    """A strong ETag value derived from the given parts."""
+    return hashlib.sha256('|'.join(map(str, parts)).encode('utf-8')).hexdigest()[:32]
+
+def payload_etag(payload):
+    """ETag for a JSON-serialisable payload, e.g. a cached IGDB game."""
+    return make_etag(json.dumps(payload, sort_keys=True))
+
+def library_etag(stats, *parts):
+    """ETag for a response built from a user's library: changes with every library write."""
+    updated_at = stats.updated_at.isoformat() if stats.updated_at else ''
+    return make_etag(stats.user_id, stats.version, updated_at, *parts)
+
+def _http_date(naive_utc):
+    return naive_utc.replace(tzinfo=timezone.utc, microsecond=0) if naive_utc else None
+
+def not_modified(etag, last_modified=None, cache_control=None):
+    """
+    Return a 304 response if the client's copy (If-None-Match, else If-Modified-Since)
+    is current, otherwise None. Matches compressed variants of the ETag too, and echoes
+    back whichever one the client holds.
+    """
+    if request.if_none_match:
+        variants = (etag, f'{etag}-gzip', f'{etag}-br')
+        current = next((tag for tag in variants if request.if_none_match.contains(tag)), None)
+    elif last_modified and request.if_modified_since:
+        current = etag if _http_date(last_modified) <= request.if_modified_since else None
+    else:
+        current = None
+    if not current:
+        return None
+    return with_validators(Response(status=304), current, last_modified, cache_control)
+
+def with_validators(response, etag, last_modified=None, cache_control=None):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = _http_date(last_modified)
+    if cache_control:
+        response.headers['Cache-Control'] = cache_control
+    return response
+
+@app.after_request
+def compress_response(response):
+    """gzip or brotli-encode large text responses, whichever the client prefers."""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < app.config['COMPRESS_MIN_SIZE']:
+        return response
+
+    encoding = request.accept_encodings.best_match(['br', 'gzip'])
+    if encoding == 'br':
+        body = brotli.compress(body, quality=app.config['BROTLI_QUALITY'])
+    elif encoding == 'gzip':
+        body = gzip.compress(body, compresslevel=app.config['GZIP_LEVEL'])
+    else:
+        return response
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    # Each encoding is a different representation, so it needs its own strong ETag
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{"gzip" if encoding == "gzip" else "br"}')
+    return response
+
+# --- NEW: Cover image proxy ---
+# Each cover is fetched from IGDB's CDN once, in its largest useful size, and stored on
+# disk with every variant pre-generated; see covers.py.
+cover_cache = CoverCache(
+    app.config['COVER_CACHE_DIR'],
+    max_bytes=app.config['COVER_CACHE_MAX_BYTES'],
+    source_url=app.config['COVER_SOURCE_URL'],
+    quality=app.config['COVER_WEBP_QUALITY']
+)
+COVER_CACHE_CONTROL = f"public, max-age={app.config['COVER_MAX_AGE']}, immutable"
+
+def upgrade_cover(game):
+    """Swap in a larger IGDB cover URL, or our proxy's variants when COVER_PROXY_BASE_URL is set (in place)."""
+    upgrade_cover_url(game)
+    if app.config['COVER_PROXY_BASE_URL']:
+        proxy_cover_urls(game, f"{app.config['COVER_PROXY_BASE_URL'].rstrip('/')}/api/covers")
+    return game
+
+def send_cover(image_id, variant):
+    digest, path = cover_cache.get(image_id, variant)
+    # send_file hands the open file to the server (sendfile(2) under gunicorn)
+    return send_file(path, mimetype='image/webp', etag=f'{digest}-{variant}', conditional=True,
+                     max_age=app.config['COVER_MAX_AGE'])
+
+@app.route("/api/covers/<image_id>/<variant>.webp", methods=['GET'])
+def get_cover(image_id, variant):
+    if variant not in COVER_VARIANTS or not IMAGE_ID_PATTERN.match(image_id):
+        return jsonify({"error": "Cover not found"}), 404
+    try:
+        try:
+            response = send_cover(image_id, variant)
+        except FileNotFoundError:
+            # Evicted between the lookup and send_file(); eviction drops the image id's
+            # entry first, so the second lookup fetches the cover again
+            response = send_cover(image_id, variant)
+    except CoverNotFound:
+        return jsonify({"error": "Cover not found"}), 404
+    except (CoverError, SingleFlightTimeout, FileNotFoundError) as e:
+        return jsonify({"error": f"Failed to fetch cover: {e}"}), 502
+    response.headers['Cache-Control'] = COVER_CACHE_CONTROL
+    return response
+
+# --- NEW: IGDB GAME METADATA CACHE ---
+# Every field any endpoint needs from /v4/games, so the library, detail and
+# recommendation endpoints can all be served from the same cache entries.
+IGDB_GAME_FIELDS = (
+    'name, cover.url, first_release_date, summary, genres.name, platforms.name, '
+    'involved_companies.company.name, involved_companies.developer, involved_companies.publisher'
+)
+
+# The subset of a cached game returned by GET /api/library
+LIBRARY_GAME_FIELDS = ('id', 'name', 'cover', 'first_release_date')
+
+game_memory_cache = LRUCache(
+    maxsize=app.config['GAME_CACHE_MEMORY_SIZE'],
+    ttl=app.config['GAME_CACHE_MEMORY_TTL']
+)
+
+def _utcnow():
+    """Naive UTC 'now', matching how DateTime columns are stored."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def process_game(game):
+    """Flatten involved companies and upgrade the cover URL of a raw IGDB game object."""
+    developers = []
+    publishers = []
+    for entry in game.get('involved_companies', []):
+        company_name = entry.get('company', {}).get('name')
+        if company_name:
+            if entry.get('developer'):
+                developers.append(company_name)
+            if entry.get('publisher'):
+                publishers.append(company_name)
+
+    game['developers'] = list(set(developers)) # Use set to remove duplicates
+    game['publishers'] = list(set(publishers)) # Use set to remove duplicates
+
+    return upgrade_cover(game)
+
+def games_query(game_ids):
+    """The /v4/games query for up to IGDB_MAX_IDS_PER_QUERY ids."""
+    return f'fields {IGDB_GAME_FIELDS}; where id = ({",".join(map(str, game_ids))}); limit {len(game_ids)};'
+
+def _fetch_games_chunk(game_ids):
+    return igdb.query('games', games_query(game_ids))
+
+def fetch_games_from_igdb(game_ids):
+    """
+    Fetch and process the given games straight from IGDB, bypassing the cache. Lists
+    longer than IGDB_MAX_IDS_PER_QUERY are split into chunks, fetched in parallel when
+    IGDB_PARALLEL_CHUNKS is on.
+    """
+    chunks = [game_ids[i:i + IGDB_MAX_IDS_PER_QUERY] for i in range(0, len(game_ids), IGDB_MAX_IDS_PER_QUERY)]
+    if len(chunks) > 1 and app.config['IGDB_PARALLEL_CHUNKS']:
+        results = [future.result() for future in [submit_igdb_lookup(_fetch_games_chunk, chunk) for chunk in chunks]]
+    else:
+        results = [_fetch_games_chunk(chunk) for chunk in chunks]
+    return {game['id']: process_game(game) for chunk in results for game in chunk}
 
-def get_igdb_token():
-    """Gets a new IGDB access token if the current one is expired."""
-    global igdb_access_token, token_expires_at
-    
-    # If token exists and is not about to expire, return it
-    if igdb_access_token and token_expires_at > datetime.now(timezone.utc) + timedelta(minutes=1):
-        return igdb_access_token
+def store_games_in_cache(games):
+    """Write freshly fetched games to both cache tiers (the DB tier's bounds are enforced separately)."""
+    for game_id, game in games.items():
+        game_memory_cache.set(game_id, game)
 
+    now = _utcnow()
     try:
-        response = requests.post(
-            TWITCH_AUTH_URL,
-            params={
-                'client_id': IGDB_CLIENT_ID,
-                'client_secret': IGDB_CLIENT_SECRET,
-                'grant_type': 'client_credentials'
-            }
+        GameCache.query.filter(GameCache.igdb_game_id.in_(list(games))).delete(synchronize_session=False)
+        db.session.add_all([
+            GameCache(igdb_game_id=game_id, data=json.dumps(game), fetched_at=now)
+            for game_id, game in games.items()
+        ])
+        db.session.commit()
+    except IntegrityError:
+        # Another worker cached the same game at the same time; its copy is just as good.
+        db.session.rollback()
+    maybe_prune_game_cache()
+
+_game_cache_pruned_at = time.monotonic()
+_game_cache_prune_lock = threading.Lock()
+
+def maybe_prune_game_cache():
+    """
+    Prune at most once per GAME_CACHE_PRUNE_INTERVAL in this process, in its own
+    transaction, so cache writes neither pay for the count nor lose their rows if it fails.
+    """
+    global _game_cache_pruned_at
+    interval = app.config['GAME_CACHE_PRUNE_INTERVAL']
+    if interval <= 0 or time.monotonic() - _game_cache_pruned_at < interval:
+        return
+    if not _game_cache_prune_lock.acquire(blocking=False):
+        return # Another thread is already pruning
+    try:
+        _game_cache_pruned_at = time.monotonic()
+        prune_game_cache()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        print(f"Pruning the game cache failed: {e}")
+    finally:
+        _game_cache_prune_lock.release()
+
+def prune_game_cache():
+    """Drop expired rows, then the oldest rows beyond GAME_CACHE_DB_MAX_ROWS."""
+    cutoff = _utcnow() - timedelta(seconds=app.config['GAME_CACHE_DB_TTL'])
+    GameCache.query.filter(GameCache.fetched_at <= cutoff).delete(synchronize_session=False)
+
+    max_rows = app.config['GAME_CACHE_DB_MAX_ROWS']
+    if GameCache.query.count() > max_rows:
+        overflow = db.session.query(GameCache.igdb_game_id).order_by(
+            GameCache.fetched_at.desc()
+        ).offset(max_rows).subquery()
+        GameCache.query.filter(
+            GameCache.igdb_game_id.in_(db.select(overflow.c.igdb_game_id))
+        ).delete(synchronize_session=False)
+    db.session.commit()
+
+# --- NEW: Request coalescing ---
+# Concurrent identical upstream calls (the same search text, the same Gemini prompt)
+# share one in-flight call; game id lookups are shared by game_loader below. `upstream_flight.stats()` counts how
+# many were collapsed.
+upstream_flight = SingleFlight(timeout=app.config['SINGLE_FLIGHT_TIMEOUT'])
+# Every single-flight group, by name, for /metrics (the ASGI entry point adds its own)
+upstream_flights = {'upstream': upstream_flight, 'igdb-token': igdb.token_flight}
+
+def igdb_single_flight(key, fn):
+    """Run an IGDB call through upstream_flight; a timed-out wait surfaces like an IGDB timeout."""
+    try:
+        return upstream_flight.do(('igdb',) + key, fn)
+    except SingleFlightTimeout as e:
+        raise requests.exceptions.Timeout(str(e)) from e
+
+def fetch_and_cache_games(game_ids):
+    fetched = fetch_games_from_igdb(game_ids)
+    if fetched:
+        store_games_in_cache(fetched)
+    return fetched
+
+# Id lookups from concurrent requests (details, library pages, recommendations) that
+# arrive within a few milliseconds go out as one `where id = (...)` query. Ids already
+# being fetched are shared rather than fetched again.
+game_loader = BatchLoader(fetch_and_cache_games, window=app.config['IGDB_BATCH_WINDOW_MS'] / 1000)
+
+def get_stored_games(game_ids):
+    """
+    Look the ids up in the in-process cache, the DB cache and the local catalog mirror.
+    Returns ({igdb_id: game} found, [ids still missing]).
+    """
+    games = {}
+    missing = []
+    for game_id in dict.fromkeys(game_ids): # De-duplicate while keeping order
+        game = game_memory_cache.get(game_id)
+        if game is not None:
+            games[game_id] = game
+        else:
+            missing.append(game_id)
+
+    if missing:
+        cutoff = _utcnow() - timedelta(seconds=app.config['GAME_CACHE_DB_TTL'])
+        rows = GameCache.query.filter(
+            GameCache.igdb_game_id.in_(missing),
+            GameCache.fetched_at > cutoff
+        ).all()
+        for row in rows:
+            game = json.loads(row.data)
+            games[row.igdb_game_id] = game
+            game_memory_cache.set(row.igdb_game_id, game)
+        missing = [game_id for game_id in missing if game_id not in games]
+
+    if missing and catalog_enabled():
+        for game_id, game in get_catalog_games(missing).items():
+            games[game_id] = game
+            game_memory_cache.set(game_id, game)
+        missing = [game_id for game_id in missing if game_id not in games]
+
+    return games, missing
+
+def get_games_by_ids(game_ids):
+    """
+    Return {igdb_id: game} for the given ids, checking the in-process cache, the DB
+    cache and the local catalog mirror, and only asking IGDB for whatever is still
+    missing (in as few queries as IGDB allows).
+    The returned objects are shared with the cache and must be treated as read-only.
+    Ids IGDB doesn't know about are simply absent from the result.
+    """
+    games, missing = get_stored_games(game_ids)
+    if missing:
+        try:
+            games.update(game_loader.load_many(missing, timeout=app.config['SINGLE_FLIGHT_TIMEOUT']))
+        except TimeoutError as e:
+            raise requests.exceptions.Timeout(f"Timed out waiting for IGDB game lookups: {e}") from e
+
+    return games
+
+def invalidate_game_cache(game_ids=None):
+    """
+    Forget cached metadata for the given IGDB ids (or everything if None).
+    Only this process's in-memory tier is cleared; other workers' copies expire
+    after GAME_CACHE_MEMORY_TTL.
+    """
+    if game_ids is None:
+        game_memory_cache.clear()
+        GameCache.query.delete(synchronize_session=False)
+    else:
+        for game_id in game_ids:
+            game_memory_cache.delete(game_id)
+        GameCache.query.filter(GameCache.igdb_game_id.in_(list(game_ids))).delete(synchronize_session=False)
+    db.session.commit()
+
+# --- NEW: LOCAL IGDB CATALOG ---
+# Fields mirrored from each endpoint, in sync order (games reference genres and platforms)
+CATALOG_ENDPOINTS = {
+    'genres': 'id, name, updated_at',
+    'platforms': 'id, name, updated_at',
+    'games': 'id, name, slug, summary, first_release_date, category, cover, genres, platforms, updated_at',
+    'covers': 'id, game, image_id, url, updated_at',
+    'involved_companies': 'id, game, company.name, developer, publisher, updated_at',
+}
+CATALOG_PAGE_SIZE = 500 # IGDB's maximum page size
+CATALOG_SYNC_COMPLETE = '_complete' # CatalogSyncState marker row, written once every endpoint has synced
+
+_catalog_available = LRUCache(maxsize=1, ttl=60)
+
+def catalog_enabled():
+    """
+    Whether reads should use the local catalog: CATALOG_MODE=auto uses it once a sync of
+    every endpoint has completed, so an interrupted first sync never serves partial results.
+    """
+    if app.config['CATALOG_MODE'] == 'off':
+        return False
+    available = _catalog_available.get('games')
+    if available is None:
+        available = (
+            db.session.get(CatalogSyncState, CATALOG_SYNC_COMPLETE) is not None
+            and db.session.query(CatalogGame.id).limit(1).first() is not None
         )
-        response.raise_for_status() # Raises an exception for bad responses (4xx or 5xx)
-        data = response.json()
-        
-        igdb_access_token = data['access_token']
-        # Set expiration time (with a small buffer)
-        token_expires_at = datetime.now(timezone.utc) + timedelta(seconds=data['expires_in'] - 300)
-        
-        print("Successfully obtained new IGDB token.")
-        return igdb_access_token
-    except requests.exceptions.RequestException as e:
-        print(f"Error getting IGDB token: {e}")
-        return None
+        _catalog_available.set('games', available)
+    return available
+
+def dialect_insert(table):
+    """The INSERT construct with ON CONFLICT support for the current database (SQLite or Postgres)."""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"Upserts are not supported on {dialect}")
+    return insert(table)
+
+def _upsert(table, rows, key='id'):
+    if not rows:
+        return
+    statement = dialect_insert(table).values(rows)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[key],
+        set_={column: statement.excluded[column] for column in rows[0] if column != key}
+    ))
+
+def _replace_links(table, game_ids, links):
+    db.session.execute(table.delete().where(table.c.game_id.in_(game_ids)))
+    if links:
+        db.session.execute(dialect_insert(table).values(links).on_conflict_do_nothing())
+
+def store_catalog_page(endpoint, records):
+    """Upsert one page of IGDB records into the normalized catalog tables."""
+    if endpoint in ('genres', 'platforms'):
+        model = CatalogGenre if endpoint == 'genres' else CatalogPlatform
+        _upsert(model.__table__, [
+            {'id': r['id'], 'name': r.get('name', ''), 'updated_at': r.get('updated_at')} for r in records
+        ])
+    elif endpoint == 'games':
+        _upsert(CatalogGame.__table__, [{
+            'id': r['id'],
+            'name': r.get('name', ''),
+            'slug': r.get('slug'),
+            'summary': r.get('summary'),
+            'first_release_date': r.get('first_release_date'),
+            'category': r.get('category'),
+            'cover_id': r.get('cover'),
+            'updated_at': r.get('updated_at'),
+        } for r in records])
+        game_ids = [r['id'] for r in records]
+        _replace_links(catalog_game_genre, game_ids, [
+            {'game_id': r['id'], 'genre_id': genre_id} for r in records for genre_id in r.get('genres', [])
+        ])
+        _replace_links(catalog_game_platform, game_ids, [
+            {'game_id': r['id'], 'platform_id': platform_id} for r in records for platform_id in r.get('platforms', [])
+        ])
+    elif endpoint == 'covers':
+        _upsert(CatalogCover.__table__, [{
+            'id': r['id'],
+            'game_id': r.get('game'),
+            'image_id': r.get('image_id'),
+            'url': r.get('url'),
+            'updated_at': r.get('updated_at'),
+        } for r in records])
+    elif endpoint == 'involved_companies':
+        _upsert(CatalogInvolvedCompany.__table__, [{
+            'id': r['id'],
+            'game_id': r.get('game'),
+            'company_id': (r.get('company') or {}).get('id'),
+            'company_name': (r.get('company') or {}).get('name'),
+            'developer': bool(r.get('developer')),
+            'publisher': bool(r.get('publisher')),
+            'updated_at': r.get('updated_at'),
+        } for r in records])
+
+def iter_igdb_pages(endpoint, since, until):
+    """Page through every record of an endpoint updated in (since, until], in id order."""
+    offset = 0
+    while True:
+        page = igdb.query(endpoint, (
+            f'fields {CATALOG_ENDPOINTS[endpoint]}; where updated_at > {since} & updated_at <= {until}; '
+            f'sort id asc; limit {CATALOG_PAGE_SIZE}; offset {offset};'
+        ))
+        if page:
+            yield page
+        if len(page) < CATALOG_PAGE_SIZE:
+            return
+        offset += CATALOG_PAGE_SIZE
+
+def sync_catalog(endpoints=None, full=False, dump=None, record=None):
+    """
+    Mirror IGDB endpoints into the catalog tables. Each endpoint resumes from the highest
+    updated_at it has synced (unless `full`). With `dump` (a dict of endpoint -> records,
+    as written by `record`), nothing is fetched from the network.
+    Returns {endpoint: records stored}.
+    """
+    counts = {}
+    recorded = {}
+    for endpoint in endpoints or CATALOG_ENDPOINTS:
+        state = db.session.get(CatalogSyncState, endpoint) or CatalogSyncState(endpoint=endpoint, last_updated_at=0)
+        since = 0 if full else state.last_updated_at
+        until = int(time.time())
+
+        if dump is not None:
+            records = [r for r in dump.get(endpoint, []) if (r.get('updated_at') or 0) > since]
+            pages = [records[i:i + CATALOG_PAGE_SIZE] for i in range(0, len(records), CATALOG_PAGE_SIZE)]
+            until = max([r.get('updated_at') or 0 for r in records] + [since])
+        else:
+            pages = iter_igdb_pages(endpoint, since, until)
+
+        counts[endpoint] = 0
+        for page in pages:
+            store_catalog_page(endpoint, page)
+            db.session.commit() # One transaction per page keeps long syncs restartable
+            counts[endpoint] += len(page)
+            if record is not None:
+                recorded.setdefault(endpoint, []).extend(page)
+            print(f"  {endpoint}: {counts[endpoint]} records")
+
+        state.last_updated_at = until
+        state.synced_at = _utcnow()
+        db.session.merge(state)
+        db.session.commit()
 
-# --- NEW: SEARCH ENDPOINT ---
-@app.route("/api/search", methods=['POST'])
-def search_games():
-    search_text = request.json.get('searchText')
-    if not search_text:
-        return jsonify({"error": "Search text is required"}), 400
+    if record is not None:
+        with open(record, 'w', encoding='utf-8') as f:
+            json.dump(recorded, f)
 
-    token = get_igdb_token()
-    if not token:
-        return jsonify({"error": "Could not authenticate with IGDB service"}), 500
+    ensure_catalog_search_index(rebuild=True)
+    synced = {endpoint for (endpoint,) in db.session.query(CatalogSyncState.endpoint)}
+    if synced >= set(CATALOG_ENDPOINTS):
+        db.session.merge(CatalogSyncState(endpoint=CATALOG_SYNC_COMPLETE, last_updated_at=0, synced_at=_utcnow()))
+        db.session.commit()
+    _catalog_available.clear()
+    search_cache.clear()
+    return counts
+
+def ensure_catalog_search_index(rebuild=False):
+    """Create the full-text index over game names: FTS5 on SQLite, a tsvector GIN index on Postgres."""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        db.session.execute(db.text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS catalog_game_fts USING fts5("
+            "name, content='catalog_game', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        ))
+        if rebuild:
+            db.session.execute(db.text("INSERT INTO catalog_game_fts(catalog_game_fts) VALUES('rebuild')"))
+    elif dialect == 'postgresql':
+        db.session.execute(db.text(
+            "CREATE INDEX IF NOT EXISTS ix_catalog_game_name_tsv ON catalog_game "
+            "USING GIN (to_tsvector('simple', name))"
+        ))
+    db.session.commit()
 
-    igdb_api_url = 'https://api.igdb.com/v4/games'
-    
+def search_catalog(search_text, limit=20):
+    """Prefix (typeahead) full-text search over main games in the catalog, best matches first."""
+    tokens = re.findall(r'\w+', search_text.lower())
+    if not tokens:
+        return []
+
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        # Every token must match, the last one (and each other) as a prefix
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        rows = db.session.execute(db.text(
+            "SELECT g.id FROM catalog_game_fts f JOIN catalog_game g ON g.id = f.rowid "
+            "WHERE catalog_game_fts MATCH :match AND g.category = 0 ORDER BY f.rank LIMIT :limit"
+        ), {'match': match, 'limit': limit})
+    elif dialect == 'postgresql':
+        query = ' & '.join(f'{token}:*' for token in tokens)
+        rows = db.session.execute(db.text(
+            "SELECT id FROM catalog_game "
+            "WHERE category = 0 AND to_tsvector('simple', name) @@ to_tsquery('simple', :query) "
+            "ORDER BY ts_rank(to_tsvector('simple', name), to_tsquery('simple', :query)) DESC LIMIT :limit"
+        ), {'query': query, 'limit': limit})
+    else:
+        return []
+
+    ids = [row[0] for row in rows]
+    games = {game.id: game for game in CatalogGame.query.filter(CatalogGame.id.in_(ids))}
+    return [catalog_game_summary(games[game_id]) for game_id in ids if game_id in games]
+
+def _catalog_cover(game):
+    if game.cover and game.cover.url:
+        return {'id': game.cover.id, 'url': game.cover.url}
+    return None
+
+def catalog_game_summary(game):
+    """A catalog game in the shape /api/search returns."""
+    summary = {'id': game.id, 'name': game.name}
+    cover = _catalog_cover(game)
+    if cover:
+        summary['cover'] = cover
+    if game.first_release_date is not None:
+        summary['first_release_date'] = game.first_release_date
+    if game.summary:
+        summary['summary'] = game.summary
+    return upgrade_cover(summary)
+
+def get_catalog_games(game_ids):
+    """{igdb_id: game} for catalog games, in the same shape as process_game() output."""
+    games = {}
+    for game in CatalogGame.query.filter(CatalogGame.id.in_(game_ids)):
+        details = catalog_game_summary(game)
+        details['genres'] = [{'id': genre.id, 'name': genre.name} for genre in game.genres]
+        details['platforms'] = [{'id': platform.id, 'name': platform.name} for platform in game.platforms]
+        details['involved_companies'] = [{
+            'id': entry.id,
+            'company': {'id': entry.company_id, 'name': entry.company_name},
+            'developer': entry.developer,
+            'publisher': entry.publisher,
+        } for entry in game.involved_companies]
+        games[game.id] = process_game(details)
+    return games
+
+# --- NEW: Search result cache ---
+SEARCH_LIMIT = 20
+
+# (source, normalized text) -> (games, exhaustive). `exhaustive` means the search returned
+# fewer than SEARCH_LIMIT games, i.e. everything that matched.
+search_cache = LRUCache(maxsize=app.config['SEARCH_CACHE_SIZE'], ttl=app.config['SEARCH_CACHE_TTL'])
+SEARCH_PREFIX_HITS = REGISTRY.counter(
+    'gameup_search_prefix_hits_total', 'Searches answered by filtering a cached shorter prefix.'
+)
+
+def normalize_search_text(text):
+    """'  Zelda  BOTW ' -> 'zelda botw', so near-duplicate searches share a cache entry."""
+    return ' '.join(text.lower().split())
+
+def fold_diacritics(text):
+    """'Pokémon' -> 'Pokemon', as the catalog's FTS tokenizer (remove_diacritics) folds names."""
+    return ''.join(c for c in unicodedata.normalize('NFD', text) if not unicodedata.combining(c))
+
+def matches_search_tokens(name, tokens):
+    """Every search token is a prefix of some word in the name (the catalog's matching rule)."""
+    words = re.findall(r'\w+', fold_diacritics((name or '').lower()))
+    tokens = [fold_diacritics(token) for token in tokens]
+    return all(any(word.startswith(token) for word in words) for token in tokens)
+
+def get_cached_search(source, text):
+    """
+    Return (games, how) from the search cache, or (None, 'MISS'). A typeahead search like
+    'zelda' can be answered from a cached 'zel' result by filtering it, but only if that
+    result was exhaustive: a truncated list may be missing games that match the longer text.
+    Only catalog results qualify, as the catalog matches on word prefixes; IGDB's search
+    matches whole words, so its 'zel' results say nothing about 'zelda'.
+    """
+    cached = search_cache.get((source, text))
+    if cached is not None:
+        return cached[0], 'HIT'
+    if source != 'catalog':
+        return None, 'MISS'
+
+    tokens = re.findall(r'\w+', text)
+    for length in range(len(text) - 1, 0, -1):
+        shorter = search_cache.peek((source, text[:length]))
+        if shorter is not None and shorter[1]:
+            games = [game for game in shorter[0] if matches_search_tokens(game.get('name'), tokens)]
+            search_cache.set((source, text), (games, True))
+            SEARCH_PREFIX_HITS.inc()
+            return games, 'PREFIX'
+    return None, 'MISS'
+
+def search_source():
+    """Serve searches from the local catalog mirror when we have one, IGDB otherwise."""
+    return 'catalog' if catalog_enabled() else 'igdb'
+
+def igdb_search_query(text):
+    """The /v4/games search query for `text` (escaped)."""
     # IGDB's query language is plain text. This query searches for the game title
     # and requests specific fields. We also get the cover art.
     # MODIFIED: Added a 'where' clause to filter by category.
     # 0 = main_game, 4 = standalone_expansion. This filters out DLC, expansions, etc.
-    query_body = f'fields name, cover.url, first_release_date, summary; search "{search_text}"; where category = (0); limit 20;'
+    return (
+        f'fields name, cover.url, first_release_date, summary; search "{escape_query_string(text)}"; '
+        f'where category = (0); limit {SEARCH_LIMIT};'
+    )
+
+def search_source_games(source, text):
+    """Run a search against the catalog mirror or IGDB."""
+    if source == 'catalog':
+        return search_catalog(text, limit=SEARCH_LIMIT)
+
+    games = igdb.query('games', igdb_search_query(text))
+    # Format the data to be more frontend-friendly
+    for game in games:
+        upgrade_cover(game)
+    return games
+
+def cache_search_results(source, text, games):
+    search_cache.set((source, text), (games, len(games) < SEARCH_LIMIT))
+    return games
+
+def search_and_cache(source, text):
+    return cache_search_results(source, text, search_source_games(source, text))
+
+def igdb_error_response(e):
+    """The error response for an IGDB call that failed with `e` (a requests exception)."""
+    if isinstance(e, IGDBAuthError):
+        return jsonify({"error": "Could not authenticate with IGDB service"}), 500
+    if isinstance(e, IGDBRateLimited):
+        return jsonify({"error": "IGDB is busy, please try again shortly"}), 503, {'Retry-After': '1'}
+    return jsonify({"error": f"Failed to fetch data from IGDB: {e}"}), 502
 
-    headers = {
-        'Client-ID': IGDB_CLIENT_ID,
-        'Authorization': f'Bearer {token}'
-    }
+# --- NEW: SEARCH ENDPOINT ---
+def search_request_options():
+    """
+    (normalized search text, options) from GET ?q=... or the POST body's searchText.
+    Raises ValueError if the search text isn't a string.
+    """
+    # GET /api/search?q=... is the cacheable (conditional) form of the POST body's searchText
+    if request.method == 'GET':
+        options = request.args
+        search_text = options.get('q') or ''
+    else:
+        options = request.get_json(silent=True)
+        options = options if isinstance(options, dict) else {}
+        search_text = options.get('searchText') or ''
+    if not isinstance(search_text, str):
+        raise ValueError("Search text must be a string")
+    return normalize_search_text(search_text), options
+
+def parse_flag(value):
+    """A boolean option from a JSON body (true/1) or a query string ('1', 'true', 'yes', 'on')."""
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return isinstance(value, (bool, int)) and bool(value)
+
+def wants_library_status(options):
+    return parse_flag(options.get('includeStatus')) or parse_flag(request.args.get('include_status'))
+
+def search_response(games, cache_status, current_user=None):
+    """
+    The search response, with the current user's library status attached to every result
+    if given (saving the frontend one status request per card).
+    """
+    # Cached result lists are shared, so decorate copies.
+    cache_control = f"public, max-age={app.config['SEARCH_CACHE_TTL']}"
+    if current_user:
+        statuses = get_library_statuses(current_user.id, [game['id'] for game in games])
+        games = [dict(game, library_status=statuses[game['id']]) for game in games]
+        cache_control = PRIVATE_CACHE_CONTROL
 
+    etag = payload_etag(games)
+    if request.method == 'GET':
+        cached = not_modified(etag, cache_control=cache_control)
+        if cached:
+            cached.headers['X-Cache'] = cache_status
+            cached.vary.add('Authorization')
+            return cached
+
+    response = with_validators(jsonify(games), etag, cache_control=cache_control)
+    response.headers['X-Cache'] = cache_status
+    # The same URL answers with per-user statuses when a token is sent, so shared caches
+    # must not hand an anonymous (public) copy to authenticated callers or vice versa
+    response.vary.add('Authorization')
+    return response, 200
+
+@app.route("/api/search", methods=['GET', 'POST'])
+def search_games():
     try:
-        response = requests.post(igdb_api_url, headers=headers, data=query_body)
-        response.raise_for_status()
-        
-        # Format the data to be more frontend-friendly
-        games = response.json()
-        for game in games:
-            if 'cover' in game and 'url' in game['cover']:
-                # The returned URL is small. We can replace 't_thumb' with a larger image size.
-                game['cover']['url'] = game['cover']['url'].replace('t_thumb', 't_cover_big')
-
-        return jsonify(games), 200
+        search_text, options = search_request_options()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not search_text:
+        return jsonify({"error": "Search text is required"}), 400
 
+    try:
+        source = search_source()
+        games, cache_status = get_cached_search(source, search_text)
+        if games is None:
+            games = igdb_single_flight(
+                ('search', source, search_text), lambda: search_and_cache(source, search_text)
+            )
     except requests.exceptions.RequestException as e:
-        return jsonify({"error": f"Failed to fetch data from IGDB: {e}"}), 502
+        return igdb_error_response(e)
+
+    # Anonymous callers just get the games
+    current_user = get_optional_user() if wants_library_status(options) else None
+    return search_response(games, cache_status, current_user)
     
 # --- NEW: SINGLE GAME DETAIL ENDPOINT ---
+def game_detail_response(game):
+    if not game:
+        return jsonify({"error": "Game not found"}), 404
+
+    etag = payload_etag(game)
+    cached = not_modified(etag, cache_control=GAME_DETAIL_CACHE_CONTROL)
+    if cached:
+        return cached
+    return with_validators(jsonify(game), etag, cache_control=GAME_DETAIL_CACHE_CONTROL), 200
+
 @app.route("/api/game/<int:igdb_id>", methods=['GET'])
 def get_game_details(igdb_id):
-    token = get_igdb_token()
-    if not token:
-        return jsonify({"error": "Could not authenticate with IGDB service"}), 500
-    
-    igdb_api_url = 'https://api.igdb.com/v4/games'
-    # A more detailed query for a single game page
-    query_body = f'''
-        fields 
-            name, 
-            cover.url, 
-            first_release_date, 
-            summary, 
-            genres.name, 
-            platforms.name,
-            involved_companies.company.name,
-            involved_companies.developer,
-            involved_companies.publisher;
-        where id = {igdb_id};
-    '''
-    
-    headers = {
-        'Client-ID': IGDB_CLIENT_ID,
-        'Authorization': f'Bearer {token}'
-    }
-
     try:
-        response = requests.post(igdb_api_url, headers=headers, data=query_body)
-        response.raise_for_status()
-        game_data = response.json()
-
-        if not game_data:
-            return jsonify({"error": "Game not found"}), 404
-
-        # Clean up the cover URL as before
-        game = game_data[0]
-         # Process the 'involved_companies' data
-        developers = []
-        publishers = []
-        if 'involved_companies' in game:
-            for entry in game['involved_companies']:
-                company_name = entry.get('company', {}).get('name')
-                if company_name:
-                    if entry.get('developer'):
-                        developers.append(company_name)
-                    if entry.get('publisher'):
-                        publishers.append(company_name)
-        
-        # Add the processed lists to our game object
-        game['developers'] = list(set(developers)) # Use set to remove duplicates
-        game['publishers'] = list(set(publishers)) # Use set to remove duplicates
-
-        if 'cover' in game and 'url' in game['cover']:
-            game['cover']['url'] = game['cover']['url'].replace('t_thumb', 't_cover_big')
-
-        return jsonify(game), 200
+        game = get_games_by_ids([igdb_id]).get(igdb_id)
     except requests.exceptions.RequestException as e:
-        return jsonify({"error": f"Failed to fetch data from IGDB: {e}"}), 502
+        return igdb_error_response(e)
+    return game_detail_response(game)
     
+# --- NEW: Library statistics ---
+def count_library_statuses(user_ids=None):
+    """One GROUP BY over UserGame: {user_id: {status: count}} for the given users (or everyone)."""
+    query = db.session.query(UserGame.user_id, UserGame.status, db.func.count()).group_by(UserGame.user_id, UserGame.status)
+    if user_ids is not None:
+        query = query.filter(UserGame.user_id.in_(user_ids))
+    counts = {}
+    for user_id, status, count in query:
+        counts.setdefault(user_id, {})[status] = count
+    return counts
+
+def _stats_row(user_id, counts):
+    return UserLibraryStats(user_id=user_id, **{status.lower(): counts.get(status, 0) for status in LIBRARY_STATUSES})
+
+def rebuild_library_stats(user_id):
+    """Recompute a user's counters from UserGame in the current transaction (caller commits)."""
+    db.session.flush() # Make pending library changes visible to the aggregate
+    counts = count_library_statuses([user_id]).get(user_id, {})
+    existing = db.session.get(UserLibraryStats, user_id)
+    row = _stats_row(user_id, counts)
+    row.version = (existing.version if existing else 0) + 1
+    row.updated_at = _utcnow()
+    return db.session.merge(row)
+
+def adjust_library_stats(user_id, old_status=None, new_status=None):
+    """
+    Apply one library change to the user's counters in the current transaction, so they
+    commit (or roll back) together with the UserGame change. Call it once that change is
+    flushed: existing rows get atomic col = col +/- 1 updates, while a user without a
+    counters row gets one built from a single aggregate that already includes the change.
+    """
+    if old_status == new_status:
+        return
+    values = {}
+    if old_status in LIBRARY_STATUSES:
+        column = old_status.lower()
+        values[column] = getattr(UserLibraryStats, column) - 1
+    if new_status in LIBRARY_STATUSES:
+        column = new_status.lower()
+        values[column] = getattr(UserLibraryStats, column) + 1
+    values['version'] = UserLibraryStats.version + 1
+    values['updated_at'] = _utcnow()
+
+    updated = UserLibraryStats.query.filter_by(user_id=user_id).update(values, synchronize_session=False)
+    if not updated:
+        rebuild_library_stats(user_id)
+
+def get_library_stats_row(user_id):
+    """The user's UserLibraryStats row, created from a single aggregate if missing."""
+    stats = db.session.get(UserLibraryStats, user_id)
+    if stats is None:
+        stats = rebuild_library_stats(user_id)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent library change created the row first
+            db.session.rollback()
+            stats = db.session.get(UserLibraryStats, user_id)
+    return stats
+
+def get_library_stats(user_id):
+    """The user's {status: count} map; a single primary-key lookup once the counters exist."""
+    return get_library_stats_row(user_id).counts()
+
 @app.route("/api/profile", methods=['GET'])
 @token_required
 def get_user_profile(current_user):
-    # The @token_required decorator already fetches the user object for us.
-    # We can just return the data we need in a JSON format.
-    completed_games_count = UserGame.query.filter_by(user_id=current_user.id, status="Completed").count()
-    return jsonify({
+    # The @token_required decorator already gives us the user's identity, and the
+    # per-user counters make the statistics a single primary-key lookup.
+    stats = get_library_stats_row(current_user.id)
+    etag = library_etag(stats, 'profile', current_user.username, current_user.email)
+    cached = not_modified(etag, stats.updated_at, PRIVATE_CACHE_CONTROL)
+    if cached:
+        return cached
+
+    status_counts = stats.counts()
+    return with_validators(jsonify({
         "id": current_user.id,
         "username": current_user.username,
         "email": current_user.email,
-        "completed_games_count": completed_games_count
-    }), 200
+        "completed_games_count": status_counts["Completed"],
+        "total_games_count": sum(status_counts.values()),
+        "status_counts": status_counts
+    }), etag, stats.updated_at, PRIVATE_CACHE_CONTROL), 200
 
-@app.route("/api/recommendations", methods=['GET'])
-@token_required
-def get_ai_recommendations(current_user):
-    # 1. Fetch user's completed games from our database
-    completed_games_from_db = UserGame.query.filter_by(user_id=current_user.id, status="Completed").all()
-    if not completed_games_from_db:
-        return jsonify({"error": "You need to complete at least one game to get AI recommendations."}), 400
+# --- NEW: Resolving AI suggestions against IGDB ---
 
-    completed_game_ids = [game.igdb_game_id for game in completed_games_from_db]
+def suggestion_query(game_title):
+    return f'fields name, cover.url; search "{escape_query_string(game_title)}"; limit 1;'
 
-    # 2. Fetch the names of these games from IGDB
-    token = get_igdb_token()
-    if not token: return jsonify({"error": "Could not authenticate with IGDB."}), 500
+def suggestion_recommendation(suggestion, game_details):
+    """Pair an AI suggestion with its IGDB search result, or None if IGDB found nothing."""
+    if not game_details:
+        return None
+    # Combine AI reason with IGDB details
+    return {
+        "reason": suggestion.get('reason'),
+        "details": upgrade_cover(game_details[0])
+    }
+
+def resolve_suggestions(suggestions, on_result=None):
+    """
+    Look up the IGDB entry for each AI suggestion and pair it with the AI's reason.
+    All titles go out in a single multiquery; if that request fails, each title is looked
+    up separately on a small worker pool so one bad suggestion doesn't ruin the whole list.
+    `on_result`, if given, is called with each recommendation as soon as it resolves.
+    """
+    titled = [s for s in suggestions if s.get('title')]
+    resolved = {} # suggestion index -> recommendation
+
+    def combine(index, game_details):
+        recommendation = suggestion_recommendation(titled[index], game_details)
+        if recommendation:
+            resolved[index] = recommendation
+            if on_result:
+                on_result(recommendation)
 
-    igdb_api_url = 'https://api.igdb.com/v4/games'
-    query_body = f'fields name; where id = ({",".join(map(str, completed_game_ids))});'
-    headers = {'Client-ID': IGDB_CLIENT_ID, 'Authorization': f'Bearer {token}'}
-    
     try:
-        response = requests.post(igdb_api_url, headers=headers, data=query_body)
-        response.raise_for_status()
-        completed_games_names = [game['name'] for game in response.json()]
-    except requests.exceptions.RequestException:
-        return jsonify({"error": "Failed to fetch completed games details from IGDB."}), 502
-    
-    # 3. Craft the prompt for the AI
-    model = genai.GenerativeModel('gemini-2.5-flash')
-    
-    prompt = f"""
+        results = igdb.multiquery([
+            (str(index), 'games', suggestion_query(s['title'])) for index, s in enumerate(titled)
+        ])
+        for index in range(len(titled)):
+            combine(index, results.get(str(index)))
+    except requests.exceptions.RequestException as e:
+        print(f"IGDB multiquery failed, falling back to individual lookups: {e}")
+        futures = {
+            submit_igdb_lookup(igdb.query, 'games', suggestion_query(s['title'])): index
+            for index, s in enumerate(titled)
+        }
+        for future in as_completed(futures):
+            try:
+                combine(futures[future], future.result())
+            except requests.exceptions.RequestException:
+                print(f"Could not fetch details for AI suggestion: {titled[futures[future]]['title']}")
+
+    # Keep the AI's ordering
+    return [resolved[index] for index in sorted(resolved)]
+
+def server_timing_header(timings):
+    """Format {step: seconds} as a Server-Timing header value."""
+    return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in timings.items())
+
+class RecommendationError(Exception):
+    """A recommendation run failed; carries the message and HTTP status to report."""
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+def get_completed_game_ids(user_id):
+    """Sorted IGDB ids of the games the user has marked as Completed."""
+    rows = db.session.query(UserGame.igdb_game_id).filter_by(user_id=user_id, status="Completed").all()
+    return sorted(row.igdb_game_id for row in rows)
+
+def build_recommendation_prompt(completed_games_names):
+    return f"""
     You are a video game recommendation expert. Based on this list of games a user has completed, suggest exactly 3 new games they might enjoy.
     The user has completed: {', '.join(completed_games_names)}.
 
@@ -362,43 +1554,523 @@ def get_ai_recommendations(current_user):
     ]
     """
 
-    # 4. Call the AI and process the response
+def gemini_prompt_key(prompt):
+    """Single-flight key for a Gemini call."""
+    return ('gemini', app.config['GEMINI_MODEL'], hashlib.sha256(prompt.encode('utf-8')).hexdigest())
+
+def parse_suggestions(ai_response_text):
+    """The suggestion list from Gemini's answer; raises ValueError if it isn't one."""
+    # Clean up the response text to ensure it's valid JSON
+    cleaned_response_text = ai_response_text.strip().replace('```json', '').replace('```', '')
+    suggestions = json.loads(cleaned_response_text)
+    if not isinstance(suggestions, list):
+        raise ValueError("Expected a JSON array of suggestions")
+    return [s for s in suggestions if isinstance(s, dict)]
+
+def generate_recommendations(completed_game_ids, timings, on_result=None):
+    """
+    Ask Gemini for recommendations based on the given completed games and resolve them
+    against IGDB. Step durations are recorded in `timings`; `on_result` is passed on to
+    resolve_suggestions(). Raises RecommendationError.
+    """
+    # Fetch the names of these games (from the game cache, falling back to IGDB)
+    started = time.perf_counter()
+    try:
+        completed_games = get_games_by_ids(completed_game_ids)
+        completed_games_names = [game['name'] for game in completed_games.values()]
+    except IGDBAuthError:
+        raise RecommendationError("Could not authenticate with IGDB.", 500)
+    except requests.exceptions.RequestException:
+        raise RecommendationError("Failed to fetch completed games details from IGDB.", 502)
+    timings['igdb-names'] = time.perf_counter() - started
+
+    # Craft the prompt for the AI
+    model = genai.GenerativeModel(app.config['GEMINI_MODEL'])
+    prompt = build_recommendation_prompt(completed_games_names)
+
+    # Call the AI and process the response
+    started = time.perf_counter()
     try:
-        ai_response = model.generate_content(prompt)
-        # Clean up the response text to ensure it's valid JSON
-        cleaned_response_text = ai_response.text.strip().replace('```json', '').replace('```', '')
-        suggestions = json.loads(cleaned_response_text)
+        # Identical prompts (users with the same completed set) share one Gemini call
+        with span('gemini'):
+            ai_response_text = upstream_flight.do(gemini_prompt_key(prompt), lambda: model.generate_content(
+                prompt, request_options={'timeout': app.config['GEMINI_TIMEOUT']}
+            ).text, timeout=app.config['GEMINI_TIMEOUT'])
+        suggestions = parse_suggestions(ai_response_text)
     except (Exception) as e:
         print(f"AI response parsing error: {e}")
-        return jsonify({"error": "Failed to get a valid recommendation from the AI service."}), 500
-    
-    # 5. For each AI suggestion, fetch full details from IGDB
-    recommended_games_data = []
-    for suggestion in suggestions:
-        game_title = suggestion.get('title')
-        if not game_title: continue
+        raise RecommendationError("Failed to get a valid recommendation from the AI service.", 500)
+    timings['llm'] = time.perf_counter() - started
 
-        try:
-            search_query = f'fields name, cover.url; search "{game_title}"; limit 1;'
-            response = requests.post(igdb_api_url, headers=headers, data=search_query)
-            response.raise_for_status()
-            game_details = response.json()
-            if game_details:
-                # 6. Combine AI reason with IGDB details
-                game_data = game_details[0]
-                if 'cover' in game_data and 'url' in game_data['cover']:
-                    game_data['cover']['url'] = game_data['cover']['url'].replace('t_thumb', 't_cover_big')
-
-                recommended_games_data.append({
-                    "reason": suggestion.get('reason'),
-                    "details": game_data
-                })
-        except requests.exceptions.RequestException:
-            # Silently fail for one game, so one bad suggestion doesn't ruin the whole list
-            print(f"Could not fetch details for AI suggestion: {game_title}")
-
-    return jsonify(recommended_games_data), 200
+    # Fetch full details for every AI suggestion from IGDB in one round-trip
+    started = time.perf_counter()
+    recommended_games_data = resolve_suggestions(suggestions, on_result=on_result)
+    timings['igdb-suggestions'] = time.perf_counter() - started
+    return recommended_games_data
+
+# --- NEW: Memoized recommendations ---
+# Bump whenever the prompt changes in a way that should retire cached recommendations
+RECOMMENDATION_PROMPT_VERSION = 1
+
+recommendation_memory_cache = LRUCache(
+    maxsize=app.config['RECOMMENDATION_CACHE_MEMORY_SIZE'],
+    ttl=min(app.config['RECOMMENDATION_CACHE_MEMORY_TTL'], app.config['RECOMMENDATION_CACHE_TTL'])
+)
+
+def recommendation_fingerprint(completed_game_ids):
+    """
+    Cache key for a completed-games set. Any change to the set (via library_manager),
+    the model or the prompt version yields a new key, so stale results are never served.
+    Users with identical completed sets share one entry.
+    """
+    key = f"{app.config['GEMINI_MODEL']}|v{RECOMMENDATION_PROMPT_VERSION}|{','.join(map(str, sorted(set(completed_game_ids))))}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def get_cached_recommendations(fingerprint):
+    """Return cached recommendations for a fingerprint, or None if missing or expired."""
+    recommendations = recommendation_memory_cache.get(fingerprint)
+    if recommendations is not None:
+        return recommendations
+
+    cutoff = _utcnow() - timedelta(seconds=app.config['RECOMMENDATION_CACHE_TTL'])
+    entry = db.session.get(RecommendationCache, fingerprint)
+    if entry is None or entry.created_at <= cutoff:
+        return None
+
+    recommendations = json.loads(entry.data)
+    recommendation_memory_cache.set(fingerprint, recommendations)
+    return recommendations
+
+def store_recommendations(fingerprint, recommendations):
+    """Cache freshly generated recommendations and drop expired entries."""
+    recommendation_memory_cache.set(fingerprint, recommendations)
+    cutoff = _utcnow() - timedelta(seconds=app.config['RECOMMENDATION_CACHE_TTL'])
+    try:
+        RecommendationCache.query.filter(
+            (RecommendationCache.fingerprint == fingerprint) | (RecommendationCache.created_at <= cutoff)
+        ).delete(synchronize_session=False)
+        db.session.add(RecommendationCache(
+            fingerprint=fingerprint, data=json.dumps(recommendations), created_at=_utcnow()
+        ))
+        db.session.commit()
+    except IntegrityError:
+        # Another worker generated the same set concurrently
+        db.session.rollback()
+
+# --- NEW: Local content-based recommender ---
+RECOMMENDATION_ENGINES = ('gemini', 'local', 'auto')
+
+_local_recommender = None
+_local_recommender_built_at = 0.0
+_local_recommender_lock = threading.Lock()
+
+LOCAL_RECOMMENDER_CATALOG_CHUNK = 500
+
+def local_recommender_candidates():
+    """
+    Candidate games: the catalog's main games when the mirror is available (up to
+    LOCAL_RECOMMENDER_MAX_CANDIDATES), plus whatever else is in the DB game cache.
+    """
+    games = {}
+    if catalog_enabled():
+        catalog_ids = [row.id for row in db.session.query(CatalogGame.id).filter(CatalogGame.category == 0).order_by(
+            CatalogGame.first_release_date.desc().nullslast(), CatalogGame.id
+        ).limit(app.config['LOCAL_RECOMMENDER_MAX_CANDIDATES'])]
+        for i in range(0, len(catalog_ids), LOCAL_RECOMMENDER_CATALOG_CHUNK):
+            games.update(get_catalog_games(catalog_ids[i:i + LOCAL_RECOMMENDER_CATALOG_CHUNK]))
+    for row in GameCache.query:
+        if row.igdb_game_id not in games:
+            games[row.igdb_game_id] = json.loads(row.data)
+    return list(games.values())
+
+def get_local_recommender():
+    """
+    The content-based recommender over local_recommender_candidates(). The candidate
+    matrix is built once and rebuilt every LOCAL_RECOMMENDER_REFRESH seconds.
+    """
+    global _local_recommender, _local_recommender_built_at
+    if _local_recommender is not None and time.monotonic() - _local_recommender_built_at < app.config['LOCAL_RECOMMENDER_REFRESH']:
+        return _local_recommender
+
+    with _local_recommender_lock:
+        # Another thread may have rebuilt it while we waited
+        if _local_recommender is None or time.monotonic() - _local_recommender_built_at >= app.config['LOCAL_RECOMMENDER_REFRESH']:
+            _local_recommender = ContentRecommender(local_recommender_candidates())
+            _local_recommender_built_at = time.monotonic()
+            print(f"Built local recommender over {len(_local_recommender)} games.")
+    return _local_recommender
+
+def get_library_game_ids(user_id):
+    """IGDB ids of every game in the user's library, whatever its status."""
+    return {row.igdb_game_id for row in db.session.query(UserGame.igdb_game_id).filter_by(user_id=user_id)}
+
+def generate_local_recommendations(completed_game_ids, timings, on_result=None, k=3, user_id=None):
+    """
+    Recommendations from the in-process recommender, in the same shape as the Gemini path.
+    With a `user_id`, games already anywhere in that user's library are never suggested.
+    """
+    started = time.perf_counter()
+    try:
+        completed_games = list(get_games_by_ids(completed_game_ids).values())
+    except requests.exceptions.RequestException:
+        raise RecommendationError("Failed to fetch completed games details from IGDB.", 502)
+    timings['igdb-names'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    recommender = get_local_recommender()
+    if len(recommender) < app.config['LOCAL_RECOMMENDER_MIN_CANDIDATES']:
+        # A fresh (or freshly pruned) cache would only offer whatever few games happen to be in it
+        raise RecommendationError("Local recommendations aren't available yet: too few games are known locally.", 503)
+    recommendations = []
+    exclude_ids = get_library_game_ids(user_id) if user_id is not None else ()
+    for game, score, reason in recommender.recommend(completed_games, k=k, exclude_ids=exclude_ids):
+        recommendation = {
+            "reason": reason,
+            "details": {key: game[key] for key in ('id', 'name', 'cover') if key in game}
+        }
+        recommendations.append(recommendation)
+        if on_result:
+            on_result(recommendation)
+    timings['local'] = time.perf_counter() - started
+
+    if not recommendations:
+        raise RecommendationError("Not enough data yet to recommend games similar to the ones you completed.", 503)
+    return recommendations
+
+def recommend_for_user(completed_game_ids, engine, timings, on_result=None, user_id=None):
+    """
+    Run the requested engine and return (recommendations, engine used). In 'auto' mode a
+    slow or failing Gemini call falls back to the local recommender.
+    """
+    if engine == 'local':
+        return generate_local_recommendations(completed_game_ids, timings, on_result, user_id=user_id), 'local'
+
+    try:
+        return generate_recommendations(completed_game_ids, timings, on_result), 'gemini'
+    except RecommendationError as e:
+        if engine != 'auto':
+            raise
+        print(f"Gemini recommendations failed ({e.message}); falling back to the local recommender.")
+        return generate_local_recommendations(completed_game_ids, timings, on_result, user_id=user_id), 'local'
+
+def prepare_recommendations(current_user, timings):
+    """
+    Everything a recommendations request does before generating: look up the user's
+    completed games, check the engine and serve memoized results. Returns (response, None)
+    if that already answers the request, else (None, (completed_game_ids, engine, fingerprint)).
+    """
+    # 1. Fetch user's completed games from our database
+    started = time.perf_counter()
+    completed_game_ids = get_completed_game_ids(current_user.id)
+    if not completed_game_ids:
+        return (jsonify({"error": "You need to complete at least one game to get AI recommendations."}), 400), None
+    timings['db'] = time.perf_counter() - started
+
+    engine = request.args.get('engine', app.config['RECOMMENDATION_ENGINE'])
+    if engine not in RECOMMENDATION_ENGINES:
+        return (jsonify({"error": f"Invalid engine. Must be one of: {list(RECOMMENDATION_ENGINES)}"}), 400), None
+
+    # 2. Serve memoized results for this completed set unless the client asks for fresh ones
+    fingerprint = recommendation_fingerprint(completed_game_ids)
+    if engine != 'local' and request.args.get('refresh') != '1':
+        started = time.perf_counter()
+        cached = get_cached_recommendations(fingerprint)
+        timings['cache'] = time.perf_counter() - started
+        if cached is not None:
+            return (jsonify(cached), 200, {
+                'Server-Timing': server_timing_header(timings),
+                'X-Cache': 'HIT',
+                'X-Recommendation-Engine': 'gemini'
+            }), None
+
+    return None, (completed_game_ids, engine, fingerprint)
+
+def recommendations_response(current_user, fingerprint, recommended_games_data, engine, timings):
+    # Only memoize Gemini results; local ones are cheap to recompute. Don't memoize an
+    # empty list either, it most likely means IGDB lookups failed.
+    if engine == 'gemini' and recommended_games_data:
+        store_recommendations(fingerprint, recommended_games_data)
+
+    print(f"Recommendations ({engine}) for user {current_user.id}: " + ', '.join(
+        f'{name}={seconds * 1000:.0f}ms' for name, seconds in timings.items()
+    ))
+    return jsonify(recommended_games_data), 200, {
+        'Server-Timing': server_timing_header(timings),
+        'X-Cache': 'MISS',
+        'X-Recommendation-Engine': engine
+    }
+
+@app.route("/api/recommendations", methods=['GET'])
+@token_required
+def get_ai_recommendations(current_user):
+    timings = {} # Per-step durations in seconds, reported in the Server-Timing header
+    response, plan = prepare_recommendations(current_user, timings)
+    if response:
+        return response
+    completed_game_ids, engine, fingerprint = plan
+
+    # 3. Generate new recommendations with the requested engine
+    try:
+        recommended_games_data, engine = recommend_for_user(completed_game_ids, engine, timings, user_id=current_user.id)
+    except RecommendationError as e:
+        return jsonify({"error": e.message}), e.status_code
+
+    return recommendations_response(current_user, fingerprint, recommended_games_data, engine, timings)
     
+# --- NEW: Background recommendation jobs ---
+# Lets clients start a recommendation run without tying up a request worker for the
+# whole Gemini call. Results are collected by polling or over server-sent events. A job
+# runs in the worker that created it, but its state is written to RecommendationJob on
+# every change, so polls and streams can land on any worker.
+JOB_POLL_INTERVAL = 0.5 # Seconds between DB reads when streaming another worker's job
+
+def save_recommendation_job(job):
+    """JobManager on_change hook: persist the job's state (a failure is logged, never raised)."""
+    snapshot = job.to_dict()
+    now = _utcnow()
+    with app.app_context():
+        try:
+            db.session.merge(RecommendationJob(
+                id=job.id,
+                user_id=job.owner_id,
+                status=snapshot['status'],
+                events=json.dumps(snapshot['events']),
+                result=json.dumps(snapshot['result']),
+                error=snapshot['error'],
+                created_at=datetime.fromtimestamp(job.created_at, timezone.utc).replace(tzinfo=None),
+                updated_at=now
+            ))
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            print(f"Could not save recommendation job {job.id}: {e}")
+
+recommendation_jobs = JobManager(
+    max_workers=app.config['RECOMMENDATION_JOB_WORKERS'],
+    retention=app.config['RECOMMENDATION_JOB_RETENTION'],
+    thread_name_prefix='recommendations',
+    on_change=save_recommendation_job
+)
+
+def _job_state(job):
+    return dict(job.to_dict(), owner_id=job.owner_id)
+
+def get_recommendation_job_state(job_id):
+    """
+    The job's state as Job.to_dict() returns it, plus 'owner_id': from memory when this
+    worker runs the job, otherwise from the DB. None if there is no such job.
+    """
+    job = recommendation_jobs.get(job_id)
+    if job is not None:
+        return _job_state(job)
+
+    row = db.session.get(RecommendationJob, job_id)
+    if row is None:
+        return None
+    state = {
+        "id": row.id,
+        "owner_id": row.user_id,
+        "status": row.status,
+        "events": json.loads(row.events),
+        "result": json.loads(row.result) if row.result else None,
+        "error": row.error,
+    }
+    stale_before = _utcnow() - timedelta(seconds=app.config['RECOMMENDATION_JOB_STALE_AFTER'])
+    if row.status in ('queued', 'running') and row.updated_at < stale_before:
+        state.update(status='failed', error="The job was interrupted")
+    return state
+
+def wait_for_recommendation_job(job_id, start, timeout):
+    """
+    The job's state once it has events past index `start`, has finished, or `timeout`
+    seconds have passed. A job run by another worker is polled from the DB.
+    """
+    job = recommendation_jobs.get(job_id)
+    if job is not None:
+        job.wait_for_events(start, timeout=timeout)
+        return _job_state(job)
+
+    deadline = time.monotonic() + timeout
+    while True:
+        with app.app_context(): # A fresh session, so each read sees the latest commit
+            state = get_recommendation_job_state(job_id)
+        if (state is None or len(state['events']) > start or state['status'] in ('done', 'failed')
+                or time.monotonic() >= deadline):
+            return state
+        time.sleep(JOB_POLL_INTERVAL)
+
+def find_active_recommendation_job(user_id):
+    """The id of the user's unfinished (and not stale) job, possibly run by another worker."""
+    stale_before = _utcnow() - timedelta(seconds=app.config['RECOMMENDATION_JOB_STALE_AFTER'])
+    row = RecommendationJob.query.filter(
+        RecommendationJob.user_id == user_id,
+        RecommendationJob.status.in_(('queued', 'running')),
+        RecommendationJob.updated_at >= stale_before
+    ).order_by(RecommendationJob.created_at.desc()).first()
+    return row.id if row else None
+
+def prune_recommendation_jobs():
+    cutoff = _utcnow() - timedelta(seconds=app.config['RECOMMENDATION_JOB_RETENTION'])
+    RecommendationJob.query.filter(RecommendationJob.updated_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+
+def run_recommendation_job(job, user_id, refresh=False):
+    """Job body: serve from the memoized cache if possible, otherwise generate and stream results."""
+    # Background work yields the IGDB rate budget to interactive requests
+    with app.app_context(), igdb_priority(PRIORITY_BACKGROUND):
+        completed_game_ids = get_completed_game_ids(user_id)
+        if not completed_game_ids:
+            raise RecommendationError("You need to complete at least one game to get AI recommendations.", 400)
+
+        fingerprint = recommendation_fingerprint(completed_game_ids)
+        cached = None if refresh else get_cached_recommendations(fingerprint)
+        if cached is not None:
+            for recommendation in cached:
+                job.publish('recommendation', recommendation)
+            return cached
+
+        timings = {}
+        recommendations, engine = recommend_for_user(
+            completed_game_ids, app.config['RECOMMENDATION_ENGINE'], timings,
+            on_result=lambda recommendation: job.publish('recommendation', recommendation),
+            user_id=user_id
+        )
+        if engine == 'gemini' and recommendations:
+            store_recommendations(fingerprint, recommendations)
+        print(f"Recommendation job {job.id} ({engine}) for user {user_id}: " + ', '.join(
+            f'{name}={seconds * 1000:.0f}ms' for name, seconds in timings.items()
+        ))
+        return recommendations
+
+def _get_owned_job(job_id, current_user):
+    state = get_recommendation_job_state(job_id)
+    if state is None or state['owner_id'] != current_user.id:
+        return None
+    return state
+
+@app.route("/api/recommendations/jobs", methods=['POST'])
+@token_required
+def create_recommendation_job(current_user):
+    """Start (or join the user's in-flight) recommendation job and return its id immediately."""
+    user_id = current_user.id
+    refresh = request.args.get('refresh') == '1'
+    prune_recommendation_jobs()
+
+    # Join a job another worker is already running for this user
+    job_id = find_active_recommendation_job(user_id)
+    if job_id is not None and recommendation_jobs.get(job_id) is None:
+        job_state, created = get_recommendation_job_state(job_id), False
+    else:
+        job, created = recommendation_jobs.submit(
+            ('recommendations', user_id),
+            lambda job: run_recommendation_job(job, user_id, refresh=refresh),
+            owner_id=user_id
+        )
+        job_state = _job_state(job)
+
+    return jsonify({
+        "job_id": job_state['id'],
+        "status": job_state['status'],
+        "created": created,
+        "status_url": f"/api/recommendations/jobs/{job_state['id']}",
+        "stream_url": f"/api/recommendations/jobs/{job_state['id']}/stream"
+    }), 202
+
+@app.route("/api/recommendations/jobs/<job_id>", methods=['GET'])
+@token_required
+def get_recommendation_job(current_user, job_id):
+    """Poll a recommendation job. 'recommendations' holds whatever has resolved so far."""
+    job_state = _get_owned_job(job_id, current_user)
+    if not job_state:
+        return jsonify({"error": "Job not found"}), 404
+
+    return jsonify({
+        "job_id": job_state['id'],
+        "status": job_state['status'],
+        "recommendations": [e['data'] for e in job_state['events'] if e['event'] == 'recommendation'],
+        "error": job_state['error']
+    }), 200
+
+@app.route("/api/recommendations/jobs/<job_id>/stream", methods=['GET'])
+@token_required
+def stream_recommendation_job(current_user, job_id):
+    """Server-sent events: one 'recommendation' event per resolved game, then 'done' or 'error'."""
+    if not _get_owned_job(job_id, current_user):
+        return jsonify({"error": "Job not found"}), 404
+
+    def sse(name, data):
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+    def event_stream():
+        sent = 0
+        while True:
+            job_state = wait_for_recommendation_job(job_id, sent, timeout=15)
+            if job_state is None: # Pruned meanwhile
+                yield sse('error', {"error": "Job not found"})
+                return
+            events = job_state['events'][sent:]
+            for entry in events:
+                yield sse(entry['event'], entry['data'])
+            sent += len(events)
+            if job_state['status'] == 'failed':
+                yield sse('error', {"error": job_state['error']})
+                return
+            if job_state['status'] == 'done':
+                yield sse('done', {"count": len(job_state['result'] or [])})
+                return
+            if not events:
+                yield ": keep-alive\n\n" # Comment line so proxies don't close an idle stream
+
+    return Response(event_stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no' # Disable proxy buffering so events arrive as they happen
+    })
+
+# --- NEW: Batch library status lookup ---
+MAX_STATUS_BATCH = 500
+
+def get_library_statuses(user_id, igdb_ids):
+    """Return {igdb_id: status dict} for the given ids using a single IN query."""
+    statuses = {igdb_id: {"inLibrary": False} for igdb_id in igdb_ids}
+    if not igdb_ids:
+        return statuses
+
+    user_games = UserGame.query.filter(
+        UserGame.user_id == user_id,
+        UserGame.igdb_game_id.in_(list(statuses))
+    ).all()
+    for user_game in user_games:
+        statuses[user_game.igdb_game_id] = {
+            "inLibrary": True,
+            "id": user_game.id, # The UserGame entry ID
+            "status": user_game.status
+        }
+    return statuses
+
+@app.route("/api/library/status", methods=['GET', 'POST'])
+@token_required
+def get_game_library_statuses(current_user):
+    """
+    Batch version of /api/library/status/<igdb_id>. Takes ids as ?ids=1,2,3 (GET) or
+    {"igdb_ids": [1, 2, 3]} (POST) and returns {"statuses": {igdb_id: status}}.
+    """
+    if request.method == 'POST':
+        raw_ids = (request.get_json(silent=True) or {}).get('igdb_ids')
+    else:
+        raw_ids = [i for i in request.args.get('ids', '').split(',') if i]
+
+    try:
+        igdb_ids = list(dict.fromkeys(int(i) for i in raw_ids or []))
+    except (TypeError, ValueError):
+        return jsonify({"error": "igdb_ids must be a list of integers"}), 400
+    if not igdb_ids:
+        return jsonify({"error": "At least one game ID is required"}), 400
+    if len(igdb_ids) > MAX_STATUS_BATCH:
+        return jsonify({"error": f"At most {MAX_STATUS_BATCH} game IDs can be checked at once"}), 400
+
+    statuses = get_library_statuses(current_user.id, igdb_ids)
+    return jsonify({"statuses": {str(igdb_id): status for igdb_id, status in statuses.items()}}), 200
+
 # --- NEW: Endpoint to check a single game's library status ---
 @app.route("/api/library/status/<int:igdb_id>", methods=['GET'])
 @token_required
@@ -418,6 +2090,266 @@ def get_game_library_status(current_user, igdb_id):
     else:
         return jsonify({"inLibrary": False}), 200
 
+# --- NEW: Library pagination and streaming ---
+LIBRARY_PAGE_SIZE = 50
+LIBRARY_MAX_PAGE_SIZE = 200
+LIBRARY_STREAM_CHUNK = 200
+
+# sort name -> the UserGame columns it orders by; a leading '-' means descending.
+# Every sort ends with the primary key so cursors are unambiguous.
+LIBRARY_SORTS = {
+    'added': ('id',),
+    '-added': ('-id',),
+    'status': ('status', 'id'),
+}
+
+def library_query(user_id, status=None, sort='added', after=None):
+    """A user's library entries in `sort` order, starting just after the `after` key values."""
+    query = UserGame.query.filter_by(user_id=user_id)
+    if status:
+        query = query.filter_by(status=status)
+
+    columns = []
+    for name in LIBRARY_SORTS[sort]:
+        column = getattr(UserGame, name.lstrip('-'))
+        columns.append((column, name.startswith('-')))
+        query = query.order_by(column.desc() if name.startswith('-') else column.asc())
+
+    if after is not None:
+        # Keyset pagination: (c1, c2) > (v1, v2) spelled out so it works everywhere
+        conditions = []
+        for i, ((column, descending), value) in enumerate(zip(columns, after)):
+            equal_prefix = [prefix_column == prefix_value for (prefix_column, _), prefix_value in zip(columns[:i], after[:i])]
+            conditions.append(db.and_(*equal_prefix, column < value if descending else column > value))
+        query = query.filter(db.or_(*conditions))
+    return query
+
+def encode_library_cursor(user_game, sort):
+    values = [getattr(user_game, name.lstrip('-')) for name in LIBRARY_SORTS[sort]]
+    return base64.urlsafe_b64encode(json.dumps([sort, values]).encode('utf-8')).decode('ascii')
+
+def decode_library_cursor(cursor, sort):
+    """The key values stored in a cursor, or None. Raises ValueError for foreign or corrupt cursors."""
+    if not cursor:
+        return None
+    try:
+        cursor_sort, values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (binascii.Error, UnicodeError, json.JSONDecodeError, TypeError, ValueError):
+        raise ValueError("Malformed cursor")
+    if cursor_sort != sort or not isinstance(values, list) or len(values) != len(LIBRARY_SORTS[sort]):
+        raise ValueError("Cursor does not match the requested sort")
+    for name, value in zip(LIBRARY_SORTS[sort], values):
+        expected = str if name.lstrip('-') == 'status' else int
+        # bool is an int subclass, but never a valid key value
+        if not isinstance(value, expected) or isinstance(value, bool):
+            raise ValueError("Malformed cursor")
+    return values
+
+def serialize_library(user_games):
+    """Combine library entries with their (cached) IGDB details; entries IGDB doesn't know are skipped."""
+    igdb_games_map = get_games_by_ids([user_game.igdb_game_id for user_game in user_games])
+    library = []
+    for user_game in user_games:
+        game_details = igdb_games_map.get(user_game.igdb_game_id)
+        if game_details:
+            library.append({
+                'id': user_game.id, # Our library entry ID
+                'igdb_game_id': user_game.igdb_game_id,
+                'status': user_game.status,
+                # Only the fields the library page uses
+                'details': {key: game_details[key] for key in LIBRARY_GAME_FIELDS if key in game_details}
+            })
+    return library
+
+def stream_library(user_id, status, sort):
+    """Yield the library as a JSON array, fetching rows and IGDB details one chunk at a time."""
+    yield '['
+    first = True
+    after = None
+    while True:
+        user_games = library_query(user_id, status, sort, after).limit(LIBRARY_STREAM_CHUNK).all()
+        if not user_games:
+            break
+        try:
+            entries = serialize_library(user_games)
+        except requests.exceptions.RequestException as e:
+            # Headers are already sent, so the best we can do is skip this chunk
+            print(f"Skipping {len(user_games)} library entries while streaming: {e}")
+            entries = []
+        for entry in entries:
+            yield ('' if first else ',') + json.dumps(entry)
+            first = False
+        after = [getattr(user_games[-1], name.lstrip('-')) for name in LIBRARY_SORTS[sort]]
+    yield ']'
+
+def library_details_version(user_id):
+    """
+    A fingerprint of the cached game details behind a user's library, for its ETag: it
+    changes when any of their games is refreshed, pruned or expires in GameCache, and
+    with every catalog sync. One aggregate query (two with the catalog), no IGDB calls.
+    """
+    count, newest, oldest = db.session.query(
+        db.func.count(GameCache.igdb_game_id), db.func.max(GameCache.fetched_at), db.func.min(GameCache.fetched_at)
+    ).select_from(UserGame).join(GameCache, GameCache.igdb_game_id == UserGame.igdb_game_id).filter(
+        UserGame.user_id == user_id
+    ).one()
+    # Expired rows are refetched when the library is served, so they mustn't validate as current
+    expired = oldest is not None and oldest <= _utcnow() - timedelta(seconds=app.config['GAME_CACHE_DB_TTL'])
+    version = [count, newest.isoformat() if newest else '', expired]
+    if catalog_enabled():
+        synced_at = db.session.query(db.func.max(CatalogSyncState.synced_at)).scalar()
+        version.append(synced_at.isoformat() if synced_at else '')
+    return version
+
+# --- NEW: Bulk library import / export ---
+LIBRARY_IMPORT_MAX_ROWS = 10000
+LIBRARY_IMPORT_CHUNK = 500
+
+def parse_library_rows(text, fmt):
+    """Parse an import payload into a list of raw {'igdb_game_id', 'status'} dicts."""
+    if fmt == 'csv':
+        return list(csv.DictReader(io.StringIO(text)))
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get('games')
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON list of games (or {\"games\": [...]})")
+    return data
+
+def _upsert_statement(rows, on_conflict):
+    """A single INSERT ... ON CONFLICT statement for a chunk of rows (SQLite or Postgres)."""
+    statement = dialect_insert(UserGame.__table__).values(rows)
+    if on_conflict == 'update':
+        return statement.on_conflict_do_update(
+            index_elements=['user_id', 'igdb_game_id'],
+            set_={'status': statement.excluded.status}
+        )
+    return statement.on_conflict_do_nothing(index_elements=['user_id', 'igdb_game_id'])
+
+def import_library(user_id, raw_rows, on_conflict='update'):
+    """
+    Validate every row up front, then write the valid ones with one set-based upsert per
+    chunk, all in a single transaction. `on_conflict` is 'update' (overwrite the status of
+    games already in the library) or 'skip'. Returns one result dict per input row.
+    """
+    results = []
+    valid = {} # igdb_game_id -> index in results (a later duplicate row wins)
+    for index, raw in enumerate(raw_rows):
+        result = {"row": index + 1}
+        results.append(result)
+        raw = raw if isinstance(raw, dict) else {}
+        try:
+            # JSON true would otherwise pass as int(True) == 1
+            if isinstance(raw.get('igdb_game_id'), bool):
+                raise TypeError
+            igdb_id = int(raw.get('igdb_game_id'))
+            if igdb_id <= 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            result.update(result="error", error="igdb_game_id must be a positive integer")
+            continue
+        status = raw.get('status')
+        status = status.strip() if isinstance(status, str) else status
+        result['igdb_game_id'] = igdb_id
+        if status not in LIBRARY_STATUSES:
+            result.update(result="error", error=f"Invalid status. Must be one of: {LIBRARY_STATUSES}")
+            continue
+        result['status'] = status
+        if igdb_id in valid:
+            results[valid[igdb_id]].update(result="skipped", error="Superseded by a later row for the same game")
+        valid[igdb_id] = index
+
+    igdb_ids = list(valid)
+    for i in range(0, len(igdb_ids), LIBRARY_IMPORT_CHUNK):
+        chunk = igdb_ids[i:i + LIBRARY_IMPORT_CHUNK]
+        existing = dict(db.session.query(UserGame.igdb_game_id, UserGame.status).filter(
+            UserGame.user_id == user_id, UserGame.igdb_game_id.in_(chunk)
+        ).all())
+
+        rows = []
+        for igdb_id in chunk:
+            result = results[valid[igdb_id]]
+            if igdb_id not in existing:
+                result['result'] = "inserted"
+            elif existing[igdb_id] == result['status'] or on_conflict != 'update':
+                result['result'] = "unchanged"
+                continue
+            else:
+                result['result'] = "updated"
+            rows.append({'user_id': user_id, 'igdb_game_id': igdb_id, 'status': result['status']})
+        if rows:
+            db.session.execute(_upsert_statement(rows, on_conflict))
+
+    # The upserts bypass adjust_library_stats, so recount once from a single aggregate
+    rebuild_library_stats(user_id)
+    db.session.commit()
+    return results
+
+def summarize_import(results):
+    summary = {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0, "error": 0}
+    for result in results:
+        summary[result['result']] += 1
+    return summary
+
+@app.route("/api/library/import", methods=['POST'])
+@token_required
+def import_library_endpoint(current_user):
+    """
+    Bulk-add games from a JSON list (or {"games": [...]}) or a CSV file with
+    igdb_game_id,status columns. ?on_conflict=skip keeps existing statuses.
+    """
+    on_conflict = request.args.get('on_conflict', 'update')
+    if on_conflict not in ('update', 'skip'):
+        return jsonify({"error": "on_conflict must be 'update' or 'skip'"}), 400
+
+    fmt = 'csv' if request.mimetype in ('text/csv', 'application/csv') or request.args.get('format') == 'csv' else 'json'
+    try:
+        raw_rows = parse_library_rows(request.get_data(as_text=True), fmt)
+    except (ValueError, csv.Error) as e:
+        return jsonify({"error": f"Could not parse import: {e}"}), 400
+    if not raw_rows:
+        return jsonify({"error": "No games to import"}), 400
+    if len(raw_rows) > LIBRARY_IMPORT_MAX_ROWS:
+        return jsonify({"error": f"At most {LIBRARY_IMPORT_MAX_ROWS} games can be imported at once"}), 400
+
+    results = import_library(current_user.id, raw_rows, on_conflict)
+    return jsonify({"summary": summarize_import(results), "results": results}), 200
+
+@app.route("/api/library/export", methods=['GET'])
+@token_required
+def export_library(current_user):
+    """Stream the user's library as CSV or JSON, in a format /api/library/import accepts."""
+    fmt = request.args.get('format', 'json')
+    if fmt not in ('json', 'csv'):
+        return jsonify({"error": "format must be 'json' or 'csv'"}), 400
+    user_id = current_user.id
+
+    def rows():
+        after = None
+        while True:
+            user_games = library_query(user_id, after=after).limit(LIBRARY_STREAM_CHUNK).all()
+            if not user_games:
+                return
+            yield from user_games
+            after = [user_games[-1].id]
+
+    def generate():
+        if fmt == 'csv':
+            yield 'igdb_game_id,status\r\n'
+            for user_game in rows():
+                yield f'{user_game.igdb_game_id},{user_game.status}\r\n'
+            return
+        yield '['
+        for i, user_game in enumerate(rows()):
+            yield ('' if i == 0 else ',') + json.dumps({'igdb_game_id': user_game.igdb_game_id, 'status': user_game.status})
+        yield ']'
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv' if fmt == 'csv' else 'application/json',
+        headers={'Content-Disposition': f'attachment; filename=gameup-library.{fmt}'}
+    )
+
 # MODIFIED: Library management for GET, POST, PUT, DELETE
 @app.route("/api/library", methods=['GET', 'POST'])
 @app.route("/api/library/<int:user_game_id>", methods=['PUT', 'DELETE'])
@@ -432,13 +2364,14 @@ def library_manager(current_user, user_game_id=None):
         if not igdb_id or not status:
             return jsonify({"error": "Game ID and status are required"}), 400
         
-        valid_statuses = ["Playing", "Completed", "Dropped", "Wishlist"]
-        if status not in valid_statuses:
-            return jsonify({"error": f"Invalid status. Must be one of: {valid_statuses}"}), 400
+        if status not in LIBRARY_STATUSES:
+            return jsonify({"error": f"Invalid status. Must be one of: {LIBRARY_STATUSES}"}), 400
 
         try:
             new_user_game = UserGame(user_id=current_user.id, igdb_game_id=igdb_id, status=status)
             db.session.add(new_user_game)
+            db.session.flush() # Surface duplicates before touching the counters
+            adjust_library_stats(current_user.id, new_status=status)
             db.session.commit()
             # Return the newly created game object
             return jsonify({
@@ -453,53 +2386,65 @@ def library_manager(current_user, user_game_id=None):
             db.session.rollback()
             return jsonify({"error": "This game is already in your library"}), 409
         
-    # GET: Fetch the user's entire game library
+    # GET: Fetch the user's library, optionally filtered, sorted, paginated or streamed
     if request.method == 'GET':
-        user_games = UserGame.query.filter_by(user_id=current_user.id).all()
-        if not user_games:
-            return jsonify([]), 200 # Return an empty list if library is empty
-
-        game_ids = [game.igdb_game_id for game in user_games]
-        
-        # Now, fetch game details from IGDB for these IDs
-        token = get_igdb_token()
-        if not token:
-            return jsonify({"error": "Could not authenticate with IGDB service"}), 500
-
-        igdb_api_url = 'https://api.igdb.com/v4/games'
-        # IGDB allows querying for multiple IDs like this: where id = (id1, id2, id3);
-        query_body = f'fields name, cover.url, first_release_date; where id = ({",".join(map(str, game_ids))}); limit {len(game_ids)};'
-        
-        headers = {'Client-ID': IGDB_CLIENT_ID, 'Authorization': f'Bearer {token}'}
+        status = request.args.get('status')
+        if status and status not in LIBRARY_STATUSES:
+            return jsonify({"error": f"Invalid status. Must be one of: {LIBRARY_STATUSES}"}), 400
+        sort = request.args.get('sort', 'added')
+        if sort not in LIBRARY_SORTS:
+            return jsonify({"error": f"Invalid sort. Must be one of: {list(LIBRARY_SORTS)}"}), 400
+
+        # The library version changes with every write, so an unchanged one means the
+        # client's copy is current and no rows or IGDB details need to be fetched
+        stats = get_library_stats_row(current_user.id)
+        etag = library_etag(stats, 'library', request.query_string.decode(), *library_details_version(current_user.id))
+        cached = not_modified(etag, stats.updated_at, PRIVATE_CACHE_CONTROL)
+        if cached:
+            return cached
+
+        # Stream the whole (filtered) library chunk by chunk instead of building it in memory.
+        # No validators: chunks whose IGDB lookup fails are skipped once the headers are
+        # out, so a streamed body may be incomplete and must not be revalidated as current.
+        if request.args.get('stream') == '1':
+            response = Response(
+                stream_with_context(stream_library(current_user.id, status, sort)),
+                mimetype='application/json'
+            )
+            response.headers['Cache-Control'] = 'private, no-store'
+            return response
+
+        paginate = 'limit' in request.args or 'cursor' in request.args
+        try:
+            limit = min(int(request.args.get('limit', LIBRARY_PAGE_SIZE)), LIBRARY_MAX_PAGE_SIZE)
+            after = decode_library_cursor(request.args.get('cursor'), sort)
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid limit or cursor"}), 400
+        if limit < 1:
+            return jsonify({"error": "limit must be positive"}), 400
+
+        query = library_query(current_user.id, status, sort, after)
+        # Without pagination parameters, keep returning the whole library as a plain list
+        user_games = query.limit(limit + 1).all() if paginate else query.all()
+        has_more = paginate and len(user_games) > limit
+        user_games = user_games[:limit] if paginate else user_games
 
         try:
-            response = requests.post(igdb_api_url, headers=headers, data=query_body)
-            response.raise_for_status()
-            igdb_games_data = response.json()
-
-            # Create a dictionary for easy lookup: {igdb_id: game_data}
-            igdb_games_map = {game['id']: game for game in igdb_games_data}
-
-            # Combine our data with IGDB's data
-            library = []
-            for user_game in user_games:
-                game_details = igdb_games_map.get(user_game.igdb_game_id)
-                if game_details:
-                    # Clean up cover URL
-                    if 'cover' in game_details and 'url' in game_details['cover']:
-                        game_details['cover']['url'] = game_details['cover']['url'].replace('t_thumb', 't_cover_big')
-                    
-                    library.append({
-                        'id': user_game.id, # Our library entry ID
-                        'igdb_game_id': user_game.igdb_game_id,
-                        'status': user_game.status,
-                        'details': game_details
-                    })
-            
-            return jsonify(library), 200
+            library = serialize_library(user_games)
+        except IGDBAuthError:
+            return jsonify({"error": "Could not authenticate with IGDB service"}), 500
         except requests.exceptions.RequestException as e:
             return jsonify({"error": f"Failed to fetch library data from IGDB: {e}"}), 502
 
+        if not paginate:
+            response = jsonify(library)
+        else:
+            response = jsonify({
+                "items": library,
+                "next_cursor": encode_library_cursor(user_games[-1], sort) if has_more else None
+            })
+        return with_validators(response, etag, stats.updated_at, PRIVATE_CACHE_CONTROL), 200
+
     # Find the specific game entry in the user's library
     user_game = UserGame.query.filter_by(id=user_game_id, user_id=current_user.id).first()
     if not user_game:
@@ -510,17 +2455,22 @@ def library_manager(current_user, user_game_id=None):
         data = request.get_json()
         new_status = data.get('status')
         
-        valid_statuses = ["Playing", "Completed", "Dropped", "Wishlist"]
-        if not new_status or new_status not in valid_statuses:
-            return jsonify({"error": f"Invalid status. Must be one of: {valid_statuses}"}), 400
+        if not new_status or new_status not in LIBRARY_STATUSES:
+            return jsonify({"error": f"Invalid status. Must be one of: {LIBRARY_STATUSES}"}), 400
             
+        old_status = user_game.status
         user_game.status = new_status
+        db.session.flush()
+        adjust_library_stats(current_user.id, old_status=old_status, new_status=new_status)
         db.session.commit()
         return jsonify({"message": "Game status updated successfully", "status": new_status}), 200
 
     # DELETE: Remove a game from the library
     if request.method == 'DELETE':
+        old_status = user_game.status
         db.session.delete(user_game)
+        db.session.flush()
+        adjust_library_stats(current_user.id, old_status=old_status)
         db.session.commit()
         return jsonify({"message": "Game removed from library successfully"}), 200
 
@@ -534,10 +2484,173 @@ def get_current_user(current_user):
     return jsonify({"error": "User not found"}), 404
 
 
+# --- NEW: Prometheus metrics ---
+def _cache_metrics():
+    caches = {
+        'game': game_memory_cache,
+        'user': user_cache,
+        'search': search_cache,
+        'recommendation': recommendation_memory_cache,
+        'cover': cover_cache,
+    }
+    stats = {name: cache.stats() for name, cache in caches.items()}
+    for key, metric_type, help in (
+        ('hits', 'counter', 'In-process cache hits.'),
+        ('misses', 'counter', 'In-process cache misses.'),
+        ('evictions', 'counter', 'In-process cache LRU evictions.'),
+        ('size', 'gauge', 'Entries currently in the in-process cache.'),
+        ('hit_rate', 'gauge', 'In-process cache hit rate since start.'),
+    ):
+        suffix = '_total' if metric_type == 'counter' else ''
+        yield f'gameup_cache_{key}{suffix}', metric_type, help, [({'cache': name}, s[key]) for name, s in stats.items()]
+    yield 'gameup_cover_cache_bytes', 'gauge', 'Disk space used by cached cover variants.', [({}, stats['cover']['bytes'])]
+
+def _upstream_metrics():
+    flights = {name: flight.stats() for name, flight in upstream_flights.items()}
+    for key, help in (
+        ('calls', 'Upstream calls actually made through single-flight.'),
+        ('collapsed', 'Callers that shared another caller\'s in-flight call.'),
+        ('errors', 'Single-flight calls that raised.'),
+        ('timeouts', 'Callers that gave up waiting on an in-flight call.'),
+    ):
+        yield f'gameup_singleflight_{key}_total', 'counter', help, [({'flight': name}, s[key]) for name, s in flights.items()]
+
+    scheduler = igdb_scheduler.stats()
+    yield 'gameup_igdb_scheduler_granted_total', 'counter', 'IGDB request slots granted, by priority.', [
+        ({'priority': level}, count) for level, count in scheduler['granted'].items()
+    ]
+    yield 'gameup_igdb_scheduler_wait_seconds_total', 'counter', 'Time spent waiting for IGDB request slots, by priority.', [
+        ({'priority': level}, seconds) for level, seconds in scheduler['wait_seconds'].items()
+    ]
+    yield 'gameup_igdb_scheduler_queued', 'gauge', 'Requests waiting for an IGDB slot.', [({}, scheduler['queued'])]
+    yield 'gameup_igdb_scheduler_timeouts_total', 'counter', 'Requests that got no IGDB slot in time.', [({}, scheduler['timeouts'])]
+
+    loader = game_loader.stats()
+    yield 'gameup_game_loader_batches_total', 'counter', 'Batched IGDB game id lookups.', [({}, loader['batches'])]
+    yield 'gameup_game_loader_keys_total', 'counter', 'Game ids looked up through the batch loader.', [({}, loader['keys_loaded'])]
+    yield 'gameup_game_loader_shared_keys_total', 'counter', 'Game ids served by a lookup already in flight.', [({}, loader['keys_shared'])]
+
+REGISTRY.register_collector(_cache_metrics)
+REGISTRY.register_collector(_upstream_metrics)
+
+@app.route("/metrics", methods=['GET'])
+def metrics():
+    """Prometheus text exposition of request, span, cache and upstream metrics."""
+    if app.config['METRICS_TOKEN'] and get_token_from_request() != app.config['METRICS_TOKEN']:
+        return jsonify({"error": "Unauthorized"}), 401
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8', headers={'Cache-Control': 'no-store'})
+
 # --- Create Database Tables ---
+# init-db is for fresh installs only: it wipes every table, users included. To upgrade an
+# existing database, run `flask create-tables` (and then `flask rebuild-library-stats`).
 @app.cli.command("init-db")
 def init_db_command():
     """Drops existing tables and creates new ones."""
     db.drop_all() # Drop existing tables first
     db.create_all()
-    print("Initialized the database.")
\ No newline at end of file
+    print("Initialized the database.")
+
+@app.cli.command("create-tables")
+def create_tables_command():
+    """Creates missing tables and indexes, keeping existing tables and data (run after upgrading)."""
+    existing = set(db.inspect(db.engine).get_table_names())
+    db.create_all()
+    # create_all() only indexes the tables it creates; add indexes new to existing tables too
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    created = sorted(set(db.inspect(db.engine).get_table_names()) - existing)
+    print(f"Created {len(created)} table(s){': ' + ', '.join(created) if created else ''}.")
+
+@app.cli.command("sync-igdb")
+@click.option("--full", is_flag=True, help="Re-sync everything instead of resuming from the last updated_at.")
+@click.option("--endpoint", "endpoints", multiple=True, type=click.Choice(list(CATALOG_ENDPOINTS)),
+              help="Only sync these endpoints (repeatable).")
+@click.option("--from-dump", type=click.Path(exists=True, dir_okay=False),
+              help="Load records from a recorded JSON dump instead of calling IGDB.")
+@click.option("--record", type=click.Path(dir_okay=False), help="Also write the fetched records to this JSON file.")
+def sync_igdb_command(full, endpoints, from_dump, record):
+    """Mirrors IGDB games, covers, genres, platforms and companies into the local catalog."""
+    db.create_all() # The catalog tables may be new to this database
+    dump = None
+    if from_dump:
+        with open(from_dump, encoding='utf-8') as f:
+            dump = json.load(f)
+    with igdb_priority(PRIORITY_BACKGROUND):
+        counts = sync_catalog(list(endpoints) or None, full=full, dump=dump, record=record)
+    print(f"Synced IGDB catalog: {counts}")
+
+@app.cli.command("rebuild-library-stats")
+def rebuild_library_stats_command():
+    """Recomputes every user's library counters and versions from UserGame (and adds missing indexes)."""
+    # The counters are derived data, so the table can simply be recreated
+    UserLibraryStats.__table__.drop(db.engine, checkfirst=True)
+    UserLibraryStats.__table__.create(db.engine)
+    for index in UserGame.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+
+    # Versions restart from scratch, so the fresh updated_at is what keeps old ETags from matching
+    counts = count_library_statuses()
+    now = _utcnow()
+    rows = [_stats_row(user_id, user_counts) for user_id, user_counts in counts.items()]
+    for row in rows:
+        row.version = 1
+        row.updated_at = now
+    db.session.add_all(rows)
+    db.session.commit()
+    print(f"Rebuilt library stats for {len(counts)} user(s).")
+
+@app.cli.command("import-library")
+@click.argument("username")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--skip-existing", is_flag=True, help="Keep the status of games already in the library.")
+def import_library_command(username, path, skip_existing):
+    """Bulk-imports a JSON or CSV (igdb_game_id,status) file into a user's library."""
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        raise click.ClickException(f"No user named '{username}'")
+
+    with open(path, encoding='utf-8') as f:
+        raw_rows = parse_library_rows(f.read(), 'csv' if path.lower().endswith('.csv') else 'json')
+    results = import_library(user.id, raw_rows, 'skip' if skip_existing else 'update')
+
+    for result in results:
+        if result['result'] in ('error', 'skipped'):
+            print(f"Row {result['row']}: {result['error']}")
+    print(f"Imported library for {username}: {summarize_import(results)}")
+
+@app.cli.command("warm-covers")
+@click.option("--limit", type=int, default=None, help="At most this many covers.")
+def warm_covers_command(limit):
+    """Fetches and resizes the covers of every game in users' libraries ahead of time."""
+    game_ids = [row[0] for row in db.session.query(UserGame.igdb_game_id).distinct()]
+    with igdb_priority(PRIORITY_BACKGROUND):
+        games = get_games_by_ids(game_ids)
+    image_ids = list(dict.fromkeys(
+        game['cover'].get('image_id') or igdb_image_id(game['cover'].get('url'))
+        for game in games.values() if isinstance(game.get('cover'), dict)
+    ))
+    image_ids = [image_id for image_id in image_ids if image_id][:limit]
+
+    failed = 0
+    for image_id in image_ids:
+        try:
+            cover_cache.get(image_id, 'card')
+        except (CoverNotFound, CoverError) as e:
+            print(f"Could not cache cover {image_id}: {e}")
+            failed += 1
+    print(f"Warmed {len(image_ids) - failed} cover(s); {failed} failed. {cover_cache.stats()}")
+
+@app.cli.command("clear-game-cache")
+@click.argument("igdb_ids", nargs=-1, type=int)
+def clear_game_cache_command(igdb_ids):
+    """Invalidates cached IGDB game metadata (all of it if no ids are given)."""
+    invalidate_game_cache(list(igdb_ids) or None)
+    print(f"Cleared game cache for {len(igdb_ids) or 'all'} game(s).")
+
+@app.cli.command("prune-game-cache")
+def prune_game_cache_command():
+    """Drops expired cached game metadata and the oldest rows beyond GAME_CACHE_DB_MAX_ROWS (run from cron with GAME_CACHE_PRUNE_INTERVAL=0)."""
+    before = GameCache.query.count()
+    prune_game_cache()
+    print(f"Pruned {before - GameCache.query.count()} cached game(s).")
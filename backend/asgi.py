@@ -0,0 +1,444 @@
+# asgi.py
+#
+# Async serving mode: uvicorn asgi:application [--workers N]
+#
+# Game details, search and recommendations are served by native coroutine handlers
+# below, so while they wait on IGDB, Twitch or Gemini they hold no thread, and
+# independent upstream calls (id chunks, per-title lookups, search alongside the
+# caller's authentication) run concurrently. DB work and response building still use
+# the Flask app's own (sync) functions, each step in a worker thread inside a request
+# context, so after_request hooks (CORS, ETags, compression, Server-Timing, metrics)
+# apply exactly as under WSGI. Every other route runs the Flask app on a thread pool.
+
+import asyncio
+import contextvars
+import io
+import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from flask import jsonify
+from werkzeug.exceptions import HTTPException
+
+import app as gameup
+from app import app as flask_app, RecommendationError
+from async_upstream import AsyncIGDBClient, AsyncGeminiClient
+from igdb_client import IGDBAuthError
+from igdb_scheduler import current_priority as current_igdb_priority, PRIORITY_INTERACTIVE
+from metrics import RequestSpans, current_spans, span
+from singleflight import AsyncSingleFlight, SingleFlightTimeout
+
+# Threads for routes without a native handler (a streaming response keeps its thread)
+wsgi_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv('ASGI_WSGI_THREADS', 32)),
+    thread_name_prefix='wsgi'
+)
+
+# Same settings, token source and rate scheduler as the app's sync client, so sync and
+# async callers together stay under IGDB's limit
+igdb = AsyncIGDBClient(
+    gameup.igdb.client_id,
+    gameup.igdb.client_secret,
+    api_url=gameup.igdb.api_url,
+    auth_url=gameup.igdb.auth_url,
+    connect_timeout=gameup.igdb.timeout[0],
+    read_timeout=gameup.igdb.timeout[1],
+    max_retries=gameup.igdb.max_retries,
+    backoff_factor=gameup.igdb.backoff_factor,
+    pool_size=int(os.getenv('IGDB_POOL_SIZE', 10)),
+    scheduler=gameup.igdb_scheduler
+)
+gemini = AsyncGeminiClient(
+    gameup.GOOGLE_API_KEY,
+    endpoint=gameup.GEMINI_API_ENDPOINT,
+    timeout=flask_app.config['GEMINI_TIMEOUT']
+)
+
+upstream_flight = AsyncSingleFlight(timeout=flask_app.config['SINGLE_FLIGHT_TIMEOUT'])
+gameup.upstream_flights['async-upstream'] = upstream_flight
+
+
+# --- Bridging to the Flask app ---
+def build_environ(scope, body):
+    """A WSGI environ for an ASGI HTTP scope and its request body."""
+    script_name = scope.get('root_path', '').encode('utf-8').decode('latin-1')
+    path_info = scope['path'].encode('utf-8').decode('latin-1')
+    if script_name and path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': script_name,
+        'PATH_INFO': path_info,
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1')
+        if name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        elif name == 'content-type':
+            key = 'CONTENT_TYPE'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin-1')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def _call_in_context(environ, fn, args):
+    if environ is None:
+        with flask_app.app_context():
+            return fn(*args)
+    # Concurrent steps of one request each get their own copy of the body stream
+    environ = dict(environ, **{'wsgi.input': io.BytesIO(environ['wsgi.input'].getvalue())})
+    with flask_app.request_context(environ):
+        return fn(*args)
+
+
+async def run_sync(fn, *args, environ=None):
+    """
+    Run a sync app function in a worker thread, inside a request context for `environ`
+    (or just an app context). The caller's context variables (request spans, IGDB
+    priority) carry over.
+    """
+    return await asyncio.to_thread(_call_in_context, environ, fn, args)
+
+
+def _finish_response(fn, args):
+    response = flask_app.make_response(fn(*args))
+    return flask_app.process_response(response)
+
+
+async def respond(environ, fn, *args):
+    """Build the response with fn(*args) (a view-style return value) and run the after_request hooks."""
+    return await run_sync(_finish_response, fn, args, environ=environ)
+
+
+async def send_response(send, environ, response):
+    await send({
+        'type': 'http.response.start',
+        'status': response.status_code,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                    for name, value in response.headers.to_wsgi_list()],
+    })
+    body = b'' if environ['REQUEST_METHOD'] == 'HEAD' else response.get_data()
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def run_wsgi(environ, send):
+    """Serve the request with the Flask app on wsgi_pool, streaming its output back."""
+    loop = asyncio.get_running_loop()
+
+    def send_from_thread(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    def run():
+        response_start = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response_start.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response_start['message'] = {
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+            }
+
+        body = flask_app(environ, start_response)
+        try:
+            for chunk in body:
+                if not response_start.get('sent'):
+                    send_from_thread(response_start['message'])
+                    response_start['sent'] = True
+                if chunk:
+                    send_from_thread({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+        if not response_start.get('sent'):
+            send_from_thread(response_start['message'])
+        send_from_thread({'type': 'http.response.body'})
+
+    # A fresh context per request, like a thread per request under WSGI
+    await loop.run_in_executor(wsgi_pool, contextvars.Context().run, run)
+
+
+# --- Async upstream calls ---
+async def igdb_single_flight(key, fn):
+    """Like the app's igdb_single_flight(), for coroutine functions."""
+    try:
+        return await upstream_flight.do(('igdb',) + key, fn)
+    except SingleFlightTimeout as e:
+        raise requests.exceptions.Timeout(str(e)) from e
+
+
+async def fetch_and_cache_games(game_ids):
+    games = await igdb.query('games', gameup.games_query(game_ids))
+    fetched = {game['id']: gameup.process_game(game) for game in games}
+    if fetched:
+        await run_sync(gameup.store_games_in_cache, fetched)
+    return fetched
+
+
+async def get_games_by_ids(game_ids):
+    """The app's get_games_by_ids(), with the IGDB chunks fetched concurrently."""
+    games, missing = await run_sync(gameup.get_stored_games, game_ids)
+    if missing:
+        size = gameup.IGDB_MAX_IDS_PER_QUERY
+        chunks = [tuple(missing[i:i + size]) for i in range(0, len(missing), size)]
+        for fetched in await asyncio.gather(*(
+            igdb_single_flight(('games', chunk), lambda chunk=chunk: fetch_and_cache_games(chunk)) for chunk in chunks
+        )):
+            games.update(fetched)
+    return games
+
+
+async def search_and_cache(source, text):
+    if source == 'catalog':
+        return await run_sync(gameup.search_and_cache, source, text)
+    games = await igdb.query('games', gameup.igdb_search_query(text))
+    for game in games:
+        gameup.upgrade_cover(game)
+    return gameup.cache_search_results(source, text, games)
+
+
+async def resolve_suggestions(suggestions):
+    """
+    The app's resolve_suggestions(): one multiquery for every title, or if that fails,
+    all the per-title lookups at once.
+    """
+    titled = [s for s in suggestions if s.get('title')]
+    queries = [(str(index), 'games', gameup.suggestion_query(s['title'])) for index, s in enumerate(titled)]
+    try:
+        results = await igdb.multiquery(queries)
+        found = [results.get(str(index)) for index in range(len(titled))]
+    except requests.exceptions.RequestException as e:
+        print(f"IGDB multiquery failed, falling back to individual lookups: {e}")
+        found = await asyncio.gather(*(igdb.query(endpoint, body) for _, endpoint, body in queries), return_exceptions=True)
+        for index, result in enumerate(found):
+            if isinstance(result, requests.exceptions.RequestException):
+                print(f"Could not fetch details for AI suggestion: {titled[index]['title']}")
+                found[index] = None
+            elif isinstance(result, BaseException):
+                raise result
+
+    recommendations = (gameup.suggestion_recommendation(s, game_details) for s, game_details in zip(titled, found))
+    return [recommendation for recommendation in recommendations if recommendation]
+
+
+async def generate_recommendations(completed_game_ids, timings):
+    """The app's generate_recommendations() with async IGDB and Gemini calls. Raises RecommendationError."""
+    started = time.perf_counter()
+    try:
+        completed_games = await get_games_by_ids(completed_game_ids)
+    except IGDBAuthError:
+        raise RecommendationError("Could not authenticate with IGDB.", 500)
+    except requests.exceptions.RequestException:
+        raise RecommendationError("Failed to fetch completed games details from IGDB.", 502)
+    timings['igdb-names'] = time.perf_counter() - started
+
+    prompt = gameup.build_recommendation_prompt([game['name'] for game in completed_games.values()])
+    model = flask_app.config['GEMINI_MODEL']
+
+    started = time.perf_counter()
+    try:
+        with span('gemini'):
+            ai_response_text = await upstream_flight.do(
+                gameup.gemini_prompt_key(prompt), lambda: gemini.generate_content(model, prompt),
+                timeout=flask_app.config['GEMINI_TIMEOUT']
+            )
+        suggestions = gameup.parse_suggestions(ai_response_text)
+    except Exception as e:
+        print(f"AI response parsing error: {e}")
+        raise RecommendationError("Failed to get a valid recommendation from the AI service.", 500)
+    timings['llm'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    recommended_games_data = await resolve_suggestions(suggestions)
+    timings['igdb-suggestions'] = time.perf_counter() - started
+    return recommended_games_data
+
+
+async def local_recommendations(completed_game_ids, timings, user_id):
+    return await run_sync(lambda: gameup.generate_local_recommendations(completed_game_ids, timings, user_id=user_id))
+
+
+async def recommend_for_user(completed_game_ids, engine, timings, user_id):
+    """The app's recommend_for_user(); the local recommender runs in a worker thread."""
+    if engine == 'local':
+        return await local_recommendations(completed_game_ids, timings, user_id), 'local'
+
+    try:
+        return await generate_recommendations(completed_game_ids, timings), 'gemini'
+    except RecommendationError as e:
+        if engine != 'auto':
+            raise
+        print(f"Gemini recommendations failed ({e.message}); falling back to the local recommender.")
+        return await local_recommendations(completed_game_ids, timings, user_id), 'local'
+
+
+# --- Native handlers ---
+async def game_details(environ, igdb_id):
+    try:
+        game = (await get_games_by_ids([igdb_id])).get(igdb_id)
+    except requests.exceptions.RequestException as e:
+        return await respond(environ, gameup.igdb_error_response, e)
+    return await respond(environ, gameup.game_detail_response, game)
+
+
+def _start_search():
+    """The search plan, or an error message for a 400."""
+    try:
+        search_text, options = gameup.search_request_options()
+    except ValueError as e:
+        return str(e)
+    if not search_text:
+        return "Search text is required"
+    source = gameup.search_source()
+    games, cache_status = gameup.get_cached_search(source, search_text)
+    return search_text, source, games, cache_status, gameup.wants_library_status(options)
+
+
+async def search(environ):
+    started = await run_sync(_start_search, environ=environ)
+    if isinstance(started, str):
+        return await respond(environ, lambda message: (jsonify({"error": message}), 400), started)
+    search_text, source, games, cache_status, with_status = started
+
+    # Search upstream while the caller's token is checked
+    lookups = []
+    if games is None:
+        lookups.append(igdb_single_flight(
+            ('search', source, search_text), lambda: search_and_cache(source, search_text)
+        ))
+    if with_status:
+        lookups.append(run_sync(gameup.get_optional_user, environ=environ))
+    try:
+        results = await asyncio.gather(*lookups)
+    except requests.exceptions.RequestException as e:
+        return await respond(environ, gameup.igdb_error_response, e)
+
+    if games is None:
+        games = results.pop(0)
+    current_user = results[0] if with_status else None
+    return await respond(environ, gameup.search_response, games, cache_status, current_user)
+
+
+async def recommendations(environ):
+    timings = {} # Per-step durations in seconds, reported in the Server-Timing header
+
+    def start():
+        current_user, error_response = gameup.authenticate_request()
+        if error_response:
+            return error_response, None, None
+        response, plan = gameup.prepare_recommendations(current_user, timings)
+        return response, current_user, plan
+
+    response, current_user, plan = await run_sync(start, environ=environ)
+    if response:
+        return await respond(environ, lambda: response)
+    completed_game_ids, engine, fingerprint = plan
+
+    try:
+        recommended_games_data, engine = await recommend_for_user(completed_game_ids, engine, timings, current_user.id)
+    except RecommendationError as e:
+        return await respond(environ, lambda message, status: (jsonify({"error": message}), status), e.message, e.status_code)
+
+    return await respond(
+        environ, gameup.recommendations_response, current_user, fingerprint, recommended_games_data, engine, timings
+    )
+
+
+# Flask endpoint -> native handler; the URL rules (and their arguments) stay the app's
+NATIVE_HANDLERS = {
+    'get_game_details': game_details,
+    'search_games': search,
+    'get_ai_recommendations': recommendations,
+}
+
+
+async def serve_native(handler, endpoint, environ, view_args, send):
+    spans_token = current_spans.set(RequestSpans())
+    priority_token = None
+    if endpoint in gameup.IGDB_INTERACTIVE_ENDPOINTS:
+        priority_token = current_igdb_priority.set(PRIORITY_INTERACTIVE)
+    try:
+        try:
+            response = await handler(environ, **view_args)
+        except Exception:
+            traceback.print_exc()
+            response = await respond(environ, lambda: (jsonify({"error": "Internal server error"}), 500))
+    finally:
+        if priority_token is not None:
+            current_igdb_priority.reset(priority_token)
+        current_spans.reset(spans_token)
+    await send_response(send, environ, response)
+
+
+def match_native_handler(environ):
+    """(handler, endpoint, view args) if a native handler serves this request, else None."""
+    if environ['REQUEST_METHOD'] == 'OPTIONS': # CORS preflights are answered by Flask-CORS
+        return None
+    try:
+        endpoint, view_args = flask_app.url_map.bind_to_environ(environ).match()
+    except HTTPException: # 404, 405 and redirects are rendered by Flask
+        return None
+    handler = NATIVE_HANDLERS.get(endpoint)
+    return (handler, endpoint, view_args) if handler else None
+
+
+# --- ASGI application ---
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await igdb.aclose()
+            await gemini.aclose()
+            wsgi_pool.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        raise ValueError(f"Unsupported ASGI scope type {scope['type']!r}")
+
+    body = await read_body(receive)
+    if body is None: # The client went away
+        return
+    environ = build_environ(scope, body)
+    native = match_native_handler(environ)
+    if native is None:
+        await run_wsgi(environ, send)
+    else:
+        handler, endpoint, view_args = native
+        await serve_native(handler, endpoint, environ, view_args, send)
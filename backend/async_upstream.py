@@ -0,0 +1,226 @@
+# async_upstream.py
+
+import asyncio
+import random
+import time
+
+import httpx
+import requests
+
+from igdb_client import (
+    IGDB_API_URL, TWITCH_AUTH_URL, RETRYABLE_STATUS_CODES, MULTIQUERY_MAX_QUERIES, IGDB_RESPONSES,
+    IGDBAuthError, IGDBRateLimited, escape_query_string
+)
+from igdb_scheduler import SchedulerTimeout
+from metrics import span
+
+GEMINI_API_ENDPOINT = 'https://generativelanguage.googleapis.com'
+
+
+def _as_requests_error(e):
+    """
+    Translate an httpx transport error into the requests exception the sync code paths
+    raise, so callers handle both the same way.
+    """
+    if isinstance(e, httpx.TimeoutException):
+        return requests.exceptions.Timeout(str(e) or type(e).__name__)
+    return requests.exceptions.ConnectionError(str(e) or type(e).__name__)
+
+
+class _LoopBoundClient:
+    """
+    Lazily creates one pooled httpx.AsyncClient per event loop: connections (and locks)
+    can't be shared across loops, and tests or CLI helpers may run their own.
+    """
+
+    def __init__(self, timeout, pool_size):
+        self._timeout = timeout
+        self._limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self._client = None
+        self._loop = None
+
+    def _on_new_loop(self):
+        """Create any other per-loop state (called when the client is (re)created)."""
+
+    @property
+    def client(self):
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(timeout=self._timeout, limits=self._limits)
+            self._loop = loop
+            self._on_new_loop()
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None and self._loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = None
+        self._loop = None
+
+
+class AsyncIGDBClient(_LoopBoundClient):
+    """
+    The asyncio counterpart of IGDBClient: the same timeouts, retries with backoff,
+    401 token refresh and rate scheduler (share the sync client's so the process as a
+    whole stays under IGDB's limit), but waiting never holds a thread. Errors are raised
+    as the same requests/IGDB exceptions the sync client raises.
+    """
+
+    def __init__(self, client_id, client_secret, api_url=IGDB_API_URL, auth_url=TWITCH_AUTH_URL,
+                 connect_timeout=3.05, read_timeout=10, max_retries=3, backoff_factor=0.5,
+                 pool_size=10, refresh_margin=300, scheduler=None):
+        super().__init__(httpx.Timeout(read_timeout, connect=connect_timeout), pool_size)
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.api_url = api_url.rstrip('/')
+        self.auth_url = auth_url
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.refresh_margin = refresh_margin
+        self.scheduler = scheduler
+
+        self._token = None
+        self._token_expires_at = 0.0 # time.monotonic()
+        self._token_lock = None
+
+    def _on_new_loop(self):
+        self._token_lock = asyncio.Lock()
+
+    # --- Token management ---
+    def _token_is_fresh(self):
+        return self._token and self._token_expires_at > time.monotonic() + self.refresh_margin
+
+    async def get_token(self, force_refresh=False):
+        """Return a valid access token; concurrent refreshes wait for a single Twitch call."""
+        if not force_refresh and self._token_is_fresh():
+            return self._token
+
+        client = self.client
+        stale_token = self._token
+        async with self._token_lock:
+            # Another task may have refreshed the token while we waited for the lock
+            if self._token_is_fresh() and not (force_refresh and self._token == stale_token):
+                return self._token
+            try:
+                with span('twitch'):
+                    response = await client.post(self.auth_url, params={
+                        'client_id': self.client_id,
+                        'client_secret': self.client_secret,
+                        'grant_type': 'client_credentials'
+                    })
+                response.raise_for_status()
+                data = response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                print(f"Error getting IGDB token: {e}")
+                raise IGDBAuthError(f"Could not obtain IGDB token: {e}") from e
+
+            self._token = data['access_token']
+            self._token_expires_at = time.monotonic() + data['expires_in']
+            print("Successfully obtained new IGDB token (async client).")
+            return self._token
+
+    # --- Requests ---
+    async def _backoff(self, attempt, response=None):
+        delay = self.backoff_factor * (2 ** attempt)
+        if response is not None and response.headers.get('Retry-After'):
+            try:
+                delay = max(delay, float(response.headers['Retry-After']))
+            except ValueError:
+                pass
+        await asyncio.sleep(delay + random.uniform(0, self.backoff_factor / 2))
+
+    async def post(self, endpoint, body):
+        """POST an Apicalypse query to an IGDB endpoint and return the raw response."""
+        url = f'{self.api_url}/{endpoint}'
+        refreshed = False
+        attempt = 0
+        while True:
+            headers = {'Client-ID': self.client_id, 'Authorization': f'Bearer {await self.get_token()}'}
+            if self.scheduler is not None:
+                try:
+                    with span('igdb-queue'):
+                        await self.scheduler.acquire_async()
+                except SchedulerTimeout as e:
+                    raise IGDBRateLimited(str(e)) from e
+            try:
+                with span('igdb'):
+                    response = await self.client.post(url, headers=headers, content=body.encode('utf-8'))
+            except httpx.TransportError as e:
+                IGDB_RESPONSES.inc(status='error')
+                if attempt >= self.max_retries:
+                    raise _as_requests_error(e) from e
+                await self._backoff(attempt)
+                attempt += 1
+                continue
+
+            IGDB_RESPONSES.inc(status=response.status_code)
+
+            if response.status_code == 401 and not refreshed:
+                await self.get_token(force_refresh=True)
+                refreshed = True
+                continue
+
+            if response.status_code in RETRYABLE_STATUS_CODES and attempt < self.max_retries:
+                if response.status_code == 429 and self.scheduler is not None:
+                    self.scheduler.pause(self.backoff_factor * (2 ** attempt))
+                await self._backoff(attempt, response)
+                attempt += 1
+                continue
+
+            if response.is_error:
+                raise requests.exceptions.HTTPError(f"{response.status_code} error from IGDB for url: {url}")
+            return response
+
+    async def query(self, endpoint, body):
+        """Run an Apicalypse query and return the decoded JSON list."""
+        return (await self.post(endpoint, body)).json()
+
+    async def multiquery(self, queries):
+        """
+        Like IGDBClient.multiquery(): (name, endpoint, body) tuples in, {name: result list}
+        out. Requests for more than MULTIQUERY_MAX_QUERIES queries go out concurrently.
+        """
+        bodies = [
+            ''.join(
+                f'query {endpoint} "{escape_query_string(name)}" {{ {query_body} }};'
+                for name, endpoint, query_body in queries[i:i + MULTIQUERY_MAX_QUERIES]
+            )
+            for i in range(0, len(queries), MULTIQUERY_MAX_QUERIES)
+        ]
+        results = {}
+        for entries in await asyncio.gather(*(self.query('multiquery', body) for body in bodies)):
+            for entry in entries:
+                results[entry['name']] = entry.get('result', [])
+        return results
+
+
+class AsyncGeminiClient(_LoopBoundClient):
+    """
+    Calls Gemini's generateContent REST method directly (google-generativeai has no
+    asyncio transport for REST), returning the response text like `.text` does.
+    """
+
+    def __init__(self, api_key, endpoint=None, timeout=20, pool_size=10):
+        super().__init__(httpx.Timeout(timeout), pool_size)
+        self.api_key = api_key
+        endpoint = (endpoint or GEMINI_API_ENDPOINT).rstrip('/')
+        # Like the SDK's client_options, accept a bare host name
+        self.endpoint = endpoint if '://' in endpoint else f'https://{endpoint}'
+
+    async def generate_content(self, model, prompt):
+        """Return the text of Gemini's answer to a single-turn prompt."""
+        try:
+            response = await self.client.post(
+                f'{self.endpoint}/v1beta/models/{model}:generateContent',
+                params={'key': self.api_key},
+                json={'contents': [{'role': 'user', 'parts': [{'text': prompt}]}]}
+            )
+        except httpx.TransportError as e:
+            raise _as_requests_error(e) from e
+        if response.is_error:
+            raise requests.exceptions.HTTPError(f"{response.status_code} error from Gemini: {response.text[:200]}")
+
+        candidates = response.json().get('candidates') or []
+        if not candidates:
+            raise ValueError("Gemini returned no candidates")
+        return ''.join(part.get('text', '') for part in candidates[0].get('content', {}).get('parts', []))
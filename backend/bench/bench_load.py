@@ -0,0 +1,338 @@
+# bench/bench_load.py
+"""
+End-to-end load test: boots the app against local Twitch/IGDB/Gemini stubs, seeds a
+database with synthetic users and libraries, drives a weighted mix of traffic and
+reports p50/p95/p99 latency and throughput per endpoint.
+
+    python bench/bench_load.py [--duration 30] [--concurrency 16] [--save baseline.json]
+    python bench/bench_load.py --compare baseline.json [--tolerance 0.15]
+    python bench/bench_load.py --server asgi   # asgi.py under uvicorn instead of WSGI threads
+
+By default a throwaway SQLite database is used. To run against Postgres, pass
+--database-url and --reset-db (its tables are dropped and recreated).
+--compare exits with status 1 when an endpoint's p95 latency or throughput is worse
+than the baseline by more than the tolerance, so the run can gate CI.
+"""
+
+import argparse
+import bisect
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import serve_app, serve_asgi, summarize # noqa: E402
+from stubs import StubUpstreams, synthetic_catalog # noqa: E402
+
+PASSWORD = 'Benchmark1'
+DEFAULT_MIX = 'login=3,search=30,detail=30,library=25,library_write=5,recommendations=7'
+REGRESSION_MIN_SAMPLES = 20 # Endpoints with fewer samples are too noisy to gate on
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown operations {sorted(unknown)}; choose from {sorted(OPERATIONS)}")
+    return mix
+
+
+class ZipfSampler:
+    """Draws items with popularity falling off as 1/rank^s, so hot items repeat like real traffic."""
+
+    def __init__(self, items, s=1.1, rng=None):
+        self.items = list(items)
+        self.cumulative = list(itertools.accumulate(1 / (rank ** s) for rank in range(1, len(self.items) + 1)))
+        self.rng = rng or random.Random()
+
+    def sample(self):
+        return self.items[bisect.bisect_left(self.cumulative, self.rng.random() * self.cumulative[-1])]
+
+
+# --- Seeding ---
+def seed_database(gameup, catalog, users, library_sizes, rng):
+    """Create users with libraries of the given sizes. Returns [{id, username, token, entries}]."""
+    from passwords import PasswordHasher
+
+    password_hash = PasswordHasher(rounds=gameup.app.config['BCRYPT_LOG_ROUNDS'], workers=0).hash(PASSWORD)
+    game_ids = list(catalog)
+    seeded = []
+    with gameup.app.app_context():
+        for i in range(users):
+            user = gameup.User(username=f'bench{i}', email=f'bench{i}@example.com', password_hash=password_hash)
+            gameup.db.session.add(user)
+            gameup.db.session.flush()
+            size = min(rng.choice(library_sizes), len(game_ids))
+            rows = [{'igdb_game_id': game_id, 'status': rng.choice(gameup.LIBRARY_STATUSES)}
+                    for game_id in rng.sample(game_ids, size)]
+            gameup.import_library(user.id, rows) # Commits
+            entries = [entry.id for entry in gameup.UserGame.query.filter_by(user_id=user.id)]
+            seeded.append({
+                'id': user.id,
+                'username': user.username,
+                'token': gameup.create_token(user),
+                'entries': entries,
+                'has_completed': any(row['status'] == 'Completed' for row in rows),
+            })
+    return seeded
+
+
+# --- Traffic ---
+class VirtualUser:
+    """One closed-loop client: a keep-alive session, its own ETag cache and a seeded RNG."""
+
+    def __init__(self, base_url, users, game_sampler, search_sampler, rng):
+        import requests
+
+        self.session = requests.Session()
+        self.base_url = base_url
+        self.users = users
+        self.game_sampler = game_sampler
+        self.search_sampler = search_sampler
+        self.rng = rng
+        self.etags = {} # (token, url) -> ETag, revalidated like a browser would
+
+    def _headers(self, user):
+        return {'Authorization': f"Bearer {user['token']}"}
+
+    def _get(self, url, user=None):
+        # Each token is its own client: a browser never replays another account's validators
+        key = (user['token'] if user else None, url)
+        headers = self._headers(user) if user else {}
+        if key in self.etags:
+            headers['If-None-Match'] = self.etags[key]
+        response = self.session.get(f'{self.base_url}{url}', headers=headers)
+        if response.headers.get('ETag'):
+            self.etags[key] = response.headers['ETag']
+        return response
+
+    def login(self):
+        user = self.rng.choice(self.users)
+        return self.session.post(f'{self.base_url}/login', json={'identifier': user['username'], 'password': PASSWORD})
+
+    def search(self):
+        # Typeahead: a prefix of a popular name, at least three characters long
+        name = self.search_sampler.sample()
+        text = name[:self.rng.randint(min(3, len(name)), len(name))]
+        return self.session.post(f'{self.base_url}/api/search', json={'searchText': text})
+
+    def detail(self):
+        return self._get(f'/api/game/{self.game_sampler.sample()}')
+
+    def library(self):
+        return self._get('/api/library?limit=50', self.rng.choice(self.users))
+
+    def library_write(self):
+        user = self.rng.choice(self.users)
+        if not user['entries']:
+            return self.library()
+        entry = self.rng.choice(user['entries'])
+        return self.session.put(f'{self.base_url}/api/library/{entry}', headers=self._headers(user),
+                                json={'status': self.rng.choice(['Playing', 'Completed', 'Dropped', 'Wishlist'])})
+
+    def recommendations(self):
+        # Users without a completed game would only get a 400
+        user = self.rng.choice([user for user in self.users if user['has_completed']] or self.users)
+        return self._get('/api/recommendations', user)
+
+
+OPERATIONS = ('login', 'search', 'detail', 'library', 'library_write', 'recommendations')
+
+
+def run_load(base_url, users, catalog, mix, concurrency, duration, warmup, seed):
+    """Drive the mix with `concurrency` closed-loop clients. Returns ({op: [ms]}, {op: Counter(status)}, seconds)."""
+    samples = defaultdict(list)
+    statuses = defaultdict(Counter)
+    lock = threading.Lock()
+    operations, weights = zip(*mix.items())
+    measure_from = time.monotonic() + warmup
+    stop_at = measure_from + duration
+
+    def client(index):
+        rng = random.Random(seed * 1000 + index)
+        names = [game['name'] for game in catalog.values()]
+        vu = VirtualUser(base_url, users, ZipfSampler(catalog, rng=rng), ZipfSampler(names, rng=rng), rng)
+        while time.monotonic() < stop_at:
+            operation = rng.choices(operations, weights)[0]
+            started = time.monotonic()
+            try:
+                status = getattr(vu, operation)().status_code
+            except Exception as e: # A failed request is a result too
+                status = type(e).__name__
+            if started >= measure_from:
+                with lock:
+                    samples[operation].append((time.monotonic() - started) * 1000)
+                    statuses[operation][status] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, statuses, duration
+
+
+# --- Reporting ---
+def build_report(samples, statuses, elapsed, args, stubs, dialect):
+    results = {}
+    for operation in OPERATIONS:
+        if operation not in samples:
+            continue
+        summary = summarize(samples[operation], elapsed)
+        ok = sum(count for status, count in statuses[operation].items() if status in (200, 201, 304))
+        summary['errors'] = summary['count'] - ok
+        summary['statuses'] = {str(status): count for status, count in statuses[operation].items()}
+        results[operation] = summary
+    all_samples = [ms for operation in samples.values() for ms in operation]
+    results['all'] = summarize(all_samples, elapsed)
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': commit,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': dialect,
+            'args': {key: value for key, value in vars(args).items() if key not in ('save', 'compare', 'database_url')},
+        },
+        'upstream_requests': {f'{service} {status}': count for (service, status), count in sorted(stubs.requests.items())},
+        'results': results,
+    }
+
+
+def print_report(report):
+    print(f"{'endpoint':<16}{'count':>8}{'err':>6}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for operation, r in report['results'].items():
+        if not r['count']:
+            continue
+        print(f"{operation:<16}{r['count']:>8}{r.get('errors', 0):>6}{r['rps']:>9.1f}"
+              f"{r['p50']:>9.1f}{r['p95']:>9.1f}{r['p99']:>9.1f}{r['max']:>9.1f}")
+    print('upstream: ' + ', '.join(f'{key}={count}' for key, count in report['upstream_requests'].items()))
+
+
+def compare_reports(baseline, report, tolerance):
+    """Print per-endpoint deltas against a baseline; return the list of regressions."""
+    regressions = []
+    print(f"\nvs baseline {baseline['meta'].get('commit')} ({baseline['meta'].get('created_at')}):")
+    for operation, current in report['results'].items():
+        previous = baseline['results'].get(operation)
+        if not previous or not previous.get('count') or not current.get('count'):
+            continue
+        deltas = {key: (current[key] - previous[key]) / previous[key] if previous[key] else 0.0
+                  for key in ('p50', 'p95', 'p99', 'rps')}
+        flags = []
+        if min(current['count'], previous['count']) >= REGRESSION_MIN_SAMPLES:
+            if deltas['p95'] > tolerance:
+                flags.append('p95')
+            if -deltas['rps'] > tolerance:
+                flags.append('throughput')
+        if flags:
+            regressions.append((operation, flags))
+        print(f"{operation:<16}" + ''.join(f"{key}{deltas[key]:+8.1%}  " for key in ('p50', 'p95', 'p99', 'rps'))
+              + (f"REGRESSED ({', '.join(flags)})" if flags else ''))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=5, help='seconds of unmeasured traffic first')
+    parser.add_argument('--concurrency', type=int, default=16, help='closed-loop clients')
+    parser.add_argument('--request-threads', type=int, default=8, help='app request threads')
+    parser.add_argument('--server', choices=('wsgi', 'asgi'), default='wsgi',
+                        help='serve the Flask app on a thread pool, or asgi.py under uvicorn')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f'operation weights ({DEFAULT_MIX})')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--library-sizes', default='5,25,100,500', help='library sizes users are drawn from')
+    parser.add_argument('--games', type=int, default=5000, help='synthetic IGDB catalog size')
+    parser.add_argument('--igdb-latency-ms', type=float, default=80)
+    parser.add_argument('--igdb-jitter-ms', type=float, default=40)
+    parser.add_argument('--igdb-rate', type=float, default=4, help='stub IGDB requests/second before 429s')
+    parser.add_argument('--igdb-429-rate', type=float, default=0.0, help='extra fraction of IGDB requests answered 429')
+    parser.add_argument('--gemini-latency-ms', type=float, default=1500)
+    parser.add_argument('--bcrypt-rounds', type=int, default=10)
+    parser.add_argument('--database-url', help='run against this database instead of a throwaway SQLite file')
+    parser.add_argument('--reset-db', action='store_true', help='allow dropping the tables of --database-url')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', help='write the report (a baseline) to this JSON file')
+    parser.add_argument('--compare', help='compare against a saved baseline; exit 1 on regression')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed relative p95/throughput regression')
+    args = parser.parse_args()
+
+    if args.database_url and not args.reset_db:
+        parser.error('--database-url drops and recreates every table; pass --reset-db to confirm')
+
+    rng = random.Random(args.seed)
+    catalog = synthetic_catalog(args.games, seed=args.seed)
+    stubs = StubUpstreams(
+        catalog,
+        igdb_latency=args.igdb_latency_ms / 1000,
+        igdb_jitter=args.igdb_jitter_ms / 1000,
+        igdb_rate=args.igdb_rate,
+        igdb_429_rate=args.igdb_429_rate,
+        gemini_latency=args.gemini_latency_ms / 1000,
+        seed=args.seed
+    ).start()
+
+    # The app reads its configuration at import time
+    os.environ.update(stubs.app_environment())
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='gameup-load-'), 'bench.db')}"
+    os.environ.setdefault('SECRET_KEY', 'benchmark-secret')
+    os.environ['BCRYPT_LOG_ROUNDS'] = str(args.bcrypt_rounds)
+    import app as gameup
+
+    with gameup.app.app_context():
+        gameup.db.drop_all()
+        gameup.db.create_all()
+        dialect = gameup.db.engine.dialect.name
+    library_sizes = [int(size) for size in args.library_sizes.split(',')]
+    started = time.perf_counter()
+    users = seed_database(gameup, catalog, args.users, library_sizes, rng)
+    print(f"Seeded {len(users)} users ({dialect}) in {time.perf_counter() - started:.1f}s; "
+          f"{args.concurrency} clients for {args.warmup:.0f}s warm-up + {args.duration:.0f}s")
+
+    if args.server == 'asgi':
+        os.environ['ASGI_WSGI_THREADS'] = str(args.request_threads)
+        import asgi
+        server, base_url = serve_asgi(asgi.application)
+    else:
+        server, base_url = serve_app(gameup.app, args.request_threads)
+    samples, statuses, elapsed = run_load(base_url, users, catalog, args.mix, args.concurrency,
+                                          args.duration, args.warmup, args.seed)
+    server.shutdown()
+    stubs.stop()
+    gameup.password_hasher.shutdown()
+
+    report = build_report(samples, statuses, elapsed, args, stubs, dialect)
+    print_report(report)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.save}")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare_reports(json.load(f), report, args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+# bench/bench_login_storm.py
+"""
+Measures how a burst of logins affects the latency of other endpoints, with bcrypt
+running inline on the request threads versus on the dedicated password hashing pool.
+
+    python bench/bench_login_storm.py [--logins 64] [--concurrency 16] [--request-threads 4]
+
+The app is served in-process on a fixed number of request threads (like gunicorn's
+--threads) against a throwaway SQLite database. While the login storm runs, a probe
+thread keeps calling GET /api/me and records its latency.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import percentile, serve_app # noqa: E402
+
+
+def run_storm(base_url, token, logins, concurrency):
+    import requests
+
+    probe_samples = []
+    login_statuses = []
+    done = threading.Event()
+
+    def probe():
+        session = requests.Session()
+        while not done.is_set():
+            started = time.perf_counter()
+            session.get(f'{base_url}/api/me', headers={'Authorization': f'Bearer {token}'})
+            probe_samples.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.01)
+
+    def login(_):
+        response = requests.post(f'{base_url}/login', json={'identifier': 'bench', 'password': 'Benchmark1'})
+        login_statuses.append(response.status_code)
+
+    prober = threading.Thread(target=probe)
+    prober.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as storm:
+        list(storm.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    prober.join()
+    return probe_samples, login_statuses, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--request-threads', type=int, default=4)
+    parser.add_argument('--rounds', type=int, default=12, help='bcrypt work factor')
+    parser.add_argument('--hash-workers', type=int, default=2)
+    parser.add_argument('--queue-limit', type=int, default=8)
+    args = parser.parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix='gameup-bench-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(db_dir, "bench.db")}'
+    os.environ.setdefault('SECRET_KEY', 'benchmark-secret')
+    os.environ['BCRYPT_LOG_ROUNDS'] = str(args.rounds)
+
+    import app as gameup
+    from passwords import PasswordHasher
+
+    with gameup.app.app_context():
+        gameup.db.create_all()
+        user = gameup.User(username='bench', email='bench@example.com',
+                           password_hash=PasswordHasher(rounds=args.rounds, workers=0).hash('Benchmark1'))
+        gameup.db.session.add(user)
+        gameup.db.session.commit()
+        token = gameup.create_token(user)
+
+    server, base_url = serve_app(gameup.app, args.request_threads)
+
+    modes = [
+        ('inline bcrypt', PasswordHasher(rounds=args.rounds, workers=0)),
+        (f'hashing pool ({args.hash_workers} procs, queue {args.queue_limit})',
+         PasswordHasher(rounds=args.rounds, workers=args.hash_workers, max_pending=args.queue_limit)),
+    ]
+    print(f"{args.logins} logins, {args.concurrency} at a time, {args.request_threads} request threads, bcrypt rounds={args.rounds}")
+    for label, hasher in modes:
+        gameup.password_hasher = hasher
+        if hasher.workers: # Start the worker processes outside the measurement
+            hasher.hash('warm-up')
+        samples, statuses, elapsed = run_storm(base_url, token, args.logins, args.concurrency)
+        print(f"{label:<36} /api/me p50={percentile(samples, 50):8.1f}ms p95={percentile(samples, 95):8.1f}ms "
+              f"max={max(samples):8.1f}ms mean={statistics.mean(samples):7.1f}ms | logins: "
+              f"{statuses.count(200)} ok, {statuses.count(503)} shed (503) in {elapsed:.1f}s")
+        hasher.shutdown()
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
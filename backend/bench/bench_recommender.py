@@ -0,0 +1,105 @@
+# bench/bench_recommender.py
+"""
+Compares the latency of the in-process content-based recommender with the Gemini path.
+
+    python bench/bench_recommender.py [--candidates 5000] [--queries 200] [--llm-calls 3]
+
+The local recommender runs against a synthetic candidate catalog. The Gemini path is only
+timed when GOOGLE_API_KEY is set (each call is billed, so keep --llm-calls small).
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import percentile # noqa: E402
+from recommender import ContentRecommender # noqa: E402
+
+GENRES = ['RPG', 'Shooter', 'Platform', 'Puzzle', 'Strategy', 'Adventure', 'Racing', 'Sport',
+          'Fighting', 'Simulator', 'Indie', 'Tactical', 'Hack and slash', 'Visual Novel']
+PLATFORMS = ['PC', 'PlayStation 5', 'PlayStation 4', 'Xbox Series X|S', 'Xbox One', 'Nintendo Switch', 'Mac', 'Linux']
+
+
+def synthetic_catalog(size, seed=0):
+    rng = random.Random(seed)
+    companies = [f'Studio {i}' for i in range(size // 10 + 1)]
+    games = []
+    for game_id in range(1, size + 1):
+        games.append({
+            'id': game_id,
+            'name': f'Game {game_id}',
+            'cover': {'url': f'//images.igdb.com/igdb/image/upload/t_cover_big/co{game_id}.jpg'},
+            'first_release_date': rng.randint(500_000_000, 1_750_000_000),
+            'genres': [{'name': g} for g in rng.sample(GENRES, rng.randint(1, 3))],
+            'platforms': [{'name': p} for p in rng.sample(PLATFORMS, rng.randint(1, 4))],
+            'developers': [rng.choice(companies)],
+            'publishers': [rng.choice(companies)],
+        })
+    return games
+
+
+def report(label, samples_ms):
+    print(f"{label:<28} n={len(samples_ms):<5} p50={percentile(samples_ms, 50):9.2f}ms "
+          f"p95={percentile(samples_ms, 95):9.2f}ms mean={statistics.mean(samples_ms):9.2f}ms")
+
+
+def bench_local(catalog, queries, completed_per_user, seed=1):
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    recommender = ContentRecommender(catalog)
+    print(f"Built candidate matrix ({len(recommender)} x {len(recommender.vocabulary)}, {len(recommender.data)} non-zero) in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    samples = []
+    for _ in range(queries):
+        completed = rng.sample(catalog, completed_per_user)
+        started = time.perf_counter()
+        recommender.recommend(completed, k=3)
+        samples.append((time.perf_counter() - started) * 1000)
+    report('local recommender', samples)
+    return samples
+
+
+def bench_gemini(catalog, calls, completed_per_user, model_name, seed=1):
+    import google.generativeai as genai
+
+    genai.configure(api_key=os.environ['GOOGLE_API_KEY'])
+    model = genai.GenerativeModel(model_name)
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(calls):
+        names = [game['name'] for game in rng.sample(catalog, completed_per_user)]
+        prompt = (f"Based on these completed games, suggest exactly 3 new games as a JSON array of "
+                  f"objects with 'title' and 'reason' keys: {', '.join(names)}.")
+        started = time.perf_counter()
+        model.generate_content(prompt)
+        samples.append((time.perf_counter() - started) * 1000)
+    report(f'gemini ({model_name})', samples)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--candidates', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--completed', type=int, default=10, help='completed games per simulated user')
+    parser.add_argument('--llm-calls', type=int, default=3)
+    parser.add_argument('--model', default=os.getenv('GEMINI_MODEL', 'gemini-2.5-flash'))
+    args = parser.parse_args()
+
+    catalog = synthetic_catalog(args.candidates)
+    local = bench_local(catalog, args.queries, args.completed)
+
+    if not os.getenv('GOOGLE_API_KEY'):
+        print("GOOGLE_API_KEY not set; skipping the Gemini comparison.")
+        return
+    llm = bench_gemini(catalog, args.llm_calls, args.completed, args.model)
+    print(f"Local recommender is ~{statistics.median(llm) / statistics.median(local):,.0f}x faster at the median.")
+
+
+if __name__ == '__main__':
+    main()
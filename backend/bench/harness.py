@@ -0,0 +1,85 @@
+# bench/harness.py
+"""Helpers shared by the benchmarks: serving the app in-process and summarising latencies."""
+
+import logging
+import socketserver
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PooledWSGIServer(socketserver.ThreadingMixIn):
+    """Serve requests on a fixed-size thread pool, like a gunicorn gthread worker."""
+    pool = None
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+
+def serve_app(wsgi_app, request_threads):
+    """Serve a WSGI app on a background thread with a fixed request pool. Returns (server, base URL)."""
+    from werkzeug.serving import make_server, BaseWSGIServer
+
+    server_class = type('BenchServer', (PooledWSGIServer, BaseWSGIServer), {
+        'pool': ThreadPoolExecutor(max_workers=request_threads)
+    })
+    logging.getLogger('werkzeug').setLevel(logging.ERROR) # No per-request access log
+    server = make_server('127.0.0.1', 0, wsgi_app)
+    server.__class__ = server_class
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+class ASGIServer:
+    """uvicorn serving an ASGI app from a background thread (one event loop, like one worker)."""
+
+    def __init__(self, asgi_app):
+        import uvicorn
+
+        self.server = uvicorn.Server(uvicorn.Config(asgi_app, host='127.0.0.1', port=0, log_level='warning',
+                                                    access_log=False, lifespan='on'))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self, timeout=10):
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.thread.is_alive():
+                raise RuntimeError("uvicorn did not start")
+            time.sleep(0.01)
+        return self
+
+    @property
+    def port(self):
+        return self.server.servers[0].sockets[0].getsockname()[1]
+
+    def shutdown(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+def serve_asgi(asgi_app):
+    """Serve an ASGI app with uvicorn on a background thread. Returns (server, base URL)."""
+    server = ASGIServer(asgi_app).start()
+    return server, f'http://127.0.0.1:{server.port}'
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(samples_ms, elapsed):
+    """count, throughput and latency percentiles (ms) for one endpoint."""
+    if not samples_ms:
+        return {"count": 0, "rps": 0.0}
+    return {
+        "count": len(samples_ms),
+        "rps": len(samples_ms) / elapsed,
+        "p50": percentile(samples_ms, 50),
+        "p95": percentile(samples_ms, 95),
+        "p99": percentile(samples_ms, 99),
+        "max": max(samples_ms),
+        "mean": statistics.mean(samples_ms),
+    }
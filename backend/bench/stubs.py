@@ -0,0 +1,188 @@
+# bench/stubs.py
+"""
+Local stand-ins for the upstream services, so benchmarks are reproducible and free:
+the Twitch token endpoint, IGDB's /v4 API (with configurable latency and IGDB-style
+429 rate limiting) and Gemini's generateContent. All three are served by one HTTP
+server; point the app at it with TWITCH_AUTH_URL, IGDB_API_URL and GEMINI_API_ENDPOINT.
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ADJECTIVES = ['Crimson', 'Silent', 'Eternal', 'Broken', 'Hollow', 'Golden', 'Frozen', 'Shadow', 'Iron', 'Lost',
+              'Neon', 'Savage', 'Ancient', 'Astral', 'Wild', 'Cursed', 'Hidden', 'Last', 'Steel', 'Fallen']
+NOUNS = ['Legend', 'Kingdom', 'Horizon', 'Frontier', 'Dungeon', 'Odyssey', 'Empire', 'Requiem', 'Protocol', 'Saga',
+         'Garden', 'Circuit', 'Tides', 'Citadel', 'Knight', 'Engine', 'Harvest', 'Voyage', 'Rift', 'Crown']
+SUFFIXES = ['', '', '', ' II', ' III', ' Remastered', ' Origins', ' Zero', ' Reborn', ' Chronicles']
+GENRES = ['Role-playing (RPG)', 'Shooter', 'Platform', 'Puzzle', 'Strategy', 'Adventure', 'Racing', 'Sport',
+          'Fighting', 'Simulator', 'Indie', 'Tactical', 'Hack and slash/Beat \'em up', 'Visual Novel']
+PLATFORMS = ['PC (Microsoft Windows)', 'PlayStation 5', 'PlayStation 4', 'Xbox Series X|S', 'Xbox One',
+             'Nintendo Switch', 'Mac', 'Linux']
+
+
+def synthetic_catalog(size, seed=0):
+    """{id: IGDB-shaped game} for `size` games with plausible, searchable names."""
+    rng = random.Random(seed)
+    companies = [f'{rng.choice(ADJECTIVES)} {rng.choice(["Studios", "Games", "Interactive", "Works"])} {i}'
+                 for i in range(size // 10 + 1)]
+    catalog = {}
+    for game_id in range(1, size + 1):
+        name = f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}{rng.choice(SUFFIXES)}'
+        if game_id > len(ADJECTIVES) * len(NOUNS):
+            name = f'{name} {game_id}' # Keep names distinct enough to search for
+        catalog[game_id] = {
+            'id': game_id,
+            'name': name,
+            'cover': {'id': game_id, 'url': f'//images.igdb.com/igdb/image/upload/t_thumb/co{game_id:x}.jpg'},
+            'first_release_date': rng.randint(500_000_000, 1_750_000_000),
+            'summary': f'{name} is a synthetic game used for benchmarking.',
+            'genres': [{'id': GENRES.index(g) + 1, 'name': g} for g in rng.sample(GENRES, rng.randint(1, 3))],
+            'platforms': [{'id': PLATFORMS.index(p) + 1, 'name': p} for p in rng.sample(PLATFORMS, rng.randint(1, 4))],
+            'involved_companies': [
+                {'id': game_id * 2, 'company': {'id': 1, 'name': rng.choice(companies)}, 'developer': True, 'publisher': False},
+                {'id': game_id * 2 + 1, 'company': {'id': 2, 'name': rng.choice(companies)}, 'developer': False, 'publisher': True},
+            ],
+        }
+    return catalog
+
+
+class StubUpstreams:
+    """
+    Serves the stub APIs on 127.0.0.1 from a background thread.
+
+    IGDB requests take `igdb_latency` seconds (plus up to `igdb_jitter`), and more than
+    `igdb_rate` requests per second (IGDB allows 4) get a 429, as do a random
+    `igdb_429_rate` fraction of the rest. Gemini calls take `gemini_latency` seconds.
+    """
+
+    def __init__(self, catalog, igdb_latency=0.08, igdb_jitter=0.04, igdb_rate=4.0, igdb_429_rate=0.0,
+                 gemini_latency=1.5, seed=0):
+        self.catalog = catalog
+        self.igdb_latency = igdb_latency
+        self.igdb_jitter = igdb_jitter
+        self.igdb_rate = igdb_rate
+        self.igdb_429_rate = igdb_429_rate
+        self.gemini_latency = gemini_latency
+        self.requests = Counter() # (service, status) -> count
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens = igdb_rate
+        self._updated = time.monotonic()
+        self._names = [(game_id, game['name'].lower()) for game_id, game in catalog.items()]
+        self.server = None
+
+    # --- Lifecycle ---
+    def start(self):
+        stubs = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # Keep-alive, like the real APIs
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+                status, payload = stubs.handle(self.path, body)
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                if status == 429:
+                    self.send_header('Retry-After', '1')
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server.server_port}'
+
+    def app_environment(self):
+        """Environment variables that point the app at these stubs."""
+        return {
+            'TWITCH_AUTH_URL': f'{self.base_url}/oauth2/token',
+            'IGDB_API_URL': f'{self.base_url}/v4',
+            'IGDB_CLIENT_ID': 'bench-client',
+            'IGDB_CLIENT_SECRET': 'bench-secret',
+            'GEMINI_API_ENDPOINT': self.base_url,
+            'GOOGLE_API_KEY': 'bench-key',
+        }
+
+    # --- Routing ---
+    def handle(self, path, body):
+        if path.startswith('/oauth2/token'):
+            status, payload = 200, {'access_token': 'bench-token', 'expires_in': 5_000_000, 'token_type': 'bearer'}
+            service = 'twitch'
+        elif path.startswith('/v4/'):
+            status, payload = self._igdb(path[len('/v4/'):].split('?')[0], body)
+            service = 'igdb'
+        elif ':generateContent' in path:
+            status, payload = self._gemini(body)
+            service = 'gemini'
+        else:
+            status, payload, service = 404, {'error': 'not found'}, 'unknown'
+        with self._lock:
+            self.requests[(service, status)] += 1
+        return status, payload
+
+    def _allow_igdb_request(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.igdb_rate, self._tokens + (now - self._updated) * self.igdb_rate)
+            self._updated = now
+            if self._tokens < 1 or self._rng.random() < self.igdb_429_rate:
+                return False
+            self._tokens -= 1
+            return True
+
+    def _igdb(self, endpoint, body):
+        if not self._allow_igdb_request():
+            return 429, {'message': 'Too Many Requests'}
+        time.sleep(self.igdb_latency + self._rng.random() * self.igdb_jitter)
+
+        if endpoint == 'multiquery':
+            results = []
+            for query_endpoint, name, query_body in re.findall(r'query (\w+) "((?:[^"\\]|\\.)*)" \{(.*?)\};', body, re.S):
+                results.append({'name': name.replace('\\"', '"'), 'result': self._igdb_query(query_endpoint, query_body)})
+            return 200, results
+        return 200, self._igdb_query(endpoint, body)
+
+    def _igdb_query(self, endpoint, body):
+        if endpoint != 'games':
+            return []
+        limit = int((re.search(r'limit (\d+)', body) or [0, 10])[1])
+        ids = re.search(r'where id = \(([\d,\s]+)\)', body)
+        if ids:
+            return [self.catalog[int(i)] for i in ids.group(1).split(',') if int(i) in self.catalog][:limit]
+        search = re.search(r'search "((?:[^"\\]|\\.)*)"', body)
+        if search:
+            words = search.group(1).replace('\\"', '"').lower().split()
+            matches = [game_id for game_id, name in self._names if all(word in name for word in words)]
+            return [self.catalog[game_id] for game_id in matches[:limit]]
+        return []
+
+    def _gemini(self, body):
+        time.sleep(self.gemini_latency)
+        prompt = json.loads(body)['contents'][0]['parts'][0]['text']
+        rng = random.Random(hashlib.sha256(prompt.encode('utf-8')).hexdigest())
+        picks = rng.sample(list(self.catalog.values()), 3)
+        text = json.dumps([{'title': game['name'], 'reason': 'It plays a lot like your favourites.'} for game in picks])
+        return 200, {
+            'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}, 'finishReason': 'STOP', 'index': 0}],
+            'usageMetadata': {'promptTokenCount': len(prompt) // 4, 'candidatesTokenCount': len(text) // 4},
+        }
@@ -0,0 +1,249 @@
+# covers.py
+
+import hashlib
+import io
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+import requests
+from PIL import Image, UnidentifiedImageError
+
+from singleflight import SingleFlight
+
+IGDB_IMAGE_URL = 'https://images.igdb.com/igdb/image/upload/t_{size}/{image_id}.jpg'
+
+# Variant name -> bounding box in pixels (the aspect ratio is kept, images are never upscaled).
+# thumb and card match IGDB's cover_small and cover_big.
+COVER_VARIANTS = {
+    'thumb': (90, 128),
+    'card': (264, 374),
+    'large': (600, 850),
+}
+
+IMAGE_ID_PATTERN = re.compile(r'^[a-z0-9]{1,64}$')
+_IGDB_IMAGE_URL_PATTERN = re.compile(r'/t_\w+/([a-z0-9]+)\.(?:jpg|jpeg|png|webp)$')
+
+
+class CoverNotFound(Exception):
+    """The image id doesn't exist upstream."""
+
+
+class CoverError(Exception):
+    """The upstream image could not be fetched or decoded."""
+
+
+def igdb_image_id(url):
+    """'//images.igdb.com/igdb/image/upload/t_thumb/co1wyy.jpg' -> 'co1wyy' (None for other URLs)."""
+    match = _IGDB_IMAGE_URL_PATTERN.search(url or '')
+    return match.group(1) if match else None
+
+
+def proxy_cover_urls(game, base_url, default='card'):
+    """Point a game's cover at the proxy's variants (in place); cover.url becomes the `default` variant."""
+    cover = game.get('cover')
+    if isinstance(cover, dict):
+        image_id = cover.get('image_id') or igdb_image_id(cover.get('url'))
+        if image_id:
+            cover['image_id'] = image_id
+            cover['variants'] = {name: f'{base_url}/{image_id}/{name}.webp' for name in COVER_VARIANTS}
+            cover['url'] = cover['variants'][default]
+    return game
+
+
+def _write_atomically(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class CoverCache:
+    """
+    Cover images on disk, content-addressed: objects/<sha256 of the source image>/ holds
+    every variant as WebP, generated together on the first request, and ids/<image id>
+    records which object an IGDB image id resolved to (the same picture under two ids is
+    stored once). When the objects take more than `max_bytes`, the least recently served
+    ones are deleted along with the ids/ entries pointing at them. Each process tracks
+    recency itself (seeded from directory mtimes), so with several workers the bound holds
+    per process.
+    """
+
+    def __init__(self, directory, max_bytes, source_url=IGDB_IMAGE_URL, source_size='720p', quality=80,
+                 timeout=(3.05, 10), session=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.source_url = source_url
+        self.source_size = source_size
+        self.quality = quality
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.flight = SingleFlight(timeout=sum(timeout) + 30)
+        self._objects = OrderedDict() # digest -> bytes on disk, least recently served first
+        self._ids = {} # digest -> image ids resolving to it
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(os.path.join(directory, 'ids'), exist_ok=True)
+        os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+        self._load_index()
+
+    def _object_dir(self, digest):
+        return os.path.join(self.directory, 'objects', digest)
+
+    def _id_path(self, image_id):
+        return os.path.join(self.directory, 'ids', image_id)
+
+    def _load_index(self):
+        objects = []
+        with os.scandir(os.path.join(self.directory, 'objects')) as entries:
+            for entry in entries:
+                if entry.is_dir() and not entry.name.startswith('.'):
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+                    objects.append((entry.stat().st_mtime, entry.name, size))
+        for _, digest, size in sorted(objects):
+            self._objects[digest] = size
+            self._bytes += size
+
+        with os.scandir(os.path.join(self.directory, 'ids')) as entries:
+            image_ids = [entry.name for entry in entries if entry.is_file() and not entry.name.startswith('.')]
+        for image_id in image_ids:
+            digest = self._resolve(image_id)
+            if digest in self._objects:
+                self._ids.setdefault(digest, set()).add(image_id)
+            elif digest:
+                self._unlink_id(image_id, digest) # Left behind by an interrupted eviction
+
+    # --- Lookups ---
+    def get(self, image_id, variant):
+        """
+        Return (digest, path) of a variant, fetching the source image and generating every
+        variant on a miss. Raises CoverNotFound, or CoverError if the source is unusable.
+        """
+        digest = self._resolve(image_id)
+        path = os.path.join(self._object_dir(digest), f'{variant}.webp') if digest else None
+        if path and os.path.exists(path):
+            self._touch(digest)
+            with self._lock:
+                self.hits += 1
+            return digest, path
+
+        # Concurrent requests for a cover that isn't cached share one fetch
+        digest = self.flight.do(image_id, lambda: self._fetch_and_store(image_id))
+        with self._lock:
+            self.misses += 1
+        return digest, os.path.join(self._object_dir(digest), f'{variant}.webp')
+
+    def _resolve(self, image_id):
+        try:
+            with open(self._id_path(image_id), encoding='ascii') as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def _touch(self, digest):
+        with self._lock:
+            if digest in self._objects:
+                self._objects.move_to_end(digest)
+        try:
+            os.utime(self._object_dir(digest)) # Recency survives restarts
+        except FileNotFoundError:
+            pass
+
+    # --- Filling ---
+    def _fetch_and_store(self, image_id):
+        url = self.source_url.format(size=self.source_size, image_id=image_id)
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            raise CoverError(f"Could not fetch cover {image_id}: {e}") from e
+        if response.status_code == 404:
+            raise CoverNotFound(image_id)
+        if not response.ok:
+            raise CoverError(f"Could not fetch cover {image_id}: HTTP {response.status_code}")
+
+        digest = hashlib.sha256(response.content).hexdigest()
+        object_dir = self._object_dir(digest)
+        if not os.path.isdir(object_dir):
+            variants = self.render_variants(response.content)
+            staging = tempfile.mkdtemp(dir=os.path.join(self.directory, 'objects'), prefix='.tmp-')
+            for name, data in variants.items():
+                with open(os.path.join(staging, f'{name}.webp'), 'wb') as f:
+                    f.write(data)
+            try:
+                os.rename(staging, object_dir)
+            except OSError: # Another process stored the same image meanwhile
+                shutil.rmtree(staging, ignore_errors=True)
+        _write_atomically(self._id_path(image_id), digest.encode('ascii'))
+
+        size = sum(f.stat().st_size for f in os.scandir(object_dir))
+        with self._lock:
+            self._bytes += size - self._objects.pop(digest, 0)
+            self._objects[digest] = size
+            self._ids.setdefault(digest, set()).add(image_id)
+        self._evict()
+        return digest
+
+    def render_variants(self, data):
+        """{variant name: WebP bytes} for a source image."""
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image.load()
+                source = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+            raise CoverError(f"Unreadable cover image: {e}") from e
+
+        variants = {}
+        for name, box in COVER_VARIANTS.items():
+            variant = source.copy()
+            variant.thumbnail(box, Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            variant.save(buffer, 'WEBP', quality=self.quality, method=4)
+            variants[name] = buffer.getvalue()
+        return variants
+
+    def _evict(self):
+        while True:
+            with self._lock:
+                # Never evict the object just stored, however small the bound
+                if self._bytes <= self.max_bytes or len(self._objects) <= 1:
+                    return
+                digest, size = self._objects.popitem(last=False)
+                image_ids = self._ids.pop(digest, ())
+                self._bytes -= size
+                self.evictions += 1
+            # Drop the ids/ entries first: a lookup racing this then misses and re-fetches
+            # instead of resolving to a directory that is about to disappear
+            for image_id in image_ids:
+                self._unlink_id(image_id, digest)
+            shutil.rmtree(self._object_dir(digest), ignore_errors=True)
+
+    def _unlink_id(self, image_id, digest):
+        # Another process may have re-pointed the id at a different object meanwhile
+        if self._resolve(image_id) == digest:
+            try:
+                os.unlink(self._id_path(image_id))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._objects),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
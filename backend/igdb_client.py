@@ -0,0 +1,197 @@
+# igdb_client.py
+
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from igdb_scheduler import SchedulerTimeout
+from metrics import REGISTRY, span
+from singleflight import SingleFlight, SingleFlightTimeout
+
+IGDB_API_URL = 'https://api.igdb.com/v4'
+TWITCH_AUTH_URL = 'https://id.twitch.tv/oauth2/token'
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# IGDB accepts at most this many named queries per /v4/multiquery request
+MULTIQUERY_MAX_QUERIES = 10
+
+IGDB_RESPONSES = REGISTRY.counter('gameup_igdb_responses_total', 'IGDB API responses by status code.', ('status',))
+
+
+class IGDBAuthError(requests.exceptions.RequestException):
+    """Raised when we could not obtain an IGDB access token."""
+
+
+class IGDBRateLimited(requests.exceptions.RequestException):
+    """Raised when a request waited too long for a slot under IGDB's rate limit."""
+
+
+def escape_query_string(text):
+    """Escape text for use inside a double-quoted Apicalypse string."""
+    return text.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def upgrade_cover_url(game, size='t_cover_big'):
+    """IGDB returns tiny 't_thumb' cover URLs; swap in a larger image size (in place)."""
+    cover = game.get('cover')
+    if isinstance(cover, dict) and 'url' in cover:
+        cover['url'] = cover['url'].replace('t_thumb', size)
+    return game
+
+
+class IGDBClient:
+    """
+    A shared IGDB API client. Reuses pooled keep-alive connections, applies
+    connect/read timeouts, retries 429/5xx responses with exponential backoff
+    and refreshes the Twitch app token once (for all threads) ahead of expiry.
+    With a `scheduler` (a TokenBucketScheduler), every request attempt first waits
+    for a slot, so the process as a whole stays under IGDB's rate limit.
+    """
+
+    def __init__(self, client_id, client_secret, api_url=IGDB_API_URL, auth_url=TWITCH_AUTH_URL,
+                 connect_timeout=3.05, read_timeout=10, max_retries=3, backoff_factor=0.5,
+                 pool_size=10, refresh_margin=300, scheduler=None):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.api_url = api_url.rstrip('/')
+        self.auth_url = auth_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.refresh_margin = timedelta(seconds=refresh_margin)
+        self.scheduler = scheduler
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._token = None
+        self._token_expires_at = datetime.now(timezone.utc)
+        self.token_flight = SingleFlight()
+
+    # --- Token management ---
+    def _token_is_fresh(self):
+        return self._token and self._token_expires_at > datetime.now(timezone.utc) + self.refresh_margin
+
+    def get_token(self, force_refresh=False):
+        """Return a valid access token, refreshing it if it is about to expire."""
+        if not force_refresh and self._token_is_fresh():
+            return self._token
+
+        # Concurrent refreshes share one Twitch call, and its failure is raised to every
+        # waiting thread instead of each of them retrying it in turn
+        stale_token = self._token
+        try:
+            return self.token_flight.do(
+                'token', lambda: self._refresh_token(force_refresh, stale_token), timeout=sum(self.timeout)
+            )
+        except SingleFlightTimeout as e:
+            raise IGDBAuthError(f"Could not obtain IGDB token: {e}") from e
+
+    def _refresh_token(self, force_refresh, stale_token):
+        # Another thread may have refreshed the token since we checked
+        if self._token_is_fresh() and not (force_refresh and self._token == stale_token):
+            return self._token
+
+        try:
+            with span('twitch'):
+                response = self.session.post(
+                    self.auth_url,
+                    params={
+                        'client_id': self.client_id,
+                        'client_secret': self.client_secret,
+                        'grant_type': 'client_credentials'
+                    },
+                    timeout=self.timeout
+                )
+            response.raise_for_status()
+            data = response.json()
+        except requests.exceptions.RequestException as e:
+            print(f"Error getting IGDB token: {e}")
+            raise IGDBAuthError(f"Could not obtain IGDB token: {e}") from e
+
+        self._token = data['access_token']
+        self._token_expires_at = datetime.now(timezone.utc) + timedelta(seconds=data['expires_in'])
+        print("Successfully obtained new IGDB token.")
+        return self._token
+
+    # --- Requests ---
+    def _backoff(self, attempt, response=None):
+        """Sleep before the next retry, honouring Retry-After when IGDB sends one."""
+        delay = self.backoff_factor * (2 ** attempt)
+        if response is not None and response.headers.get('Retry-After'):
+            try:
+                delay = max(delay, float(response.headers['Retry-After']))
+            except ValueError:
+                pass
+        time.sleep(delay + random.uniform(0, self.backoff_factor / 2))
+
+    def post(self, endpoint, body):
+        """POST an Apicalypse query to an IGDB endpoint and return the raw response."""
+        url = f'{self.api_url}/{endpoint}'
+        refreshed = False
+        attempt = 0
+        while True:
+            headers = {'Client-ID': self.client_id, 'Authorization': f'Bearer {self.get_token()}'}
+            if self.scheduler is not None:
+                try:
+                    with span('igdb-queue'):
+                        self.scheduler.acquire()
+                except SchedulerTimeout as e:
+                    raise IGDBRateLimited(str(e)) from e
+            try:
+                with span('igdb'):
+                    response = self.session.post(url, headers=headers, data=body, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                IGDB_RESPONSES.inc(status='error')
+                if attempt >= self.max_retries:
+                    raise
+                self._backoff(attempt)
+                attempt += 1
+                continue
+
+            IGDB_RESPONSES.inc(status=response.status_code)
+
+            # The token was revoked or expired early: refresh it once and try again
+            if response.status_code == 401 and not refreshed:
+                self.get_token(force_refresh=True)
+                refreshed = True
+                continue
+
+            if response.status_code in RETRYABLE_STATUS_CODES and attempt < self.max_retries:
+                if response.status_code == 429 and self.scheduler is not None:
+                    # We are over the limit after all (another process sharing the
+                    # credentials?): hold everyone back, not just this request
+                    self.scheduler.pause(self.backoff_factor * (2 ** attempt))
+                self._backoff(attempt, response)
+                attempt += 1
+                continue
+
+            response.raise_for_status()
+            return response
+
+    def query(self, endpoint, body):
+        """Run an Apicalypse query and return the decoded JSON list."""
+        return self.post(endpoint, body).json()
+
+    def multiquery(self, queries):
+        """
+        Run several named queries through /v4/multiquery, in as few requests as IGDB allows.
+        `queries` is a list of (name, endpoint, body) tuples; returns {name: result list}.
+        """
+        results = {}
+        for i in range(0, len(queries), MULTIQUERY_MAX_QUERIES):
+            chunk = queries[i:i + MULTIQUERY_MAX_QUERIES]
+            body = ''.join(
+                f'query {endpoint} "{escape_query_string(name)}" {{ {query_body} }};'
+                for name, endpoint, query_body in chunk
+            )
+            for entry in self.query('multiquery', body):
+                results[entry['name']] = entry.get('result', [])
+        return results
@@ -0,0 +1,235 @@
+# igdb_scheduler.py
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+# Request priorities, most urgent first
+PRIORITY_INTERACTIVE = 0 # A user is waiting on this (search, game details)
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2 # Jobs, syncs, warm-ups
+
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_NORMAL: 'normal', PRIORITY_BACKGROUND: 'background'}
+
+# The priority IGDB calls made in the current context are scheduled with
+current_priority = contextvars.ContextVar('igdb_priority', default=PRIORITY_NORMAL)
+
+
+@contextmanager
+def priority(level):
+    """Schedule IGDB calls made inside the block at the given priority."""
+    token = current_priority.set(level)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class SchedulerTimeout(TimeoutError):
+    """Raised when a request could not be given a slot within its wait limit."""
+
+
+class TokenBucketScheduler:
+    """
+    Hands out request slots at `rate` per second (with bursts of up to `burst`), to the
+    most urgent waiter first and in arrival order within a priority.
+    """
+
+    def __init__(self, rate=4.0, burst=4, max_wait=10.0):
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters = [] # heap of (priority, sequence)
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self.granted = {level: 0 for level in PRIORITY_NAMES}
+        self.wait_seconds = {level: 0.0 for level in PRIORITY_NAMES}
+        self.timeouts = 0
+
+    def _refill(self, now):
+        start = max(self._updated, self._paused_until)
+        if now > start:
+            self._tokens = min(self.burst, self._tokens + (now - start) * self.rate)
+        self._updated = max(now, self._updated)
+
+    def _enqueue(self, level, timeout):
+        level = current_priority.get() if level is None else level
+        timeout = self.max_wait if timeout is None else timeout
+        entry = (level, next(self._sequence))
+        heapq.heappush(self._waiters, entry)
+        return entry, timeout
+
+    def _try_acquire(self, entry, started, deadline, timeout):
+        """
+        One scheduling step for a queued caller (with the lock held). Returns (True, waited)
+        once it has a slot, else (False, seconds to wait before trying again, or None to
+        wait for a notification). Raises SchedulerTimeout past the deadline.
+        """
+        now = time.monotonic()
+        self._refill(now)
+        at_head = self._waiters[0] == entry
+        if at_head and self._tokens >= 1 and now >= self._paused_until:
+            heapq.heappop(self._waiters)
+            self._tokens -= 1
+            level = entry[0]
+            self.granted[level] = self.granted.get(level, 0) + 1
+            self.wait_seconds[level] = self.wait_seconds.get(level, 0.0) + (now - started)
+            self._cond.notify_all() # The next waiter is now at the head
+            return True, now - started
+
+        if deadline is not None and now >= deadline:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+            self.timeouts += 1
+            self._cond.notify_all()
+            raise SchedulerTimeout(f"No IGDB request slot within {timeout}s")
+
+        # The head sleeps until the next token; everyone else until the head moves on
+        wait = None
+        if at_head:
+            wait = max(self._paused_until - now, (1 - self._tokens) / self.rate, 0.001)
+        if deadline is not None:
+            wait = deadline - now if wait is None else min(wait, deadline - now)
+        return False, wait
+
+    def acquire(self, level=None, timeout=None):
+        """Block until a slot is available for this caller; returns the seconds spent waiting."""
+        started = time.monotonic()
+        with self._cond:
+            entry, timeout = self._enqueue(level, timeout)
+            deadline = started + timeout if timeout is not None else None
+            while True:
+                granted, wait = self._try_acquire(entry, started, deadline, timeout)
+                if granted:
+                    return wait
+                self._cond.wait(wait)
+
+    async def acquire_async(self, level=None, timeout=None, poll=0.02):
+        """
+        acquire() for coroutines: waits with asyncio.sleep instead of blocking the event
+        loop. Coroutines can't be woken by the condition, so non-head waiters poll.
+        """
+        started = time.monotonic()
+        with self._cond:
+            entry, timeout = self._enqueue(level, timeout)
+        deadline = started + timeout if timeout is not None else None
+        try:
+            while True:
+                with self._cond:
+                    granted, wait = self._try_acquire(entry, started, deadline, timeout)
+                if granted:
+                    return wait
+                await asyncio.sleep(poll if wait is None else min(wait, poll))
+        except asyncio.CancelledError:
+            with self._cond:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._cond.notify_all()
+            raise
+
+    def pause(self, seconds):
+        """Hold every request for `seconds` (e.g. after IGDB answers 429 with Retry-After)."""
+        with self._cond:
+            self._refill(time.monotonic())
+            self._tokens = 0.0
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "rate": self.rate,
+                "queued": len(self._waiters),
+                "granted": {PRIORITY_NAMES.get(k, k): v for k, v in self.granted.items()},
+                "wait_seconds": {PRIORITY_NAMES.get(k, k): round(v, 3) for k, v in self.wait_seconds.items()},
+                "timeouts": self.timeouts,
+            }
+
+
+class BatchLoader:
+    """
+    Dataloader-style micro-batching: keys requested by concurrent callers within `window`
+    seconds are loaded with one batch_fn(keys) call, which returns {key: value}, and each
+    caller gets back just its own keys. Keys already being loaded are shared, not reloaded.
+    The batch runs at the most urgent priority among the callers that joined it.
+    """
+
+    def __init__(self, batch_fn, window=0.005):
+        self.batch_fn = batch_fn
+        self.window = window
+        self._pending = {} # key -> Future, waiting for the current window to close
+        self._in_flight = {} # key -> Future, being loaded
+        self._priority = None
+        self._collecting = False
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.keys_loaded = 0
+        self.keys_shared = 0
+
+    def load_many(self, keys, timeout=None):
+        """Return {key: value} for the keys batch_fn found; raises what batch_fn raised."""
+        futures = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                future = self._in_flight.get(key) or self._pending.get(key)
+                if future is not None:
+                    self.keys_shared += 1
+                else:
+                    future = self._pending[key] = Future()
+                futures[key] = future
+            level = current_priority.get()
+            self._priority = level if self._priority is None else min(self._priority, level)
+            leader = not self._collecting and bool(self._pending)
+            if leader:
+                self._collecting = True
+
+        if leader:
+            time.sleep(self.window) # Let concurrent callers add their keys
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                batch_priority, self._priority = self._priority, None
+                self._collecting = False
+                self._in_flight.update(batch)
+            self._load(batch, batch_priority)
+
+        results = {}
+        for key, future in futures.items():
+            value = future.result(timeout)
+            if value is not None:
+                results[key] = value
+        return results
+
+    def _load(self, batch, batch_priority):
+        try:
+            with priority(batch_priority):
+                values = self.batch_fn(list(batch))
+        except BaseException as e:
+            for future in batch.values():
+                future.set_exception(e)
+        else:
+            for key, future in batch.items():
+                future.set_result(values.get(key))
+        finally:
+            with self._lock:
+                for key in batch:
+                    self._in_flight.pop(key, None)
+                self.batches += 1
+                self.keys_loaded += len(batch)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "keys_loaded": self.keys_loaded,
+                "keys_shared": self.keys_shared,
+                "avg_batch_size": (self.keys_loaded / self.batches) if self.batches else 0.0,
+            }
@@ -0,0 +1,125 @@
+# jobs.py
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    """A unit of background work whose progress is published as a list of events."""
+
+    def __init__(self, key, owner_id=None, on_change=None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.owner_id = owner_id
+        self.status = 'queued' # queued -> running -> done | failed
+        self.events = [] # (event name, data) in publish order
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._on_change = on_change
+        self._cond = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def publish(self, event, data):
+        """Record an event and wake up anyone waiting on this job."""
+        with self._cond:
+            self.events.append((event, data))
+            self._cond.notify_all()
+        self._changed()
+
+    def _set_status(self, status, result=None, error=None):
+        with self._cond:
+            self.status = status
+            self.result = result
+            self.error = error
+            if self.finished:
+                self.finished_at = time.time()
+            self._cond.notify_all()
+        self._changed()
+
+    def _changed(self):
+        if self._on_change is not None:
+            self._on_change(self)
+
+    def wait_for_events(self, start, timeout=None):
+        """
+        Block until there are events past index `start` or the job finishes.
+        Returns (new events, finished).
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.events) > start or self.finished, timeout=timeout)
+            return self.events[start:], self.finished
+
+    def to_dict(self):
+        with self._cond:
+            return {
+                "id": self.id,
+                "status": self.status,
+                "events": [{"event": event, "data": data} for event, data in self.events],
+                "result": self.result,
+                "error": self.error,
+            }
+
+
+class JobManager:
+    """
+    Runs jobs on a local thread pool. Submitting a job whose key matches one that is
+    still queued or running returns the existing job instead of starting a new one.
+    Finished jobs are kept for `retention` seconds so clients can collect the result.
+    `on_change(job)` is called on creation, on every status change and published event,
+    e.g. to persist the job where other processes can read it; it must not raise.
+    """
+
+    def __init__(self, max_workers=2, retention=600, thread_name_prefix='job', on_change=None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self._retention = retention
+        self._on_change = on_change
+        self._jobs = {} # job id -> Job
+        self._in_flight = {} # key -> Job
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, owner_id=None):
+        """Queue fn(job) unless an identical job is in flight. Returns (job, created)."""
+        with self._lock:
+            self._prune()
+            job = self._in_flight.get(key)
+            if job is not None:
+                return job, False
+
+            job = Job(key, owner_id=owner_id, on_change=self._on_change)
+            self._jobs[job.id] = job
+            self._in_flight[key] = job
+
+        job._changed() # Before the job can run, so its first state is 'queued'
+        self._executor.submit(self._run, job, fn)
+        return job, True
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, fn):
+        job._set_status('running')
+        try:
+            result = fn(job)
+        except Exception as e:
+            job._set_status('failed', error=str(e))
+        else:
+            job._set_status('done', result=result)
+        finally:
+            with self._lock:
+                if self._in_flight.get(job.key) is job:
+                    del self._in_flight[job.key]
+
+    def _prune(self):
+        cutoff = time.time() - self._retention
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,178 @@
+# metrics.py
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from a fast SQL query to a slow Gemini call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count, optionally split by labels."""
+
+    type = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {} # label values tuple -> count
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    """Observations counted into cumulative buckets, plus their sum and count."""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {} # label values tuple -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(entry)) for key, entry in self._values.items()]
+        for key, entry in values:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), entry):
+                cumulative += count
+                yield f'{self.name}_bucket', {**labels, 'le': _format_value(float(bound))}, cumulative
+            yield f'{self.name}_sum', labels, entry[-2]
+            yield f'{self.name}_count', labels, entry[-1]
+
+
+class Registry:
+    """
+    Metrics rendered in the Prometheus text format. Besides counters and histograms it
+    accepts collectors: callables returning (name, type, help, [(labels, value)]) tuples,
+    evaluated at scrape time for values other objects already track (cache stats etc.).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        for collector in self._collectors:
+            for name, metric_type, help, samples in collector():
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+SPAN_SECONDS = REGISTRY.histogram(
+    'gameup_span_duration_seconds',
+    'Time spent in instrumented operations (SQL queries, upstream calls, JWT decoding, hashing).',
+    ('span',)
+)
+
+
+class RequestSpans:
+    """Per-request totals of every span, for the Server-Timing header."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.totals = {} # span name -> [seconds, count], in first-seen order
+        self._lock = threading.Lock() # Pool threads may record spans for the same request
+
+    def add(self, name, seconds):
+        with self._lock:
+            total = self.totals.setdefault(name, [0.0, 0])
+            total[0] += seconds
+            total[1] += 1
+
+    def server_timing(self):
+        """Server-Timing entries: one per span name, plus the time so far as 'app'."""
+        with self._lock:
+            totals = list(self.totals.items())
+        entries = [f'{name};dur={seconds * 1000:.1f};desc="{count}x"' for name, (seconds, count) in totals]
+        entries.append(f'app;dur={(time.perf_counter() - self.started) * 1000:.1f}')
+        return ', '.join(entries)
+
+
+# The spans of the request being handled in this context (None outside requests)
+current_spans = contextvars.ContextVar('request_spans', default=None)
+
+
+def record_span(name, seconds):
+    SPAN_SECONDS.observe(seconds, span=name)
+    spans = current_spans.get()
+    if spans is not None:
+        spans.add(name, seconds)
+
+
+@contextmanager
+def span(name):
+    """Time the block into the span histogram and the current request's Server-Timing."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - started)
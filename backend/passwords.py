@@ -0,0 +1,88 @@
+# passwords.py
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+from metrics import span
+
+
+class HasherOverloaded(Exception):
+    """Raised when too many hashing jobs are already queued; callers should answer 503."""
+
+
+# Module-level so they can be pickled and run in the worker processes
+def _hash_password(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check_password(password_hash, password):
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    except ValueError: # Malformed hash
+        return False
+
+
+def hash_rounds(password_hash):
+    """The work factor a bcrypt hash was created with ('$2b$12$...' -> 12)."""
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated process pool so CPU-bound hashing never stalls request
+    threads. At most `workers + max_pending` hashing jobs may be in the system at once;
+    beyond that, callers wait up to `wait_timeout` seconds and then get HasherOverloaded.
+    With workers=0, hashing runs inline on the calling thread.
+    """
+
+    def __init__(self, rounds=12, workers=2, max_pending=16, wait_timeout=0.5):
+        self.rounds = rounds
+        self.workers = workers
+        self.wait_timeout = wait_timeout
+        self._slots = threading.BoundedSemaphore(workers + max_pending) if workers else None
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self):
+        # Created lazily so importing the app (e.g. in gunicorn's master) doesn't start processes.
+        # 'spawn' avoids forking a multi-threaded web worker.
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('spawn')
+                    )
+        return self._executor
+
+    def _run(self, fn, *args):
+        with span('bcrypt'): # Includes time spent queueing for a worker
+            if not self.workers:
+                return fn(*args)
+
+            if not self._slots.acquire(timeout=self.wait_timeout):
+                raise HasherOverloaded()
+            try:
+                return self._get_executor().submit(fn, *args).result()
+            finally:
+                self._slots.release()
+
+    def hash(self, password):
+        return self._run(_hash_password, password, self.rounds)
+
+    def check(self, password_hash, password):
+        return self._run(_check_password, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True if the hash was made with a different work factor than the configured one."""
+        return hash_rounds(password_hash) != self.rounds
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
@@ -0,0 +1,72 @@
+# profiler.py
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class SamplingProfiler:
+    """
+    A low-overhead wall-clock profiler for individual request threads. While at least
+    one thread is being profiled, a background thread records each one's Python stack
+    every `interval` seconds. Stopping returns a Counter of stacks (outermost frame
+    first), which can be written out in the 'folded' format flame graph tools read.
+    """
+
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._active = {} # thread id -> Counter of stacks
+        self._lock = threading.Lock()
+        self._sampler = None
+
+    def start(self, thread_id=None):
+        thread_id = threading.get_ident() if thread_id is None else thread_id
+        with self._lock:
+            self._active[thread_id] = Counter()
+            if self._sampler is None or not self._sampler.is_alive():
+                self._sampler = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self._sampler.start()
+        return thread_id
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._active.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._sampler = None
+                    return
+                frames = sys._current_frames()
+                for thread_id, stacks in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[self._stack(frame)] += 1
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+            frame = frame.f_back
+        return tuple(reversed(stack))
+
+
+def folded(stacks):
+    """Render stack counts as 'frame;frame;frame count' lines (Brendan Gregg's folded format)."""
+    return '\n'.join(f"{';'.join(stack)} {count}" for stack, count in stacks.most_common()) + '\n'
+
+
+def top_frames(stacks, n=5):
+    """The n innermost frames that were sampled most often, as (frame, share of samples)."""
+    total = sum(stacks.values())
+    leaves = Counter()
+    for stack, count in stacks.items():
+        if stack:
+            leaves[stack[-1]] += count
+    return [(frame, count / total) for frame, count in leaves.most_common(n)] if total else []
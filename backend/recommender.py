@@ -0,0 +1,147 @@
+# recommender.py
+
+from collections import Counter
+from datetime import datetime, timezone
+
+import numpy as np
+
+# How much each kind of feature counts towards similarity
+FEATURE_WEIGHTS = {
+    'genre': 1.0,
+    'developer': 0.8,
+    'era': 0.5,
+    'publisher': 0.4,
+    'platform': 0.3,
+}
+
+# Release eras, as the first year of each bucket
+ERA_STARTS = (1990, 2000, 2005, 2010, 2015, 2020)
+
+
+def release_era(timestamp):
+    """Bucket a unix release timestamp into an era label."""
+    year = datetime.fromtimestamp(timestamp, tz=timezone.utc).year
+    era = 'pre-1990'
+    for start in ERA_STARTS:
+        if year >= start:
+            era = str(start)
+    return era
+
+
+def game_features(game):
+    """
+    The (kind, value) features of a game, built from the fields the detail endpoint
+    already requests: genres, platforms, developers, publishers and release date.
+    """
+    features = set()
+    for genre in game.get('genres', []):
+        features.add(('genre', genre['name']))
+    for platform in game.get('platforms', []):
+        features.add(('platform', platform['name']))
+    for developer in game.get('developers', []):
+        features.add(('developer', developer))
+    for publisher in game.get('publishers', []):
+        features.add(('publisher', publisher))
+    if game.get('first_release_date') is not None:
+        features.add(('era', release_era(game['first_release_date'])))
+    return features
+
+
+class ContentRecommender:
+    """
+    Content-based recommender over a fixed candidate set. Each candidate becomes a
+    weighted, L2-normalised feature vector; a user's profile is the normalised sum of
+    their completed games' vectors, and every candidate is scored at once by cosine
+    similarity. Candidate vectors are very sparse (a handful of features out of
+    thousands of companies), so the candidate matrix is kept in CSR form.
+    """
+
+    def __init__(self, games):
+        games = [game for game in games if game_features(game)]
+        self.games = games
+        self.ids = np.array([game['id'] for game in games], dtype=np.int64)
+        self._row_of = {game['id']: row for row, game in enumerate(games)}
+
+        vocabulary = sorted({feature for game in games for feature in game_features(game)})
+        self._column_of = {feature: column for column, feature in enumerate(vocabulary)}
+        self.vocabulary = vocabulary
+
+        # CSR matrix: row i's columns are indices[indptr[i]:indptr[i + 1]], with matching data
+        rows = [sorted((self._column_of[f], FEATURE_WEIGHTS[f[0]]) for f in game_features(game)) for game in games]
+        self.indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        self.indptr[1:] = np.cumsum([len(row) for row in rows])
+        self.indices = np.array([column for row in rows for column, _ in row], dtype=np.int32)
+        self.data = np.array([weight for row in rows for _, weight in row], dtype=np.float32)
+
+        # L2-normalise every row in one pass
+        row_norms = np.sqrt(np.add.reduceat(self.data ** 2, self.indptr[:-1])) if len(rows) else np.zeros(0)
+        self.data /= np.repeat(row_norms, np.diff(self.indptr)).astype(np.float32)
+
+    def __len__(self):
+        return len(self.games)
+
+    def vectorize(self, game):
+        """Weighted, normalised dense vector for any game; features outside the vocabulary are ignored."""
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for feature in game_features(game):
+            column = self._column_of.get(feature)
+            if column is not None:
+                vector[column] = FEATURE_WEIGHTS[feature[0]]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def scores(self, profile):
+        """Cosine similarity of every candidate against a normalised profile vector."""
+        return np.add.reduceat(self.data * profile[self.indices], self.indptr[:-1])
+
+    def recommend(self, completed_games, k=3, exclude_ids=()):
+        """
+        Return up to k (game, score, reason) tuples, best first, excluding the completed games
+        and any ids in `exclude_ids` (e.g. the rest of the user's library).
+        Returns an empty list when nothing in the candidate set overlaps the user's taste.
+        """
+        if not self.games or not completed_games:
+            return []
+
+        completed_vectors = np.stack([self.vectorize(game) for game in completed_games])
+        profile = completed_vectors.sum(axis=0)
+        norm = np.linalg.norm(profile)
+        if not norm:
+            return []
+        profile /= norm
+
+        scores = self.scores(profile)
+        excluded = {game['id'] for game in completed_games} | set(exclude_ids)
+        excluded_rows = [self._row_of[game_id] for game_id in excluded if game_id in self._row_of]
+        scores[excluded_rows] = -np.inf
+
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for row in top:
+            if scores[row] <= 0:
+                break
+            game = self.games[row]
+            # Explain the pick with the completed game it is closest to
+            start, end = self.indptr[row], self.indptr[row + 1]
+            similarity = completed_vectors[:, self.indices[start:end]] @ self.data[start:end]
+            closest = completed_games[int(np.argmax(similarity))]
+            results.append((game, float(scores[row]), self._reason(game, closest)))
+        return results
+
+    @staticmethod
+    def _reason(game, completed_game):
+        shared = game_features(game) & game_features(completed_game)
+        by_kind = Counter()
+        highlights = []
+        for kind, value in sorted(shared, key=lambda f: -FEATURE_WEIGHTS[f[0]]):
+            if kind in ('genre', 'developer') and by_kind[kind] < 2:
+                highlights.append(value)
+                by_kind[kind] += 1
+        if highlights:
+            return f"Because you completed {completed_game.get('name')}: it shares {', '.join(highlights)}."
+        return f"Similar in style and era to {completed_game.get('name')}, which you completed."
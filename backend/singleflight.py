@@ -0,0 +1,124 @@
+# singleflight.py
+
+import asyncio
+import threading
+
+
+class SingleFlightTimeout(TimeoutError):
+    """Raised to a caller that gave up waiting on another caller's in-flight call."""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls that share a key into one: the first caller runs the
+    function, everyone arriving while it is in flight waits for and shares its result,
+    or gets its exception raised to them as well. Nothing is cached once the call returns.
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout # Default wait limit in seconds for joining callers (None = forever)
+        self._calls = {} # key -> _Call
+        self._lock = threading.Lock()
+        self.calls = 0 # Calls that actually ran
+        self.collapsed = 0 # Callers that shared another caller's call
+        self.errors = 0
+        self.timeouts = 0
+
+    def do(self, key, fn, timeout=None):
+        """Return fn(), sharing the in-flight call for `key` if there is one."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+                self.calls += 1
+            else:
+                leader = False
+                self.collapsed += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+                with self._lock:
+                    self.errors += 1
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            timeout = self.timeout if timeout is None else timeout
+            if not call.done.wait(timeout):
+                with self._lock:
+                    self.timeouts += 1
+                raise SingleFlightTimeout(f"Timed out after {timeout}s waiting for in-flight call {key!r}")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "calls": self.calls,
+                "collapsed": self.collapsed,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+            }
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines on one event loop: callers awaiting the same key share
+    one run of the coroutine function. A joining caller that gives up (or is cancelled)
+    doesn't cancel the call the others are waiting on.
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self._calls = {} # key -> asyncio.Future
+        self.calls = 0
+        self.collapsed = 0
+        self.errors = 0
+        self.timeouts = 0
+
+    async def do(self, key, fn, timeout=None):
+        """Return await fn(), sharing the in-flight call for `key` if there is one."""
+        future = self._calls.get(key)
+        if future is None:
+            self.calls += 1
+            future = self._calls[key] = asyncio.ensure_future(fn())
+            future.add_done_callback(lambda done: self._finish(key, done))
+            return await asyncio.shield(future)
+
+        self.collapsed += 1
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise SingleFlightTimeout(f"Timed out after {timeout}s waiting for in-flight call {key!r}") from None
+
+    def _finish(self, key, future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if not future.cancelled() and future.exception() is not None:
+            self.errors += 1
+
+    def stats(self):
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "collapsed": self.collapsed,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+        }
@@ -0,0 +1,32 @@
+# conftest.py
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+# app.py reads its configuration at import time, so point it at a throwaway database
+# (and cover cache) before any test imports it
+_TEST_DIR = tempfile.mkdtemp(prefix='gameup-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_TEST_DIR, 'gameup.db')
+os.environ['COVER_CACHE_DIR'] = os.path.join(_TEST_DIR, 'covers')
+os.environ.setdefault('SECRET_KEY', 'test-secret')
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture
+def app_context():
+    """An app context over empty tables (the catalog's FTS index included)."""
+    from app import app, db, search_cache, _catalog_available
+
+    with app.app_context():
+        db.session.execute(db.text("DROP TABLE IF EXISTS catalog_game_fts"))
+        db.drop_all()
+        db.create_all()
+        search_cache.clear()
+        _catalog_available.clear()
+        yield app
+        db.session.remove()
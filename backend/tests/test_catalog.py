@@ -0,0 +1,150 @@
+# test_catalog.py
+
+import copy
+import json
+import os
+
+import pytest
+
+from conftest import BACKEND_DIR
+
+SAMPLE_DUMP = os.path.join(BACKEND_DIR, 'fixtures', 'igdb_catalog_sample.json')
+
+
+@pytest.fixture
+def dump():
+    with open(SAMPLE_DUMP, encoding='utf-8') as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def catalog(app_context, dump):
+    """The sample dump synced into an empty catalog."""
+    from app import sync_catalog
+    sync_catalog(dump=dump)
+    return dump
+
+
+def test_sync_stores_every_record(app_context, dump):
+    from app import db, sync_catalog, CatalogGame, CatalogSyncState
+
+    counts = sync_catalog(dump=dump)
+
+    assert counts == {endpoint: len(records) for endpoint, records in dump.items()}
+    assert CatalogGame.query.count() == len(dump['games'])
+    state = db.session.get(CatalogSyncState, 'games')
+    assert state.last_updated_at == max(game['updated_at'] for game in dump['games'])
+
+
+def test_sync_resumes_from_last_updated_at(catalog):
+    from app import db, sync_catalog, CatalogGame
+
+    # Nothing changed since the first sync, so nothing is stored again
+    assert sync_catalog(dump=catalog) == {endpoint: 0 for endpoint in catalog}
+
+    # Only records updated after the last sync are picked up
+    updated = copy.deepcopy(catalog)
+    game = next(game for game in updated['games'] if game['id'] == 1020)
+    game['name'] = 'Grand Theft Auto V: Enhanced'
+    game['updated_at'] = max(g['updated_at'] for g in updated['games']) + 100
+    counts = sync_catalog(dump=updated)
+
+    assert counts['games'] == 1
+    assert sum(counts.values()) == 1
+    assert db.session.get(CatalogGame, 1020).name == 'Grand Theft Auto V: Enhanced'
+
+
+def test_full_sync_ignores_the_resume_point(catalog):
+    from app import sync_catalog
+
+    assert sync_catalog(dump=catalog, full=True)['games'] == len(catalog['games'])
+
+
+def test_search_matches_prefixes(catalog):
+    from app import search_catalog
+
+    assert [game['name'] for game in search_catalog('eld')] == ['Elden Ring']
+    assert [game['name'] for game in search_catalog('GRAND')] == ['Grand Theft Auto V']
+    assert search_catalog('zelda') == []
+    assert search_catalog('  ') == []
+
+
+def test_search_requires_every_token(catalog):
+    from app import search_catalog
+
+    assert [game['name'] for game in search_catalog('wit wild')] == ['The Witcher 3: Wild Hunt']
+    assert search_catalog('witcher ring') == []
+
+
+def test_search_skips_non_main_games(catalog):
+    from app import search_catalog
+
+    # 'Blood and Wine' is an expansion (category 2)
+    assert search_catalog('blood') == []
+    assert [game['id'] for game in search_catalog('witcher')] == [1942]
+
+
+def test_search_returns_the_search_shape(catalog):
+    from app import search_catalog
+
+    [game] = search_catalog('witcher')
+    assert game['id'] == 1942
+    assert game['cover']['url'].endswith('/t_cover_big/coaarl.jpg')
+    assert game['first_release_date'] == 1431993600
+    assert game['summary']
+
+
+def _as_igdb_game(dump, game_id):
+    """The sample game as /v4/games returns it for IGDB_GAME_FIELDS."""
+    game = next(game for game in dump['games'] if game['id'] == game_id)
+    genres = {genre['id']: genre for genre in dump['genres']}
+    platforms = {platform['id']: platform for platform in dump['platforms']}
+    cover = next(cover for cover in dump['covers'] if cover['id'] == game['cover'])
+    return {
+        'id': game['id'],
+        'name': game['name'],
+        'cover': {'id': cover['id'], 'url': cover['url']},
+        'first_release_date': game['first_release_date'],
+        'summary': game['summary'],
+        'genres': [{'id': i, 'name': genres[i]['name']} for i in game['genres'] if i in genres],
+        'platforms': [{'id': i, 'name': platforms[i]['name']} for i in game['platforms'] if i in platforms],
+        'involved_companies': [{
+            'id': entry['id'],
+            'company': entry['company'],
+            'developer': entry['developer'],
+            'publisher': entry['publisher'],
+        } for entry in dump['involved_companies'] if entry['game'] == game_id],
+    }
+
+
+def _normalized(game):
+    game = dict(game)
+    for key in ('developers', 'publishers'):
+        game[key] = sorted(game[key])
+    for key in ('genres', 'platforms', 'involved_companies'):
+        game[key] = sorted(game[key], key=lambda entry: entry['id'])
+    return game
+
+
+def test_catalog_games_match_process_game(catalog):
+    from app import get_catalog_games, process_game
+
+    games = get_catalog_games([1942, 1020, 99999])
+
+    assert set(games) == {1942, 1020}
+    for game_id, game in games.items():
+        assert _normalized(game) == _normalized(process_game(_as_igdb_game(catalog, game_id)))
+    assert games[1942]['developers'] == ['CD Projekt RED']
+    assert games[1942]['publishers'] == ['CD Projekt']
+
+
+def test_catalog_is_used_only_after_a_complete_sync(app_context, dump):
+    from app import app, catalog_enabled, sync_catalog
+
+    assert app.config['CATALOG_MODE'] == 'auto'
+    # An interrupted first sync: games are stored, but covers and companies are not
+    sync_catalog(endpoints=['genres', 'platforms', 'games'], dump=dump)
+    assert not catalog_enabled()
+
+    sync_catalog(dump=dump)
+    assert catalog_enabled()
@@ -0,0 +1,135 @@
+# test_concurrency.py
+
+import threading
+import time
+
+import pytest
+
+from igdb_scheduler import (
+    BatchLoader, SchedulerTimeout, TokenBucketScheduler,
+    PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, current_priority, priority,
+)
+from singleflight import SingleFlight, SingleFlightTimeout
+
+
+def _start(target, *args):
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+def _wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for the other thread"
+        time.sleep(0.001)
+
+
+def test_singleflight_shares_the_leaders_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(2)
+        return 'details'
+
+    leader = _start(lambda: results.append(flight.do('game:1', fetch)))
+    _wait_until(lambda: calls)
+    follower = _start(lambda: results.append(flight.do('game:1', fetch)))
+    _wait_until(lambda: flight.stats()['collapsed'] == 1)
+    release.set()
+    leader.join(2)
+    follower.join(2)
+
+    assert results == ['details', 'details']
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "calls": 1, "collapsed": 1, "errors": 0, "timeouts": 0}
+    # Nothing is cached once the call has returned
+    assert flight.do('game:1', lambda: 'fresh') == 'fresh'
+
+
+def test_singleflight_shares_errors_and_times_out_followers():
+    flight = SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def fail():
+        release.wait(2)
+        raise RuntimeError("IGDB is down")
+
+    def call():
+        try:
+            flight.do('search:zelda', fail)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = _start(call)
+    _wait_until(lambda: flight.stats()['in_flight'] == 1)
+    with pytest.raises(SingleFlightTimeout):
+        flight.do('search:zelda', fail, timeout=0.01)
+    follower = _start(call)
+    _wait_until(lambda: flight.stats()['collapsed'] == 2)
+    release.set()
+    leader.join(2)
+    follower.join(2)
+
+    assert len(errors) == 2 and errors[0] is errors[1]
+    assert flight.stats()['errors'] == 1
+    assert flight.stats()['timeouts'] == 1
+
+
+def test_batch_loader_merges_concurrent_callers():
+    batches = []
+
+    def load(keys):
+        batches.append((sorted(keys), current_priority.get()))
+        return {key: key * 10 for key in keys if key != 3}
+
+    loader = BatchLoader(load, window=0.1)
+    results = {}
+
+    def background():
+        with priority(PRIORITY_BACKGROUND):
+            results['background'] = loader.load_many([1, 2])
+
+    first = _start(background)
+    _wait_until(lambda: loader._collecting)
+    with priority(PRIORITY_INTERACTIVE):
+        results['interactive'] = loader.load_many([2, 3], timeout=2)
+    first.join(2)
+
+    # One batch, at the most urgent caller's priority; missing keys are left out
+    assert batches == [([1, 2, 3], PRIORITY_INTERACTIVE)]
+    assert results == {'background': {1: 10, 2: 20}, 'interactive': {2: 20}}
+    assert loader.stats()['keys_shared'] == 1
+
+
+def test_scheduler_serves_the_most_urgent_waiter_first():
+    scheduler = TokenBucketScheduler(rate=5, burst=1, max_wait=2)
+    scheduler.acquire() # Use up the burst, so the next two callers queue
+    order = []
+
+    background = _start(lambda: (scheduler.acquire(PRIORITY_BACKGROUND), order.append('background')))
+    _wait_until(lambda: scheduler.stats()['queued'] == 1)
+    interactive = _start(lambda: (scheduler.acquire(PRIORITY_INTERACTIVE), order.append('interactive')))
+    background.join(2)
+    interactive.join(2)
+
+    assert order == ['interactive', 'background']
+    assert scheduler.stats()['granted'] == {'interactive': 1, 'normal': 1, 'background': 1}
+
+
+def test_scheduler_times_out_and_pauses():
+    scheduler = TokenBucketScheduler(rate=100, burst=1)
+    scheduler.pause(0.1)
+
+    with pytest.raises(SchedulerTimeout):
+        scheduler.acquire(timeout=0.01)
+    assert scheduler.stats()['queued'] == 0
+    assert scheduler.stats()['timeouts'] == 1
+
+    # The pause holds requests even though the refill rate would allow one by now
+    assert scheduler.acquire(timeout=1) >= 0.05
@@ -0,0 +1,149 @@
+# test_library.py
+
+import base64
+import json
+
+import pytest
+
+
+@pytest.fixture
+def user(app_context):
+    from app import db, User
+
+    user = User(username='tester', email='tester@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def _cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+
+
+def _library(user_id):
+    from app import UserGame
+    return {user_game.igdb_game_id: user_game.status for user_game in UserGame.query.filter_by(user_id=user_id)}
+
+
+def test_cursor_round_trips(user):
+    from app import UserGame, encode_library_cursor, decode_library_cursor
+
+    user_game = UserGame(id=7, user_id=user.id, igdb_game_id=1942, status='Playing')
+    assert decode_library_cursor(encode_library_cursor(user_game, 'added'), 'added') == [7]
+    assert decode_library_cursor(encode_library_cursor(user_game, '-added'), '-added') == [7]
+    assert decode_library_cursor(encode_library_cursor(user_game, 'status'), 'status') == ['Playing', 7]
+    assert decode_library_cursor('', 'added') is None
+    assert decode_library_cursor(None, 'added') is None
+
+
+@pytest.mark.parametrize('cursor, sort', [
+    ('not base64!', 'added'),
+    (_cursor('added'), 'added'), # Not a [sort, values] pair
+    (_cursor(['added', [7]]), 'status'), # Issued for another sort
+    (_cursor(['added', [7, 8]]), 'added'), # Wrong number of values
+    (_cursor(['added', {'id': 7}]), 'added'),
+    (_cursor(['added', [{'id': 7}]]), 'added'),
+    (_cursor(['added', ['7']]), 'added'),
+    (_cursor(['added', [True]]), 'added'),
+    (_cursor(['status', [7, 7]]), 'status'),
+    (_cursor(['status', ['Playing', None]]), 'status'),
+])
+def test_cursor_rejects_malformed_values(cursor, sort):
+    from app import decode_library_cursor
+
+    with pytest.raises(ValueError):
+        decode_library_cursor(cursor, sort)
+
+
+def test_malformed_cursor_is_a_bad_request(user):
+    from app import app, create_token
+
+    response = app.test_client().get(
+        '/api/library', query_string={'cursor': _cursor(['added', [{'id': 7}]])},
+        headers={'Authorization': f'Bearer {create_token(user)}'}
+    )
+    assert response.status_code == 400
+
+
+def test_import_validates_every_row(user):
+    from app import import_library, summarize_import
+
+    results = import_library(user.id, [
+        {'igdb_game_id': 1942, 'status': 'Playing'},
+        {'igdb_game_id': '1020', 'status': ' Completed '},
+        {'igdb_game_id': True, 'status': 'Playing'},
+        {'igdb_game_id': -3, 'status': 'Playing'},
+        {'igdb_game_id': 'abc', 'status': 'Playing'},
+        {'igdb_game_id': 11, 'status': 'Finished'},
+        {'igdb_game_id': 12, 'status': ['Playing']},
+        'not a row',
+    ])
+
+    assert [result['result'] for result in results] == [
+        'inserted', 'inserted', 'error', 'error', 'error', 'error', 'error', 'error'
+    ]
+    assert results[2]['error'] == 'igdb_game_id must be a positive integer'
+    assert results[5]['error'].startswith('Invalid status')
+    assert summarize_import(results) == {'inserted': 2, 'updated': 0, 'unchanged': 0, 'skipped': 0, 'error': 6}
+    assert _library(user.id) == {1942: 'Playing', 1020: 'Completed'}
+
+
+def test_import_later_duplicate_wins(user):
+    from app import import_library
+
+    results = import_library(user.id, [
+        {'igdb_game_id': 1942, 'status': 'Playing'},
+        {'igdb_game_id': 1942, 'status': 'Completed'},
+    ])
+
+    assert [result['result'] for result in results] == ['skipped', 'inserted']
+    assert _library(user.id) == {1942: 'Completed'}
+
+
+@pytest.mark.parametrize('on_conflict, expected, status', [
+    ('update', 'updated', 'Completed'),
+    ('skip', 'unchanged', 'Playing'),
+])
+def test_import_conflicts(user, on_conflict, expected, status):
+    from app import import_library, get_library_stats_row
+
+    import_library(user.id, [{'igdb_game_id': 1942, 'status': 'Playing'}])
+    results = import_library(user.id, [{'igdb_game_id': 1942, 'status': 'Completed'}], on_conflict=on_conflict)
+
+    assert results[0]['result'] == expected
+    assert _library(user.id) == {1942: status}
+    assert get_library_stats_row(user.id).counts()[status] == 1
+
+
+def test_counters_follow_library_changes(user):
+    from app import db, UserGame, adjust_library_stats, get_library_stats_row, count_library_statuses
+
+    # No counters row yet: the first change builds one from the aggregate
+    user_game = UserGame(user_id=user.id, igdb_game_id=1942, status='Playing')
+    db.session.add(user_game)
+    db.session.flush()
+    adjust_library_stats(user.id, new_status='Playing')
+    db.session.commit()
+    stats = get_library_stats_row(user.id)
+    assert stats.counts() == {'Playing': 1, 'Completed': 0, 'Dropped': 0, 'Wishlist': 0}
+    version = stats.version
+
+    user_game.status = 'Completed'
+    db.session.flush()
+    adjust_library_stats(user.id, old_status='Playing', new_status='Completed')
+    db.session.add(UserGame(user_id=user.id, igdb_game_id=1020, status='Wishlist'))
+    db.session.flush()
+    adjust_library_stats(user.id, new_status='Wishlist')
+    db.session.commit()
+    db.session.expire_all()
+
+    stats = get_library_stats_row(user.id)
+    assert stats.counts() == {'Playing': 0, 'Completed': 1, 'Dropped': 0, 'Wishlist': 1}
+    assert stats.counts() == {status: count_library_statuses([user.id])[user.id].get(status, 0) for status in stats.counts()}
+    assert stats.version == version + 2
+
+    # Unchanged status is a no-op
+    adjust_library_stats(user.id, old_status='Completed', new_status='Completed')
+    db.session.commit()
+    db.session.expire_all()
+    assert get_library_stats_row(user.id).version == version + 2